@@ -0,0 +1,49 @@
+"""Home energy management models: load a site, build a model, solve a day, run a year.
+
+Importing ``hems`` loads nothing heavy: every name below is imported from its
+module on first access, pandas and scipy only when a function needs them, and
+AMPL only starts on the first solve.
+
+    import hems
+    site = hems.load_site_arrays(152786204)
+    solution = hems.solve_day(152786204, day=0, backend=hems.get_backend('highs'))
+"""
+import importlib
+
+_EXPORTS = {
+    'load_site': 'data',
+    'load_site_arrays': 'data',
+    'list_sites': 'data',
+    'ingest': 'data',
+    'get_model': 'model',
+    'MODELS': 'model',
+    'get_backend': 'backends',
+    'AmplBackend': 'backends',
+    'HighsBackend': 'backends',
+    'Solution': 'backends',
+    'RollingHorizon': 'rolling_horizon',
+    'DEFAULT_PARAMS': 'runner',
+    'horizon_inputs': 'runner',
+    'solve_day': 'runner',
+    'solve_days': 'runner',
+    'run_sites': 'runner',
+    'simulate_site': 'pipeline',
+    'run_year': 'hems_pv_battery',
+    'ResultCollector': 'results',
+    'Tariff': 'tariff',
+    'Tracer': 'instrument',
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f'.{_EXPORTS[name]}', __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
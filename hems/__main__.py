@@ -0,0 +1,41 @@
+"""Command line entry point: ``python -m hems <command> [options]`` (or ``hems`` once installed).
+
+Only the chosen command's module is imported, so ``python -m hems --help`` is instant.
+"""
+import importlib
+import sys
+
+COMMANDS = {
+    'run': ('hems_pv_battery', "simulate one site with the PV-battery model and plot it"),
+    'ev': ('hems_pv_battery_ev', "simulate one site with an EV as its battery"),
+    'runner': ('runner', "solve many sites on a process pool"),
+    'pipeline': ('pipeline', "stream year-long runs with checkpoints"),
+    'sweep': ('sweep', "battery sizing sweeps"),
+    'fleet': ('fleet', "fleet dispatch under a feeder limit"),
+    'monte-carlo': ('monte_carlo', "EV Monte Carlo"),
+    'stochastic-ev': ('stochastic_ev', "two-stage stochastic EV scheduling"),
+    'mpc': ('mpc', "replay model predictive control over the bundled data"),
+    'benchmark': ('benchmark', "time the main code paths"),
+}
+
+
+def usage():
+    lines = ["usage: python -m hems <command> [options]", "", "commands:"]
+    lines += [f"  {name:14} {description}" for name, (_, description) in COMMANDS.items()]
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0] in ('-h', '--help'):
+        print(usage())
+        return
+    if argv[0] not in COMMANDS:
+        sys.exit(f"unknown command {argv[0]!r}\n\n{usage()}")
+    module = importlib.import_module(f'.{COMMANDS[argv[0]][0]}', __package__)
+    sys.argv[0] = f'hems {argv[0]}'  # The program name in the command's usage message
+    return module.main(argv[1:])
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,338 @@
+"""Solver backends for the HEMS models.
+
+``AmplBackend`` keeps one AMPL process with the ``.mod`` file loaded and only
+updates data between solves. ``HighsBackend`` builds the same model as sparse
+matrices (see ``model.py``) and solves it with HiGHS through ``scipy.optimize.milp``,
+so it needs no AMPL installation or licence. ``get_backend`` picks AMPL when it is
+available and falls back to HiGHS otherwise.
+"""
+import os
+import re
+import time
+
+import numpy as np
+
+from .instrument import NULL_TRACER
+from .model import VARIABLES, get_model
+
+# scipy.optimize.milp status codes mapped onto AMPL's solve_result values
+_HIGHS_STATUS = {0: 'solved', 1: 'limit', 2: 'infeasible', 3: 'unbounded', 4: 'failure'}
+# The time limit in each solver's <solver>_options string, in seconds
+_TIME_LIMIT_OPTIONS = {'cplex': 'timelimit', 'gurobi': 'timelim', 'highs': 'time_limit', 'xpress': 'maxtime'}
+# Counts in CPLEX's solve_message, e.g. "423 MIP simplex iterations\n0 branch-and-bound nodes"
+_SOLVE_MESSAGE_STATS = {
+    'iterations': re.compile(r'(\d+) (?:MIP |dual |primal )?simplex iterations'),
+    'nodes': re.compile(r'(\d+) branch-and-bound nodes'),
+}
+
+
+class Solution:
+    """Decision variable values of one solve, keyed by variable name."""
+
+    def __init__(self, values, objective, status, stats=None):
+        self.values = values
+        self.objective = objective
+        self.status = status
+        self.stats = stats or {}
+
+    @property
+    def ok(self):
+        return self.status == 'solved'
+
+    def __getitem__(self, name):
+        return self.values[name]
+
+    def head(self, n):
+        """Values of the first ``n`` slots, e.g. the kept day of a two-day horizon."""
+        return {name: values[..., :n] for name, values in self.values.items()}
+
+
+class Backend:
+    name = None
+    tracer = NULL_TRACER
+
+    def solve(self, model, params, start=None):
+        """Solve ``model`` (a name in ``model.MODELS``, e.g. 'pv_battery') for one set of inputs.
+
+        ``params`` maps AMPL parameter names to scalars or per-slot arrays, and
+        ``start`` optionally maps variable names to initial values (a MIP start).
+        """
+        raise NotImplementedError
+
+    def set_time_limit(self, seconds):
+        """Stop every later solve after ``seconds`` of solver time (``None`` for no limit).
+
+        A solve that hits the limit has status 'limit' and, if the solver found one,
+        its best feasible solution so far.
+        """
+        raise NotImplementedError
+
+    def instrument(self, tracer):
+        """Report the phases and statistics of every solve to ``tracer`` (see ``instrument.Tracer``)."""
+        self.tracer = tracer
+        return self
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class HighsBackend(Backend):
+    name = 'highs'
+
+    def __init__(self, time_limit=None, mip_rel_gap=None):
+        self.options = {}
+        if time_limit is not None:
+            self.options['time_limit'] = time_limit
+        if mip_rel_gap is not None:
+            self.options['mip_rel_gap'] = mip_rel_gap
+
+    def set_time_limit(self, seconds):
+        if seconds is None:
+            self.options.pop('time_limit', None)
+        else:
+            self.options['time_limit'] = seconds
+
+    def solve(self, model, params, start=None):
+        # HiGHS through scipy has no MIP start, so ``start`` is ignored
+        spec = get_model(model)
+        with self.tracer.phase('build'):
+            problem = spec.build(params)
+        solution = self.solve_problem(problem)
+        solution.values = spec.complete(solution.values, params)
+        return solution
+
+    def solve_problem(self, problem, relax=False):
+        """Solve a built ``model.Problem``, optionally as its LP relaxation."""
+        from scipy.optimize import Bounds, LinearConstraint, milp
+
+        with self.tracer.phase('build'):
+            constraints = LinearConstraint(problem.A, problem.constraint_lo, problem.constraint_hi)
+        started = time.perf_counter()
+        with self.tracer.phase('solve'):
+            result = milp(
+                problem.c,
+                constraints=constraints,
+                integrality=np.zeros_like(problem.integrality) if relax else problem.integrality,
+                bounds=Bounds(problem.lb, problem.ub),
+                options=self.options,
+            )
+        elapsed = time.perf_counter() - started
+
+        x = result.x if result.x is not None else np.full(len(problem.c), np.nan)
+        stats = {
+            'solve_time': elapsed,
+            'nodes': getattr(result, 'mip_node_count', None),
+            'mip_gap': getattr(result, 'mip_gap', None),
+        }
+        objective = float(result.fun) if result.fun is not None else np.nan
+        solution = Solution(problem.split(x), objective, _HIGHS_STATUS.get(result.status, 'failure'), stats)
+        self.tracer.solved(solution)
+        return solution
+
+
+class AmplBackend(Backend):
+    """A persistent AMPL instance; the ``.mod`` is read once and the sets are only reset when their size changes.
+
+    The AMPL installation is taken from ``ampl_path`` or the ``AMPL_PATH`` environment
+    variable (falling back to amplpy's default lookup) and the licence from ``AMPL_UUID``.
+    The AMPL process starts on the first solve, or on ``start()``. Parameter values
+    equal to those of the previous solve are not sent again.
+    """
+
+    name = 'ampl'
+
+    def __init__(self, solver='cplex', ampl_path=None, warm_start=True):
+        self.solver = solver
+        self.ampl_path = ampl_path or os.environ.get('AMPL_PATH')
+        self.warm_start = warm_start
+        self.time_limit = None
+        self._ampl = None
+        self._model = None
+        self._shape = None
+        self._sent = {}  # Parameter values as of the last solve
+
+    def start(self):
+        """Start AMPL now rather than on the first solve, e.g. to find out whether it is available."""
+        if self._ampl is None:
+            from amplpy import AMPL, Environment
+
+            ampl = AMPL(Environment(self.ampl_path)) if self.ampl_path else AMPL()
+            ampl.setOption('solver', self.solver)
+            if os.environ.get('AMPL_UUID'):
+                ampl.setOption('license_uuid', os.environ['AMPL_UUID'])
+            if self.solver == 'cplex':
+                options = ampl.getOption('cplex_options') or ''
+                if self.warm_start and 'mipstart' not in options:
+                    options += ' mipstart=1'
+                if 'return_mipgap' not in options:
+                    options += ' return_mipgap=1'  # Report the relative MIP gap as the suffix cost.relmipgap
+                ampl.setOption('cplex_options', options.strip())
+            self._ampl = ampl
+            self.set_time_limit(self.time_limit)
+        return self
+
+    def set_time_limit(self, seconds):
+        self.time_limit = seconds
+        if self._ampl is None or self.solver not in _TIME_LIMIT_OPTIONS:
+            return  # Applied once AMPL starts; other solvers keep their own options
+        key, option = _TIME_LIMIT_OPTIONS[self.solver], f'{self.solver}_options'
+        options = re.sub(rf'\s*\b{key}=\S+', '', self._ampl.getOption(option) or '')
+        if seconds is not None:
+            options += f' {key}={seconds:g}'
+        self._ampl.setOption(option, options.strip())
+
+    @property
+    def ampl(self):
+        return self.start()._ampl
+
+    def _load(self, spec, shape):
+        if self._model is not spec:
+            self.ampl.reset()
+            self.ampl.read(str(spec.mod_file))
+            self._model = spec
+            self._shape = None
+            self._params = {name: self.ampl.getParameter(name) for name in spec.data_params}
+            self._vars = {name: self.ampl.getVariable(name) for name in VARIABLES}
+            self._sent = {}
+        if shape != self._shape:
+            # Multi-day models are indexed over {K, D}, the others over D only
+            if len(shape) == 2:
+                self.ampl.set['K'] = list(range(1, shape[0] + 1))
+            self.ampl.set['D'] = list(range(1, shape[-1] + 1))
+            self._shape = shape
+            self._sent = {}
+
+    def solve(self, model, params, start=None):
+        spec = get_model(model)
+        params = spec.with_defaults(params)  # c_pv is optional and defaults to the .mod's 0.05
+        shape = np.shape(params['Pd'])
+        with self.tracer.phase('load_model'):
+            self._load(spec, shape)
+
+        with self.tracer.phase('set_data'):
+            for name in spec.data_params:
+                if name in spec.indexed_params:
+                    values = np.broadcast_to(np.asarray(params[name], dtype=float), shape)
+                else:
+                    values = np.asarray(params[name], dtype=float)
+                previous = self._sent.get(name)
+                if previous is not None and np.array_equal(previous, values):
+                    continue
+                self._sent[name] = values.copy()
+                if name in spec.indexed_params:
+                    if values.ndim == 2:
+                        self._params[name].setValues({(k + 1, d + 1): value for (k, d), value in np.ndenumerate(values)})
+                    elif previous is not None and (values != previous).mean() < 0.5:
+                        # e.g. a forecast update: only the slots that changed
+                        self._params[name].setValues({d + 1: values[d] for d in np.flatnonzero(values != previous)})
+                    else:
+                        self._params[name].setValues(values)
+                elif name in spec.scenario_params:
+                    self._params[name].setValues({k + 1: value for k, value in enumerate(values.ravel())})
+                else:
+                    self._params[name].set(params[name])
+            for name, values in (start or {}).items():
+                self._vars[name].setValues(np.asarray(values, dtype=float).ravel())
+
+        started = time.perf_counter()
+        with self.tracer.phase('solve'):
+            self.ampl.solve()
+        elapsed = time.perf_counter() - started
+
+        with self.tracer.phase('extract'):
+            # One getData call for all variables; rows are (index..., Pgplus, ..., eb) in set order
+            table = np.array(self.ampl.getData(*VARIABLES).toList(), dtype=float)
+            values = {name: table[:, column - len(VARIABLES)].reshape(shape) for column, name in enumerate(VARIABLES)}
+            values = spec.complete(values, params)
+            status = self.ampl.getValue('solve_result')
+            objective = self.ampl.getObjective('cost').value()
+            stats = {'solve_time': elapsed, **self._solver_stats()}
+        solution = Solution(values, objective, status, stats)
+        self.tracer.solved(solution)
+        return solution
+
+    def _solver_stats(self):
+        """Solver time, nodes, iterations and MIP gap as reported through AMPL, where available."""
+        message = self.ampl.getValue('solve_message') or ''
+        stats = {'solver_time': self.ampl.getValue('_solve_elapsed_time')}
+        for key, pattern in _SOLVE_MESSAGE_STATS.items():
+            match = pattern.search(message)
+            if match:
+                stats[key] = int(match.group(1))
+        try:
+            stats['mip_gap'] = self.ampl.getValue('cost.relmipgap')
+        except Exception:  # No gap suffix, e.g. another solver or an LP
+            pass
+        return stats
+
+    def close(self):
+        if self._ampl is not None:
+            self._ampl.close()
+            self._ampl = None
+            self._model = None
+            self._sent = {}
+
+
+BACKENDS = {'ampl': AmplBackend, 'highs': HighsBackend}
+
+
+def get_backend(name=None, cache=None):
+    """Create a backend by name, or from ``HEMS_BACKEND`` ('ampl', 'highs' or 'auto').
+
+    ``cache`` is a ``SolveCache``, a directory for one, ``True`` for the default
+    directory or ``False`` for none; by default the ``HEMS_SOLVE_CACHE`` directory
+    is used when that variable is set.
+    """
+    name = name or os.environ.get('HEMS_BACKEND', 'auto')
+    if name == 'auto':
+        try:
+            backend = AmplBackend().start()
+        except Exception:  # amplpy missing, no AMPL binary or no licence
+            backend = HighsBackend()
+    elif name in BACKENDS:
+        backend = BACKENDS[name]()
+    else:
+        raise ValueError(f"Unknown backend {name!r}, expected one of {sorted(BACKENDS)} or 'auto'")
+
+    if cache is None:
+        cache = os.environ.get('HEMS_SOLVE_CACHE') or False
+    if cache is False:
+        return backend
+    from .solve_cache import CachedBackend, SolveCache
+
+    if not isinstance(cache, SolveCache):
+        cache = SolveCache() if cache is True else SolveCache(cache)
+    return CachedBackend(backend, cache)
+
+
+_process_backend = None
+_process_backend_name = None
+
+
+def set_process_backend(name=None):
+    """Pool initializer: choose the backend of this process without starting it.
+
+    Workers start without a solver; ``process_backend`` creates it on the first
+    solve, so a worker that never solves never starts AMPL.
+    """
+    global _process_backend_name
+    _process_backend_name = name
+
+
+def process_backend(name=None):
+    """The backend shared by everything in the calling process, created on first use.
+
+    Later calls without a name return that same backend, so each process starts
+    exactly one solver.
+    """
+    global _process_backend
+    name = name or _process_backend_name
+    if _process_backend is None or name not in (None, 'auto', _process_backend.name):
+        _process_backend = get_backend(name)
+    return _process_backend
@@ -0,0 +1,222 @@
+"""Benchmarks of the main HEMS code paths, written as JSON so runs can be compared across commits.
+
+Everything runs on HiGHS, so no AMPL licence is needed. Metrics ending in ``_s``
+are times (lower is better) and metrics ending in ``_per_s`` are rates (higher is
+better).
+
+    python -m hems.benchmark run --out bench.json
+    python -m hems.benchmark compare baseline.json bench.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from .backends import HighsBackend
+from .data import CACHE_DIR, SITE_DIR, ingest, list_sites, load_site, load_site_arrays, open_store
+from .model import get_model
+from .mpc import replay
+from .runner import DEFAULT_PARAMS, horizon_window, run_sites
+
+SITE = 152786204
+
+
+def _timed(function, *args, **kwargs):
+    started = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - started, result
+
+
+def _distribution(prefix, times):
+    times = np.asarray(times)
+    return {f'{prefix}_median_s': float(np.median(times)), f'{prefix}_p95_s': float(np.percentile(times, 95)),
+            f'{prefix}_max_s': float(times.max())}
+
+
+def _day_params(day):
+    site = load_site_arrays(SITE)
+    return dict(DEFAULT_PARAMS, **{name: horizon_window(site[key], day) for name, key in
+                                   (('Pd', 'load_kw'), ('Ppv', 'pv_kw'), ('c_g', 'tariff'), ('c_pv', 'feed_in'))})
+
+
+def bench_day_solve(quick=False):
+    """End-to-end latency of one rolling-horizon day (build and solve) on HiGHS."""
+    backend = HighsBackend()
+    days = range(0, 365, 30 if quick else 5)
+    times = [_timed(backend.solve, 'pv_battery', _day_params(day))[0] for day in days]
+    return {'days': len(times), **_distribution('day_solve', times)}
+
+
+def _build(spec, params):
+    problem = spec.build(params)
+    problem.A  # Assemble the sparse matrix as part of the build
+    return problem
+
+
+def bench_build_vs_solve(quick=False):
+    """Split of a day's time between building the sparse model and HiGHS itself."""
+    backend, spec = HighsBackend(), get_model('pv_battery')
+    build_times, solve_times = [], []
+    for day in range(0, 365, 30 if quick else 5):
+        build_time, problem = _timed(_build, spec, _day_params(day))
+        build_times.append(build_time)
+        solve_times.append(_timed(backend.solve_problem, problem)[0])
+    build, solve = float(np.sum(build_times)), float(np.sum(solve_times))
+    return {**_distribution('build', build_times), **_distribution('solve', solve_times),
+            'build_share': build / (build + solve)}
+
+
+def bench_tight_model(quick=False):
+    """Day solve time of ``hems_pv_battery.mod`` against its tightened reformulation on the same days."""
+    backend = HighsBackend()
+    original_times, tight_times = [], []
+    for day in range(0, 365, 30 if quick else 5):
+        params = _day_params(day)
+        original_times.append(_timed(backend.solve, 'pv_battery', params)[0])
+        tight_times.append(_timed(backend.solve, 'pv_battery_tight', params)[0])
+    return {**_distribution('original', original_times), **_distribution('tight', tight_times),
+            'tight_speedup': float(np.sum(original_times) / np.sum(tight_times))}
+
+
+def bench_mpc_step(quick=False):
+    """Latency of a model predictive control step, replayed half-hour by half-hour with a 200 ms budget."""
+    result = replay(SITE, days=1 if quick else 7, backend=HighsBackend(), budget=0.2)
+    return {**_distribution('step', result.latency), 'fallback_share': float(result.fallback.mean())}
+
+
+def bench_data_load(quick=False):
+    """Loading a site from its CSV versus from the memory-mapped cache, and building the cache."""
+    sites = list_sites(SITE_DIR)[:3 if quick else None]
+    csv_times = [_timed(load_site, site_id)[0] for site_id in sites]
+    with tempfile.TemporaryDirectory() as cache_dir:
+        ingest_time, _ = _timed(ingest, SITE_DIR, cache_dir)
+    open_store(CACHE_DIR, SITE_DIR)
+    cache_times = [_timed(lambda site_id: {name: np.asarray(values) for name, values in
+                                          load_site_arrays(site_id).items()}, site_id)[0] for site_id in sites]
+    return {'sites': len(sites), 'ingest_all_s': ingest_time,
+            **_distribution('csv_load', csv_times), **_distribution('cache_load', cache_times)}
+
+
+def bench_markov(quick=False):
+    """Markov EV availability profiles generated per second."""
+    from .markov_functions import markov_weekday
+
+    size = 1000 if quick else 20000
+    elapsed, _ = _timed(markov_weekday, 8.16, 6.6, size=size, rng=np.random.default_rng(0))
+    return {'profiles': size, 'markov_profiles_per_s': size / elapsed}
+
+
+def bench_throughput(quick=False, workers=None):
+    """Site-days solved per second by ``runner.run_sites`` for different worker counts."""
+    sites = list_sites(SITE_DIR)[:2 if quick else 4]
+    days = 4 if quick else 14
+    workers = workers or sorted({1, 2, os.cpu_count() or 1})
+    metrics = {'sites': len(sites), 'days': days}
+    for count in workers:
+        with tempfile.TemporaryDirectory() as out_dir:
+            elapsed, _ = _timed(run_sites, sites, days, out_dir, workers=count, backend='highs',
+                                days_per_task=max(days // 2, 1))
+        metrics[f'workers_{count}_site_days_per_s'] = len(sites) * days / elapsed
+    return metrics
+
+
+BENCHMARKS = {
+    'day_solve': bench_day_solve,
+    'build_vs_solve': bench_build_vs_solve,
+    'tight_model': bench_tight_model,
+    'mpc_step': bench_mpc_step,
+    'data_load': bench_data_load,
+    'markov': bench_markov,
+    'throughput': bench_throughput,
+}
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(__file__), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    import scipy
+
+    return {
+        'commit': commit,
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'scipy': scipy.__version__,
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def run(names=None, quick=False):
+    """Run the named benchmarks (all by default) and return ``{'environment': ..., 'results': ...}``."""
+    results = {}
+    for name in names or BENCHMARKS:
+        print(f"running {name}", file=sys.stderr)
+        results[name] = BENCHMARKS[name](quick=quick)
+    return {'environment': environment(), 'quick': quick, 'results': results}
+
+
+def compare(baseline, current, threshold=0.1):
+    """Rows ``(benchmark, metric, baseline, current, change, regressed)`` for the metrics in both runs.
+
+    ``change`` is the relative change in the metric's good direction, so negative
+    is worse; a metric regresses when it got worse by more than ``threshold``.
+    """
+    rows = []
+    for name, metrics in current['results'].items():
+        for metric, value in metrics.items():
+            old = baseline['results'].get(name, {}).get(metric)
+            if old is None or not (metric.endswith('_s') or metric.endswith('_per_s')) or not old:
+                continue
+            change = (value - old) / old if metric.endswith('_per_s') else (old - value) / old
+            rows.append((name, metric, old, value, change, change < -threshold))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run')
+    run_parser.add_argument('names', nargs='*', help=f"any of {', '.join(BENCHMARKS)}; all by default")
+    run_parser.add_argument('--quick', action='store_true', help="fewer days and sites, for a smoke test")
+    run_parser.add_argument('--out', default='benchmark.json')
+    compare_parser = commands.add_parser('compare')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.1, help="relative change counted as a regression")
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        unknown = set(args.names) - set(BENCHMARKS)
+        if unknown:
+            parser.error(f"unknown benchmarks {sorted(unknown)}")
+        report = run(args.names or None, args.quick)
+        with open(args.out, 'w') as file:
+            json.dump(report, file, indent=2)
+        for name, metrics in report['results'].items():
+            for metric, value in metrics.items():
+                print(f"{name:15} {metric:35} {value:.6g}")
+        return 0
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    with open(args.current) as file:
+        current = json.load(file)
+    rows = compare(baseline, current, args.threshold)
+    for name, metric, old, new, change, regressed in rows:
+        print(f"{name:15} {metric:35} {old:12.6g} {new:12.6g} {change:+8.1%}{'  REGRESSION' if regressed else ''}")
+    return 1 if any(row[-1] for row in rows) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,191 @@
+"""Loading and preprocessing of the bundled half-hourly PV/load data."""
+import json
+import pathlib
+
+import numpy as np
+
+from .tariff import TOU_FILE, default_tariff
+
+DATA_DIR = pathlib.Path(__file__).parent / 'data'
+SITE_DIR = DATA_DIR / 'HalfHourly_PV_Load_Data'
+N = 48  # Number of time slots in a day (half-hourly intervals)
+
+
+def site_path(site_id):
+    return SITE_DIR / 'halfhourly_{}.csv'.format(site_id)
+
+
+def list_sites(directory=SITE_DIR):
+    """Site IDs of every ``halfhourly_<site_id>.csv`` file in ``directory``."""
+    return sorted(int(path.stem.split('_')[1]) for path in pathlib.Path(directory).glob('halfhourly_*.csv'))
+
+
+def load_tou_tariff():
+    import pandas as pd
+
+    return pd.read_csv(DATA_DIR / 'tou_data.csv', encoding='utf-8-sig')
+
+
+def load_site(site_id, tariff=None):
+    """Load one site as kW, with negative PV removed and the tariff attached.
+
+    Matches the preprocessing in ``hems_pv_battery.py``: the columns are
+    ``total_load_kWh``, ``pv_generation_kWh``, ``time_of_use_tariff`` and
+    ``feed_in_tariff`` (``tariff`` priced at each slot's local time, the bundled
+    ``tou_data.csv`` by default) and the trailing first slot of the next year is
+    dropped so the length is a whole number of days.
+    """
+    import pandas as pd
+
+    df = pd.read_csv(site_path(site_id))
+    df['total_load'] = df['total_load'] / (0.5 * 1000)  # Convert from Wh to kW for 30-min intervals
+    df['pv_generation'] = df['pv_generation'] / (0.5 * 1000)  # Convert from Wh to kW for 30-min intervals
+    df['pv_generation'] = df['pv_generation'].clip(lower=0)  # Remove negative values
+    df.rename(columns={
+        'total_load': 'total_load_kWh',
+        'pv_generation': 'pv_generation_kWh'
+    }, inplace=True)
+    if len(df) % N != 0:
+        df = df.iloc[:len(df) - len(df) % N]
+    prices = (tariff or default_tariff()).compile(local_wall_clock(df['localtime']))
+    df['time_of_use_tariff'] = prices['c_g']
+    df['feed_in_tariff'] = prices['c_pv']
+    return df
+
+
+def local_wall_clock(localtime):
+    """``localtime`` strings such as ``2019-01-01 00:00:00+11:00`` as naive local times; the offset changes with DST."""
+    import pandas as pd
+
+    return pd.to_datetime(localtime.str.slice(0, 19)).values.astype('datetime64[m]')
+
+
+CACHE_DIR = DATA_DIR / 'cache'
+STORE_ARRAYS = ('load_kw', 'pv_kw', 'tariff', 'feed_in', 'localtime', 'n_slots')
+CACHE_VERSION = 1  # Bump when ingest changes what it writes, so that older caches are rebuilt
+
+
+def cache_sources(directory=SITE_DIR):
+    """The files a cache of ``directory`` is built from, with their modification times and sizes."""
+    paths = [*sorted(pathlib.Path(directory).glob('halfhourly_*.csv')), TOU_FILE]
+    return {str(path.resolve()): [path.stat().st_mtime_ns, path.stat().st_size] for path in paths}
+
+
+def cache_manifest(directory=SITE_DIR):
+    return {'version': CACHE_VERSION, 'directory': str(pathlib.Path(directory).resolve()),
+            'sources': cache_sources(directory)}
+
+
+def stale_cache(cache_dir=CACHE_DIR):
+    """Why the cache in ``cache_dir`` cannot be used as it is, or None when it is up to date.
+
+    A cache is stale when an array is missing, it was written by another
+    ``CACHE_VERSION``, or a source file it was built from has changed, been added or
+    been removed since.
+    """
+    cache_dir = pathlib.Path(cache_dir)
+    if not all((cache_dir / f'{name}.npy').exists() for name in ('site_ids', *STORE_ARRAYS)):
+        return "incomplete"
+    try:
+        manifest = json.loads((cache_dir / 'sources.json').read_text())
+    except (OSError, ValueError):
+        return "no record of its sources"
+    if manifest.get('version') != CACHE_VERSION:
+        return f"version {manifest.get('version')}, expected {CACHE_VERSION}"
+    if not pathlib.Path(manifest['directory']).is_dir() or cache_sources(manifest['directory']) != manifest['sources']:
+        return f"the files in {manifest['directory']} or {TOU_FILE.name} changed"
+    return None
+
+
+def ingest(directory=SITE_DIR, cache_dir=CACHE_DIR):
+    """Preprocess every site in ``directory`` once into ``.npy`` arrays in ``cache_dir``.
+
+    Each array has one row per site (in ``site_ids.npy`` order): load and PV in kW
+    (PV clipped at zero), the default tariff's import and feed-in prices, and the
+    local wall-clock time of each slot. Rows are padded to the longest site and ``n_slots.npy`` holds each
+    site's real length. ``sources.json`` records the files they were built from, for
+    ``stale_cache``.
+    """
+    import pandas as pd
+
+    manifest = cache_manifest(directory)  # Before reading, so a file changed meanwhile reads as stale
+    site_ids = list_sites(directory)
+    frames = []
+    for site_id in site_ids:
+        df = pd.read_csv(pathlib.Path(directory) / 'halfhourly_{}.csv'.format(site_id),
+                         usecols=['pv_generation', 'total_load', 'localtime'])
+        frames.append(df.iloc[:len(df) - len(df) % N])
+
+    width = max(len(df) for df in frames)
+    arrays = {
+        'site_ids': np.array(site_ids, dtype=np.int64),
+        'n_slots': np.array([len(df) for df in frames], dtype=np.int64),
+        'load_kw': np.full((len(frames), width), np.nan),
+        'pv_kw': np.full((len(frames), width), np.nan),
+        'localtime': np.full((len(frames), width), np.datetime64('NaT'), dtype='datetime64[m]'),
+    }
+    for row, df in enumerate(frames):
+        n = len(df)
+        arrays['load_kw'][row, :n] = df['total_load'].values / (0.5 * 1000)
+        arrays['pv_kw'][row, :n] = np.maximum(df['pv_generation'].values / (0.5 * 1000), 0)
+        arrays['localtime'][row, :n] = local_wall_clock(df['localtime'])
+    # Price every slot at its local time, one lookup for all sites
+    prices = default_tariff().compile(arrays['localtime'].ravel())
+    arrays['tariff'] = prices['c_g'].reshape(arrays['localtime'].shape)
+    arrays['feed_in'] = prices['c_pv'].reshape(arrays['localtime'].shape)
+
+    cache_dir = pathlib.Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    (cache_dir / 'sources.json').unlink(missing_ok=True)
+    # site_ids.npy and then sources.json are written last, so their presence marks a complete cache
+    for name in sorted(arrays, key=lambda name: name == 'site_ids'):
+        np.save(cache_dir / f'{name}.npy', arrays[name])
+    (cache_dir / 'sources.json').write_text(json.dumps(manifest, indent=1))
+    return SiteStore(cache_dir)
+
+
+class SiteStore:
+    """Memory-mapped view of the arrays written by ``ingest``; loading a site copies nothing."""
+
+    def __init__(self, cache_dir=CACHE_DIR):
+        cache_dir = pathlib.Path(cache_dir)
+        self.site_ids = np.load(cache_dir / 'site_ids.npy')
+        self._rows = {int(site_id): row for row, site_id in enumerate(self.site_ids)}
+        self._arrays = {name: np.load(cache_dir / f'{name}.npy', mmap_mode='r') for name in STORE_ARRAYS}
+
+    def __contains__(self, site_id):
+        return int(site_id) in self._rows
+
+    def site(self, site_id):
+        """``load_kw``, ``pv_kw``, ``tariff``, ``feed_in`` and ``localtime`` of one site as read-only array views."""
+        try:
+            row = self._rows[int(site_id)]
+        except KeyError:
+            raise KeyError(f"site {site_id} is not in the cache, re-run ingest()") from None
+        n = int(self._arrays['n_slots'][row])
+        return {name: self._arrays[name][row, :n] for name in STORE_ARRAYS if name != 'n_slots'}
+
+
+_stores = {}
+
+
+def open_store(cache_dir=CACHE_DIR, directory=SITE_DIR):
+    """Open the cache, ingesting ``directory`` first if it has not been built yet or is stale.
+
+    A stale cache is rebuilt from the directory it was built from. Freshness is
+    checked the first time a process opens the cache.
+    """
+    cache_dir = pathlib.Path(cache_dir)
+    if cache_dir not in _stores:
+        if stale_cache(cache_dir) is not None:
+            try:
+                recorded = pathlib.Path(json.loads((cache_dir / 'sources.json').read_text())['directory'])
+            except (OSError, ValueError, KeyError):
+                recorded = None
+            ingest(recorded if recorded is not None and recorded.is_dir() else directory, cache_dir)
+        _stores[cache_dir] = SiteStore(cache_dir)
+    return _stores[cache_dir]
+
+
+def load_site_arrays(site_id, cache_dir=CACHE_DIR):
+    return open_store(cache_dir).site(site_id)
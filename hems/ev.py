@@ -0,0 +1,66 @@
+"""Weekly EV charging schedules on top of ``hems_pv_battery_ev.mod``."""
+import numpy as np
+
+from .backends import process_backend
+
+N = 48  # Time slots in a day (half-hourly)
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+MAX_TRAVEL_PERC = 0.2  # Share of the battery used per commute leg when rand_usage = 1
+MIN_SOC = 8.16  # kWh the Markov profiles require while away and just before leaving
+
+
+def commute_slots(availability):
+    """1-based slots of the first departure and of the return after it, 0 when they don't happen."""
+    away = np.asarray(availability) == 0
+    if not away.any():
+        return 0, 0
+    leave = int(np.argmax(away))
+    back = np.flatnonzero(~away[leave:])
+    return leave + 1, (leave + int(back[0]) + 1) if len(back) else 0
+
+
+def ev_day_params(availability, min_charge, max_charge, rand_usage, etaBc=np.sqrt(0.84),
+                  max_travel_perc=MAX_TRAVEL_PERC, min_soc=MIN_SOC):
+    """Parameters of ``hems_pv_battery_ev.mod`` for one day of a Markov availability profile.
+
+    The EV can charge at the profile's rate while at home and not at all while away,
+    and each commute leg uses ``rand_usage * max_travel_perc`` of the battery. The day
+    starts at the previous day's end-of-day SOC, which the model fixes to 20% of max,
+    raised to ``min_soc`` so that a day leaving in its first slots can be feasible.
+    """
+    early_commute, late_commute = commute_slots(availability)
+    return {
+        'etaBc': etaBc,
+        'eb1': max(0.2 * max_charge[-1], min_soc),
+        'N': N,
+        'early_commute': early_commute,
+        'late_commute': late_commute,
+        'travel_perc': rand_usage * max_travel_perc,
+        'ebM': np.asarray(max_charge, dtype=float),
+        'ebm': np.asarray(min_charge, dtype=float),
+        'PbM': np.asarray(availability, dtype=float),
+    }
+
+
+def hems_week_ev(rand_usage, demand, PV, weekday_availability, weekend_availability, max_charge_array,
+                 weekday_min_charge, weekend_min_charge, tariff=0.4, backend=None, feed_in=0.05):
+    """Solve Monday to Sunday one day at a time and return the seven daily costs.
+
+    ``demand``, ``PV`` and array ``tariff`` and ``feed_in`` prices cover 7*48 slots
+    starting on a Monday. Days without a feasible schedule cost ``nan``.
+    """
+    backend = backend or process_backend()
+    tariff = np.broadcast_to(np.asarray(tariff, dtype=float), 7 * N)
+    feed_in = np.broadcast_to(np.asarray(feed_in, dtype=float), 7 * N)
+    costs = np.full(7, np.nan)
+    for day in range(7):
+        if day < 5:
+            params = ev_day_params(weekday_availability, weekday_min_charge, max_charge_array, rand_usage)
+        else:
+            params = ev_day_params(weekend_availability, weekend_min_charge, max_charge_array, rand_usage)
+        slots = slice(day * N, (day + 1) * N)
+        params.update(Pd=demand[slots], Ppv=PV[slots], c_g=tariff[slots], c_pv=feed_in[slots])
+        solution = backend.solve('pv_battery_ev', params)
+        if solution.ok:
+            costs[day] = solution.objective
+    return costs
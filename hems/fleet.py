@@ -0,0 +1,189 @@
+"""Fleet dispatch: many homes behind one feeder limit, coordinated by ADMM.
+
+Each home is the ``pv_battery_fleet`` model: the tight model of
+``hems_pv_battery_tight.mod`` plus a proximal term. The feeder couples the homes
+only through the sum of their net grid flows ``Pgplus - Pgminus``. In every slot
+that sum must stay within ``[-feeder_export, feeder_import]``. This is the
+sharing problem of Boyd et al., "Distributed Optimization and Statistical
+Learning via the Alternating Direction Method of Multipliers", section 7.3.
+Each iteration:
+
+ 1. every home solves its own model, pulled towards a target net flow
+ 2. the coordinator projects the mean flow onto the feeder limit
+ 3. the scaled dual ``u`` accumulates what is still over the limit
+
+``rho * u / dt`` is the feeder's congestion price in $/kWh. The subproblems are
+independent, so they are spread over a process pool. The coordinator only does
+arithmetic on ``(homes, slots)`` arrays, so hundreds of homes cost little more
+than their solves. The first iteration is every home's own optimum; a day whose
+aggregate already fits the feeder needs no further iteration.
+
+    python -m hems.fleet --days 7 --feeder-import 20 --feeder-export 20 --out fleet
+"""
+import argparse
+import os
+import pathlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .backends import process_backend, set_process_backend
+from .data import CACHE_DIR, open_store
+from .model import VARIABLES, cost
+from .results import ResultStore
+from .rolling_horizon import HORIZON, N
+from .runner import DEFAULT_PARAMS, horizon_inputs, resolve_sites, site_directories
+
+FLEET_MODEL = 'pv_battery_fleet'
+
+
+def solve_homes(site_ids, day, eb1, targets, rho, params=None, backend=None, cache_dir=CACHE_DIR, tariff=None):
+    """Solve the fleet subproblem of each home; returns ``(values, energy_cost)`` per home.
+
+    ``eb1`` and ``targets`` hold each home's start-of-day SOC and target net grid flow.
+    """
+    backend = backend or process_backend()
+    solved = []
+    for site_id, home_eb1, target in zip(site_ids, eb1, targets):
+        home_params = dict(params or DEFAULT_PARAMS, **horizon_inputs(site_id, day, cache_dir, tariff),
+                           eb1=home_eb1, p_target=target, rho=rho)
+        solution = backend.solve(FLEET_MODEL, home_params)
+        if not solution.ok:
+            raise RuntimeError(f"site {site_id} day {day}: {FLEET_MODEL} solve failed ({solution.status})")
+        solved.append((solution.values, cost(solution.values, home_params, FLEET_MODEL)))
+    return solved
+
+
+class FleetSolution:
+    """Schedules of every home for one horizon, as ``(homes, slots)`` arrays, and how ADMM got there."""
+
+    def __init__(self, site_ids, values, energy_cost, congestion_price, history, converged):
+        self.site_ids = site_ids
+        self.values = values
+        self.energy_cost = energy_cost  # $ per home over the horizon
+        self.congestion_price = congestion_price  # $/kWh per slot
+        self.history = history  # (primal residual kW, dual residual, rho) per iteration
+        self.converged = converged
+
+    @property
+    def iterations(self):
+        return len(self.history)
+
+    @property
+    def aggregate(self):
+        """Net grid flow of the whole fleet in kW, positive when importing."""
+        return (self.values['Pgplus'] - self.values['Pgminus']).sum(axis=0)
+
+
+def dispatch_horizon(pool, site_ids, day, eb1, feeder_import, feeder_export, params=None, rho=0.05, tol=0.05,
+                     max_iter=200, homes_per_task=8, cache_dir=CACHE_DIR, tariff=None):
+    """Jointly schedule ``site_ids`` over the horizon starting on ``day`` with ADMM.
+
+    Stops once the fleet is within ``tol`` kW of the feeder limits and the
+    allocation moved less than ``tol`` kW in the last iteration, or after
+    ``max_iter`` iterations (``converged`` False). ``rho`` is the starting penalty,
+    rebalanced against the residuals as the iterations go.
+    """
+    homes = len(site_ids)
+    eb1 = np.broadcast_to(eb1, homes)
+    lo, hi = -feeder_export / homes, feeder_import / homes
+    tasks = [slice(start, start + homes_per_task) for start in range(0, homes, homes_per_task)]
+
+    def solve_all(targets, rho):
+        futures = [pool.submit(solve_homes, site_ids[task], day, eb1[task], targets[task], rho, params,
+                               cache_dir=cache_dir, tariff=tariff) for task in tasks]
+        solved = [home for future in futures for home in future.result()]
+        return {name: np.stack([values[name] for values, _ in solved]) for name in VARIABLES}, \
+            np.array([energy_cost for _, energy_cost in solved])
+
+    values, energy_cost = solve_all(np.zeros((homes, HORIZON)), 0.0)  # Every home's own optimum
+    flows = values['Pgplus'] - values['Pgminus']
+    mean = flows.mean(axis=0)
+    z = np.clip(mean, lo, hi)
+    u = np.zeros_like(mean)
+    history = []
+    primal = dual = homes * np.abs(mean - z).max()
+    while (primal > tol or dual > tol) and len(history) < max_iter:
+        values, energy_cost = solve_all(flows - mean + z - u, rho)
+        flows = values['Pgplus'] - values['Pgminus']
+        mean = flows.mean(axis=0)
+        z_previous, z = z, np.clip(mean + u, lo, hi)
+        u = u + mean - z
+        primal, dual = homes * np.abs(mean - z).max(), homes * np.abs(z - z_previous).max()
+        history.append((primal, rho * dual, rho))
+        # Residual balancing (Boyd et al. section 3.4.1); u is scaled by 1/rho so it changes with it
+        if primal > 10 * rho * dual:
+            rho, u = rho * 2, u / 2
+        elif rho * dual > 10 * primal:
+            rho, u = rho / 2, u * 2
+
+    dt = (params or DEFAULT_PARAMS).get('dt', 24 / N)
+    return FleetSolution(site_ids, values, energy_cost, rho * u / dt, history, primal <= tol and dual <= tol)
+
+
+def run_fleet(sites=None, days=7, feeder_import=20.0, feeder_export=20.0, out_dir='fleet', params=None,
+              rho=0.05, tol=0.05, max_iter=200, workers=None, backend='auto', homes_per_task=8, tariff=None,
+              verbose=False):
+    """Dispatch ``sites`` day by day under a shared feeder limit; SOC carries over between days.
+
+    Writes each site's kept days to ``<out_dir>/site_<site_id>.csv`` and the fleet's
+    aggregate flow and congestion price per slot to ``<out_dir>/fleet.csv``, which is
+    also returned. ``verbose`` prints each day's iterations as it finishes.
+    """
+    import pandas as pd
+
+    site_ids = np.asarray(resolve_sites(sites))
+    directory, cache_dir = site_directories(sites)
+    open_store(cache_dir, directory)  # Build the .npy cache once here rather than racing in every worker
+    out_dir = pathlib.Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    store = ResultStore(site_ids, days, N)
+    aggregate, price = np.empty((days, N)), np.empty((days, N))
+    iterations, converged = np.empty(days, dtype=np.int64), np.empty(days, dtype=bool)
+    eb1 = np.full(len(site_ids), float((params or DEFAULT_PARAMS)['eb1']))
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1, initializer=set_process_backend,
+                             initargs=(backend,)) as pool:
+        for day in range(days):
+            solution = dispatch_horizon(pool, site_ids, day, eb1, feeder_import, feeder_export, params, rho, tol,
+                                        max_iter, homes_per_task, cache_dir, tariff)
+            for home, site_id in enumerate(site_ids):
+                store.extend(site_id, [day], {name: values[home:home + 1] for name, values in solution.values.items()})
+            eb1 = solution.values['eb'][:, N].copy()  # The SOC the kept day ends at starts the next day
+            if verbose:
+                print(f"day {day}: {solution.iterations} iterations, "
+                      f"{'converged' if solution.converged else 'not converged'}")
+            aggregate[day], price[day] = solution.aggregate[:N], solution.congestion_price[:N]
+            iterations[day], converged[day] = solution.iterations, solution.converged
+    for site_id in site_ids:
+        store.to_frame(site_id).to_csv(out_dir / f'site_{site_id}.csv', index=False)
+    summary = pd.DataFrame({
+        'Day': np.repeat(np.arange(days), N),
+        'TimeSlot': np.tile(np.arange(1, N + 1), days),
+        'aggregate_kw': aggregate.ravel(),
+        'congestion_price': price.ravel(),
+        'iterations': np.repeat(iterations, N),
+        'converged': np.repeat(converged, N),
+    })
+    summary.to_csv(out_dir / 'fleet.csv', index=False)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sites', nargs='*', type=int)
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--feeder-import', type=float, default=20.0, help="kW the fleet may draw in total")
+    parser.add_argument('--feeder-export', type=float, default=20.0, help="kW the fleet may export in total")
+    parser.add_argument('--rho', type=float, default=0.05, help="starting ADMM penalty")
+    parser.add_argument('--tol', type=float, default=0.05, help="kW over the feeder limit counted as converged")
+    parser.add_argument('--max-iter', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=None, help="defaults to the number of CPU cores")
+    parser.add_argument('--backend', default='auto', choices=('auto', 'ampl', 'highs'))
+    parser.add_argument('--out', default='fleet')
+    args = parser.parse_args(argv)
+    run_fleet(args.sites or None, args.days, args.feeder_import, args.feeder_export, args.out, rho=args.rho,
+              tol=args.tol, max_iter=args.max_iter, workers=args.workers, backend=args.backend, verbose=True)
+
+
+if __name__ == '__main__':
+    main()
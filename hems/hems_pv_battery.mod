@@ -6,7 +6,7 @@ set D; # Set of half-hourly time steps for 2 days
 
 param c_g{d in D} >= 0; /* Time of use tariff */
 param c_flat = 0.31317; /* Flat tariff */
-param c_pv = 0.05; /* Feed-in-tariff */
+param c_pv{d in D} >= 0 default 0.05; /* Feed-in-tariff */
 
 param Pd{d in D} >= 0;  /* Electrical demand (daily load profile) in kW */
 param Ppv{d in D} >= 0;  /* Solar PV output (daily PV output profile) in kW */
@@ -35,8 +35,8 @@ var sb{d in D} binary;  /* Battery charging status (0: discharge, 1: charge) */
 
 # Objective Function: Minimize daily electricity cost over a 2-day time horizon
 minimize cost:
-    sum{d in D} (dt*c_g[d]*Pgplus[d] - dt*c_pv*Pgminus[d]);  # With Time of Use Tariff
-    # sum{d in D} (dt*c_flat*Pgplus[d] - dt*c_pv*Pgminus[d]); # With Flat Tariff
+    sum{d in D} (dt*c_g[d]*Pgplus[d] - dt*c_pv[d]*Pgminus[d]);  # With Time of Use Tariff
+    # sum{d in D} (dt*c_flat*Pgplus[d] - dt*c_pv[d]*Pgminus[d]); # With Flat Tariff
 
 # Constraints
 
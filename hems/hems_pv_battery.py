@@ -1,18 +1,20 @@
-from amplpy import AMPL, Environment
-import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-import os
+"""Simulate one site with the PV-battery HEMS day by day and plot the results.
+
+    python -m hems.hems_pv_battery --site 152786204 --days 2
+"""
+import argparse
 import pathlib
 from datetime import datetime, timedelta
-from dotenv import load_dotenv
 
-load_dotenv(pathlib.Path.cwd() / '.env')
+import numpy as np
+
+from .backends import get_backend
+from .data import load_site
+from .instrument import NULL_TRACER, Tracer
+from .results import COMPACT_DTYPES, ResultCollector
+from .rolling_horizon import RollingHorizon
 
-ampl = AMPL(Environment('/Users/liammills/Desktop/uni/Thesis/ampl_macos64'))#/Users/liammills/Desktop/uni/Thesis/ampl_macos64
-ampl.setOption('solver', 'cplex')
-ampl.setOption('license_uuid', os.environ.get('AMPL_UUID'))
-ampl.read('./hems_pv_battery.mod')
+HEMS_DIR = pathlib.Path(__file__).parent
 
 N = 48  # Number of time slots in a day (half-hourly intervals)
 Days = 1 # Number of days to simulate
@@ -23,34 +25,77 @@ PbM = 5  # Max battery charge rate in kW
 Pbm = 5  # Max battery discharge rate in kW
 eb1 = 0  # Start-of-day battery state of charge (SOC)
 
-ampl.param['etaBc'] = etaBc # etaBd also set
-ampl.param['ebM'] = ebM
-ampl.param['ebm'] = ebm
-ampl.param['PbM'] = PbM # Pbm also set
-ampl.param['eb1'] = eb1
+params = {
+    'etaBc': etaBc, # etaBd also set
+    'ebM': ebM,
+    'ebm': ebm,
+    'PbM': PbM, # Pbm also set
+    'eb1': eb1,
+}
 
 site_id = 152786204 # 289382707 | 152786204
-df = pd.read_csv('./data/HalfHourly_PV_Load_Data/halfhourly_{}.csv'.format(site_id))
-tou_df = pd.read_csv('./Data/tou_data.csv')
-site_details_df = pd.read_csv('./data/site_details.csv')
-
-selected_site = site_details_df[site_details_df['site_id'] == site_id]
-state = selected_site['state'].values[0]
-postcode = selected_site['postcode'].values[0]
-
-df['total_load'] = df['total_load'] / (0.5 * 1000)  # Convert from Wh to kW for 30-min intervals
-df['pv_generation'] = df['pv_generation'] / (0.5 * 1000)  # Convert from Wh to kW for 30-min intervals
-df['pv_generation'] = df['pv_generation'].apply(lambda x: max(0, x)) # Remove negative values
-df.rename(columns={
-    'total_load': 'total_load_kWh',
-    'pv_generation': 'pv_generation_kWh'
-}, inplace=True)
-if len(df) % 48 != 0:
-    df = df.iloc[:-1]
-tou_repeated = np.tile(tou_df['Cost(k) $/kWh'].values, 365)
-df['time_of_use_tariff'] = tou_repeated[:len(df)]
-
-def plot_daily_results(total_load, pv_generation, battery_soc, day, avg=False):
+
+
+def load_env():
+    """Read ``AMPL_PATH``, ``AMPL_UUID`` etc. from ``./.env`` when python-dotenv is installed."""
+    try:
+        from dotenv import load_dotenv
+    except ImportError:
+        return
+    load_dotenv(pathlib.Path.cwd() / '.env')
+
+
+def site_location(site_id):
+    """The site's ``(state, postcode)`` from ``site_details.csv``, for plot titles."""
+    import pandas as pd
+
+    site_details_df = pd.read_csv(HEMS_DIR / 'data/site_details.csv')
+    selected_site = site_details_df[site_details_df['site_id'] == site_id]
+    return selected_site['state'].values[0], selected_site['postcode'].values[0]
+
+
+def run_year(site_id=site_id, days=365, params=params, backend=None, tracer=NULL_TRACER, out='ampl_results.csv',
+             model='pv_battery'):
+    """Solve ``site_id`` on a two-day rolling horizon; returns the site's inputs as a DataFrame and the results.
+
+    The results are a ``ResultCollector`` of float32 powers and int8 binaries; use
+    ``arrays()``, ``by_slot()`` or ``to_frame()``. The last of ``days`` only serves as
+    the second half of the previous day's horizon, so ``max(days - 1, 1)`` days are
+    solved. ``out`` (CSV or Parquet) may be ``None``.
+    """
+    backend = backend or get_backend()  # Solves are cached only with HEMS_SOLVE_CACHE set
+    with tracer.phase('load_data'):
+        df = load_site(site_id)
+
+    results = ResultCollector(max(days - 1, 1), N, out, dtypes=COMPACT_DTYPES)
+    rolling_horizon = RollingHorizon(backend, params, model, n=N, horizon=2*N, carry_soc=True)  # D is set once, later days only update data and eb1
+
+    for day in range(max(days - 1, 1)):
+        with tracer.day(day):
+            start = day * N
+            end = start + 2*N
+
+            with tracer.phase('slice_inputs'):
+                demand_data_day = df['total_load_kWh'].iloc[start:end].values
+                pv_data_day = df['pv_generation_kWh'].iloc[start:end].values
+                tariff_data_day = df['time_of_use_tariff'].iloc[start:end].values
+                feed_in_data_day = df['feed_in_tariff'].iloc[start:end].values
+
+            solution = rolling_horizon.solve_day(demand_data_day, pv_data_day, tariff_data_day, feed_in_data_day)
+            with tracer.phase('collect'):
+                results.add(day, solution)
+
+    if out:
+        with tracer.phase('write_results'):
+            results.write()
+    return df, results
+
+
+def plot_daily_results(total_load, pv_generation, battery_soc, day, avg=False, location=('', '')):
+    import matplotlib.pyplot as plt
+    import pandas as pd
+
+    state, postcode = location
     start_idx = day * 48  # Assuming half-hourly data and 2-day horizon
     time_intervals = [t.strftime('%H:%M') for t in pd.date_range("00:00", "23:30", freq="30min").time]
     tick_locations = [time_intervals[i] for i in range(0, 48, 6)]
@@ -67,9 +112,9 @@ def plot_daily_results(total_load, pv_generation, battery_soc, day, avg=False):
         plt.plot(time_intervals, battery_soc, label='Battery State of Charge')
     else:
         start_idx = day * 48
-        plt.plot(time_intervals, total_load.iloc[start_idx:start_idx+48], label='Total Load')
-        plt.plot(time_intervals, pv_generation.iloc[start_idx:start_idx+48], label='PV Generation')
-        plt.plot(time_intervals, battery_soc.iloc[start_idx:start_idx+48], label='Battery State of Charge')  
+        plt.plot(time_intervals, total_load[start_idx:start_idx+48], label='Total Load')
+        plt.plot(time_intervals, pv_generation[start_idx:start_idx+48], label='PV Generation')
+        plt.plot(time_intervals, battery_soc[start_idx:start_idx+48], label='Battery State of Charge')
     plt.legend()
     plt.title(title)
     plt.xlabel('Time of Day')
@@ -78,53 +123,37 @@ def plot_daily_results(total_load, pv_generation, battery_soc, day, avg=False):
     plt.tight_layout()
     plt.show()
 
-df_results = pd.DataFrame()
-
-for day in range(max(Days - 1, 1)):
-    start = day * N
-    end = start + 2*N
-
-    demand_data_day = df['total_load_kWh'].iloc[start:end].values
-    pv_data_day = df['pv_generation_kWh'].iloc[start:end].values
-    tariff_data_day = df['time_of_use_tariff'].iloc[start:end].values
-
-    ampl.set['D'] = list(range(1, 2*N + 1))
-    ampl.getParameter('Pd').setValues(demand_data_day)
-    ampl.getParameter('Ppv').setValues(pv_data_day)
-    ampl.getParameter('c_g').setValues(tariff_data_day)
-
-    ampl.solve()
 
-    Pgplus = ampl.getVariable('Pgplus').getValues().toPandas()['Pgplus.val'].values
-    Pgminus = ampl.getVariable('Pgminus').getValues().toPandas()['Pgminus.val'].values
-    Pbplus = ampl.getVariable('Pbplus').getValues().toPandas()['Pbplus.val'].values
-    Pbminus = ampl.getVariable('Pbminus').getValues().toPandas()['Pbminus.val'].values
-    sb = ampl.getVariable('sb').getValues().toPandas()['sb.val'].values
-    dg = ampl.getVariable('dg').getValues().toPandas()['dg.val'].values
-    eb = ampl.getVariable('eb').getValues().toPandas()['eb.val'].values
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--site', type=int, default=site_id)
+    parser.add_argument('--days', type=int, default=Days)
+    parser.add_argument('--model', default='pv_battery')
+    parser.add_argument('--out', default='ampl_results.csv')
+    parser.add_argument('--no-plot', action='store_true')
+    parser.add_argument('--solve-cache', action='store_true', help="reuse and store solves on disk (hems/data/cache/solves)")
+    args = parser.parse_args(argv)
 
-    df_day_result = pd.DataFrame({
-        'Day': [day] * N,
-        'TimeSlot': range(1, N + 1),
-        'Pgplus': Pgplus[:N],
-        'Pgminus': Pgminus[:N],
-        'Pbplus': Pbplus[:N],
-        'Pbminus': Pbminus[:N],
-        'sb': sb[:N],
-        'dg': dg[:N],
-        'eb': eb[:N]
-    })
+    load_env()
+    backend = get_backend(cache=args.solve_cache or None)  # AMPL/CPLEX when available (AMPL_PATH, AMPL_UUID), otherwise HiGHS
+    tracer = Tracer.from_env()  # Per-phase timings; HEMS_TRACE=<file.json> writes them, HEMS_PROFILE_DAY=<day> runs cProfile
+    backend.instrument(tracer)
 
-    df_results = pd.concat([df_results, df_day_result], ignore_index=True)
+    df, results = run_year(args.site, args.days, params, backend, tracer, args.out, args.model)
+    print(tracer.summary().to_string(index=False))
+    tracer.write_trace()
+    if args.no_plot:
+        return
 
-df_results.to_csv('ampl_results.csv', index=False)
+    day = max(args.days - 1, 1) - 1  # The last solved day
+    location = site_location(args.site)
+    load, pv = df['total_load_kWh'].values, df['pv_generation_kWh'].values
+    plot_daily_results(load, pv, results.arrays()['eb'].ravel(), day, location=location)
 
-plot_daily_results(df['total_load_kWh'], df['pv_generation_kWh'], df_results['eb'], day)
+    end_idx = args.days * N
+    avg_load, avg_pv = (values[:end_idx].reshape(-1, N).mean(axis=0) for values in (load, pv))
+    plot_daily_results(avg_load, avg_pv, results.by_slot('eb'), day, True, location)
 
-end_idx = Days * int(N)
-numeric_cols = df.select_dtypes(include=[np.number]).columns
-avg_input = df[numeric_cols].iloc[:end_idx].groupby(np.arange(end_idx) % 48).mean()
-avg_results = df_results.groupby('TimeSlot').mean()[:int(N)]
-plot_daily_results(avg_input['total_load_kWh'], avg_input['pv_generation_kWh'], avg_results['eb'], day, True)
 
-del df_day_result
\ No newline at end of file
+if __name__ == '__main__':
+    main()
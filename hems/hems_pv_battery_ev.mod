@@ -7,7 +7,7 @@ set D; # Set of half-hourly time steps
 
 param c_g{d in D} >= 0; # Time of use tariff
 param c_flat = 0.31317; # Flat tariff
-param c_pv = 0.05; # Feed-in-tariff
+param c_pv{d in D} >= 0 default 0.05; # Feed-in-tariff
 param Pd{d in D} >= 0; # Electrical demand (daily load profile) in kW
 param Ppv{d in D} >= 0; # Solar PV output (daily PV output profile) in kW
 param PgM = 15; # Maximum capacity of grid connection in kW
@@ -40,7 +40,7 @@ var dg{d in D} binary;
 var sb{d in D} binary;
 
 # Objective Function: Minimize daily electricity cost
-minimize cost: sum{d in D} (dt*c_g[d]*Pgplus[d] - dt*c_pv*Pgminus[d]);
+minimize cost: sum{d in D} (dt*c_g[d]*Pgplus[d] - dt*c_pv[d]*Pgminus[d]);
 
 # Constraints
 subject to power_balance {d in D}: 
@@ -1,23 +1,20 @@
-# from amplpy import AMPL, DataFrame
-import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-import os
-import pathlib
+"""Simulate one site with an EV as its battery (``hems_pv_battery_ev.mod``), one day at a time.
 
-from amplpy import AMPL, Environment
-from dotenv import load_dotenv
+    python -m hems.hems_pv_battery_ev --site 289382707 --days 30
+"""
+import argparse
 
-load_dotenv(pathlib.Path.cwd() / '.env')
+import numpy as np
 
-ampl = AMPL(Environment('/Users/liammills/Desktop/uni/Thesis/ampl_macos64'))#/Users/liammills/Desktop/uni/Thesis/ampl_macos64
-ampl.setOption('solver', 'cplex')
-ampl.setOption('license_uuid', os.environ.get('AMPL_UUID'))
-ampl.read('./hems_pv_battery_ev.mod')
+from .backends import get_backend
+from .data import load_site
+from .hems_pv_battery import load_env
+from .instrument import NULL_TRACER, Tracer
+from .results import COMPACT_DTYPES, ResultCollector
 
 # Model parameters
 N = 48  # Time slots in a day (half-hourly)
-# Days = 30  # Number of days to simulate
+Days = 30  # Number of days to simulate
 etaBc = etaBd = np.sqrt(0.84)  # Battery efficiencies
 eb1 = 0  # Initial state of charge
 
@@ -32,32 +29,56 @@ ebm = 8.16
 PbM = Pbm = 6.6
 # max_charge = ones(48,1)*max_soc
 
-# Set static parameters
-ampl.param['etaBc'] = etaBc
-ampl.param['eb1'] = eb1
-ampl.param['early_commute'] = early_commute
-ampl.param['late_commute'] = late_commute
-ampl.param['travel_perc'] = travel_perc
-ampl.param['N'] = N
-ampl.param['ebM'] = ebM
-ampl.param['ebm'] = ebm
-ampl.param['PbM'] = PbM
-ampl.param['Pbm'] = Pbm
-
-# Read actual data
-# df = pd.read_csv('./data/HalfHourly_PV_Load_Data/halfhourly_152786204.csv')
-df = pd.read_csv('./data/HalfHourly_PV_Load_Data/halfhourly_289382707.csv')
-df['total_load'] = df['total_load'] / (0.5 * 1000)  # Convert from Wh to kW for 30-min intervals
-df['pv_generation'] = df['pv_generation'] / (0.5 * 1000)  # Convert from Wh to kW for 30-min intervals
-df['pv_generation'] = df['pv_generation'].apply(lambda x: max(0, x)) # Remove negative values
-df.rename(columns={
-    'total_load': 'total_load_kWh',
-    'pv_generation': 'pv_generation_kWh'
-}, inplace=True)
-df['time_of_use_tariff'] = 0.4 # TODO: Get actual tariff data
-print(df)
+# Set static parameters (ebM, ebm and PbM are indexed over D in the .mod)
+params = {
+    'etaBc': etaBc,
+    'eb1': eb1,
+    'early_commute': early_commute,
+    'late_commute': late_commute,
+    'travel_perc': travel_perc,
+    'N': N,
+    'ebM': np.full(N, ebM),
+    'ebm': np.full(N, ebm),
+    'PbM': np.full(N, PbM),
+}
+
+# df = load_site(152786204)
+site_id = 289382707
+
+
+def run_ev_days(site_id=site_id, days=Days, params=params, backend=None, tracer=NULL_TRACER, out='ampl_results.csv'):
+    """Solve the first ``days`` days of ``site_id`` independently; returns a compact ``ResultCollector``."""
+    backend = backend or get_backend()  # Solves are cached only with HEMS_SOLVE_CACHE set
+    with tracer.phase('load_data'):
+        df = load_site(site_id)  # Priced with the tou_data.csv import and feed-in tariffs, see tariff.py
+
+    results = ResultCollector(days, N, out, dtypes=COMPACT_DTYPES)
+
+    for day in range(days):
+        with tracer.day(day):
+            start = day * N
+            end = start + N
+
+            with tracer.phase('slice_inputs'):
+                demand_data_day = df['total_load_kWh'].iloc[start:end].values
+                pv_data_day = df['pv_generation_kWh'].iloc[start:end].values
+                tariff_data_day = df['time_of_use_tariff'].iloc[start:end].values
+                feed_in_data_day = df['feed_in_tariff'].iloc[start:end].values
+
+            solution = backend.solve('pv_battery_ev', dict(params, Pd=demand_data_day, Ppv=pv_data_day,
+                                                             c_g=tariff_data_day, c_pv=feed_in_data_day))
+            with tracer.phase('collect'):
+                results.add(day, solution)
+
+    if out:
+        with tracer.phase('write_results'):
+            results.write()
+    return results
+
 
 def plot_data(x, y, title, xlabel, ylabel, plot_type='line', custom_ticks=None):
+    import matplotlib.pyplot as plt
+
     plt.figure(figsize=(12, 6))
     if plot_type == 'line':
         plt.plot(x, y)
@@ -70,64 +91,36 @@ def plot_data(x, y, title, xlabel, ylabel, plot_type='line', custom_ticks=None):
         plt.yticks(list(custom_ticks.keys()), list(custom_ticks.values()))
     plt.show()
 
-df_results = pd.DataFrame()
-
-for day in range(Days):
-    start = day * N
-    end = start + N
-
-    demand_data_day = df['total_load_kWh'].iloc[start:end].values
-    pv_data_day = df['pv_generation_kWh'].iloc[start:end].values
-    tariff_data_day = df['time_of_use_tariff'].iloc[start:end].values
-    
-    # if day == 0 or day == 150:  # Only plot for the first day and day 150
-    #     plot_data(range(1, N + 1), demand_data_day, f"Total Load - Day {day+1}", "Time Slot", "Load (kWh)")
-    #     plot_data(range(1, N + 1), pv_data_day, f"PV Generation - Day {day+1}", "Time Slot", "PV Generation (kWh)")
-
-    ampl.set['D'] = list(range(1, N + 1))
-    ampl.getParameter('Pd').setValues(demand_data_day)
-    ampl.getParameter('Ppv').setValues(pv_data_day)
-    ampl.getParameter('c_g').setValues(tariff_data_day)
-
-    ampl.solve()
-
-    Pgplus = ampl.getVariable('Pgplus').getValues().toPandas()['Pgplus.val'].values
-    Pgminus = ampl.getVariable('Pgminus').getValues().toPandas()['Pgminus.val'].values
-    Pbplus = ampl.getVariable('Pbplus').getValues().toPandas()['Pbplus.val'].values
-    Pbminus = ampl.getVariable('Pbminus').getValues().toPandas()['Pbminus.val'].values
-    sb = ampl.getVariable('sb').getValues().toPandas()['sb.val'].values
-    dg = ampl.getVariable('dg').getValues().toPandas()['dg.val'].values
-    eb = ampl.getVariable('eb').getValues().toPandas()['eb.val'].values
-
-    df_day_result = pd.DataFrame({
-        'Day': [day] * N,
-        'TimeSlot': range(1, N + 1),
-        'Pgplus': Pgplus,
-        'Pgminus': Pgminus,
-        'Pbplus': Pbplus,
-        'Pbminus': Pbminus,
-        'sb': sb,
-        'dg': dg,
-        'eb': eb
-    })
-    df_results = pd.concat([df_results, df_day_result], ignore_index=True)
-
-    # if day == 0 or day == 150:  # Only plot for the first day and day 150
-    #     plot_data(range(1, N + 1), Pgplus, f"Pgplus - Day {day+1}", "Time Slot", "Pgplus (kW)")
-    #     plot_data(range(1, N + 1), Pgminus, f"Pgminus - Day {day+1}", "Time Slot", "Pgminus (kW)")
-    #     plot_data(range(1, N + 1), Pbplus, f"Pbplus - Day {day+1}", "Time Slot", "Pbplus (kW)")
-    #     plot_data(range(1, N + 1), Pbminus, f"Pbminus - Day {day+1}", "Time Slot", "Pbminus (kW)")
-    #     plot_data(range(1, N + 1), sb, f"sb - Day {day+1}", "Time Slot", "Battery status", plot_type='step')
-    #     plot_data(range(1, N + 1), dg, f"dg - Day {day+1}", "Time Slot", "Grid flow direction flag", plot_type='step')
-    #     plot_data(range(1, N + 1), eb, f"eb - Day {day+1}", "Time Slot", "eb (kWh)")
-
-df_results.to_csv('ampl_results.csv', index=False)
-
-def plot_average_data(df, variable, title, xlabel, ylabel, plot_type='line', custom_ticks=None):
-    avg_data = df.groupby('TimeSlot')[variable].mean()
-    plot_data(avg_data.index, avg_data.values, title, xlabel, ylabel, plot_type, custom_ticks)
-
-plot_average_data(df_results, 'Pgplus', 'Average Power drawn from grid', 'Time Slot', 'Average Power drawn (Pgplus - kW)')
-plot_average_data(df_results, 'Pbplus', 'Average Battery charge power', 'Time Slot', 'Average Battery charge power (Pbplus - kW)')
-plot_average_data(df_results, 'Pbminus', 'Average Battery discharge power', 'Time Slot', 'Average Battery discharge power (Pbminus - kW)')
-plot_average_data(df_results, 'sb', 'Average Battery Status', 'Time Slot', 'Average Battery Status (sb)', 'step', custom_ticks={0: 'Discharging', 1: 'Charging'})
+
+def plot_average_data(results, variable, title, xlabel, ylabel, plot_type='line', custom_ticks=None):
+    plot_data(np.arange(1, results.n + 1), results.by_slot(variable), title, xlabel, ylabel, plot_type, custom_ticks)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--site', type=int, default=site_id)
+    parser.add_argument('--days', type=int, default=Days)
+    parser.add_argument('--out', default='ampl_results.csv')
+    parser.add_argument('--no-plot', action='store_true')
+    parser.add_argument('--solve-cache', action='store_true', help="reuse and store solves on disk (hems/data/cache/solves)")
+    args = parser.parse_args(argv)
+
+    load_env()
+    backend = get_backend(cache=args.solve_cache or None)  # AMPL/CPLEX when available (AMPL_PATH, AMPL_UUID), otherwise HiGHS
+    tracer = Tracer.from_env()  # Per-phase timings; HEMS_TRACE=<file.json> writes them, HEMS_PROFILE_DAY=<day> runs cProfile
+    backend.instrument(tracer)
+
+    results = run_ev_days(args.site, args.days, params, backend, tracer, args.out)
+    print(tracer.summary().to_string(index=False))
+    tracer.write_trace()
+    if args.no_plot:
+        return
+
+    plot_average_data(results, 'Pgplus', 'Average Power drawn from grid', 'Time Slot', 'Average Power drawn (Pgplus - kW)')
+    plot_average_data(results, 'Pbplus', 'Average Battery charge power', 'Time Slot', 'Average Battery charge power (Pbplus - kW)')
+    plot_average_data(results, 'Pbminus', 'Average Battery discharge power', 'Time Slot', 'Average Battery discharge power (Pbminus - kW)')
+    plot_average_data(results, 'sb', 'Average Battery Status', 'Time Slot', 'Average Battery Status (sb)', 'step', custom_ticks={0: 'Discharging', 1: 'Charging'})
+
+
+if __name__ == '__main__':
+    main()
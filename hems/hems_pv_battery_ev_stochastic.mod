@@ -0,0 +1,78 @@
+# Donald Azuatalam (donald.azuatalam@sydney.edu.au)
+# Dr. Gregor Verbic and Dr. Archie Chapman
+# Elias Williamson
+
+# Two-stage stochastic version of hems_pv_battery_ev.mod. Every scenario k in K is one
+# possible day of EV availability, minimum charge and travel, with probability prob[k].
+# The decisions of the first S slots are made before knowing which scenario happens, so
+# they are the same in every scenario; the rest of the day is planned per scenario.
+
+# Set and Parameters
+set K ordered; # Set of scenarios
+set D; # Set of half-hourly time steps
+
+param prob{k in K} >= 0; # Scenario probability
+param S >= 0 default 1; # Number of first-stage (here-and-now) slots
+
+param c_g{k in K, d in D} >= 0; # Time of use tariff
+param c_pv{k in K, d in D} >= 0 default 0.05; # Feed-in-tariff
+param Pd{k in K, d in D} >= 0; # Electrical demand (daily load profile) in kW
+param Ppv{k in K, d in D} >= 0; # Solar PV output (daily PV output profile) in kW
+param PgM = 15; # Maximum capacity of grid connection in kW
+
+# EV-specific parameters
+param ebM{k in K, d in D} >= 0; # Battery maximum storage limit [kWh]
+param ebm{k in K, d in D} >= 0; # Battery minimum storage limit [kWh]
+param eb1 >= 0; # Start-of-day battery state of charge (SOC)
+param ebN{k in K, d in D} = 0.2*ebM[k,d]; # End-of-day battery state of charge (SOC)
+param PbM{k in K, d in D} >= 0; # Battery maximum charging rate [kW], 0 while the EV is away
+param Pbm{k in K, d in D} = PbM[k,d]; # Battery maximum discharge rate [kW]
+param etaBc >= 0; # Battery charging efficiency
+param etaBd = etaBc; # Battery discharging efficiency
+param etaI = 1; # Inverter efficiency
+param dt = 24/48; # Half-hourly time steps
+param N; # Total number of time slots
+
+# Commute Data, per scenario
+param early_commute{k in K} >= 0;
+param late_commute{k in K} >= 0;
+param travel_perc{k in K} >= 0;
+
+# Variables
+var Pgplus{k in K, d in D} >= 0, <= PgM;
+var Pgminus{k in K, d in D} >= 0, <= PgM;
+var Pbplus{k in K, d in D} >= 0, <= PbM[k,d];
+var Pbminus{k in K, d in D} >= 0, <= Pbm[k,d];
+var eb{k in K, d in D} >= ebm[k,d], <= ebM[k,d];
+var dg{k in K, d in D} binary;
+var sb{k in K, d in D} binary;
+
+# Objective Function: Minimize the expected daily electricity cost
+minimize cost: sum{k in K} prob[k] * sum{d in D} (dt*c_g[k,d]*Pgplus[k,d] - dt*c_pv[k,d]*Pgminus[k,d]);
+
+# Constraints
+subject to power_balance {k in K, d in D}:
+    Pgplus[k,d] - Pgminus[k,d] = etaI*(etaBc*Pbplus[k,d] - (1/etaBd)*Pbminus[k,d]) - etaI*Ppv[k,d] + Pd[k,d];
+
+subject to battery_operation_ev {k in K, d in D}:
+    eb[k,d] = if d = 1 then eb1 else if d = early_commute[k] then eb[k,d-1] - travel_perc[k]*ebM[k,d] else if d = late_commute[k] then eb[k,d-1] - travel_perc[k]*ebM[k,d] else if d = N then ebN[k,d] else eb[k,d-1] + dt*etaBc*Pbplus[k,d-1] - dt*(1/etaBd)*Pbminus[k,d-1];
+
+subject to grid_power_limit {k in K, d in D}:
+    Pgplus[k,d] <= PgM*dg[k,d];
+
+subject to grid_import_export_limit {k in K, d in D}:
+    Pgminus[k,d] <= PgM*(1 - dg[k,d]);
+
+subject to battery_charge_limit {k in K, d in D}:
+    Pbplus[k,d] <= PbM[k,d]*sb[k,d];
+
+subject to battery_discharge_limit {k in K, d in D}:
+    Pbminus[k,d] <= Pbm[k,d]*(1 - sb[k,d]);
+
+# Non-anticipativity: the first S slots are decided once for all scenarios
+subject to nonanticipative_Pgplus {k in K, d in D: k > 1 and d <= S}: Pgplus[k,d] = Pgplus[1,d];
+subject to nonanticipative_Pgminus {k in K, d in D: k > 1 and d <= S}: Pgminus[k,d] = Pgminus[1,d];
+subject to nonanticipative_Pbplus {k in K, d in D: k > 1 and d <= S}: Pbplus[k,d] = Pbplus[1,d];
+subject to nonanticipative_Pbminus {k in K, d in D: k > 1 and d <= S}: Pbminus[k,d] = Pbminus[1,d];
+subject to nonanticipative_dg {k in K, d in D: k > 1 and d <= S}: dg[k,d] = dg[1,d];
+subject to nonanticipative_sb {k in K, d in D: k > 1 and d <= S}: sb[k,d] = sb[1,d];
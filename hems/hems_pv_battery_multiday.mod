@@ -0,0 +1,69 @@
+# Multi-day version of hems_pv_battery.mod: many days solved in one model.
+# couple = 0: every k in K is an independent 2-day rolling horizon (block-diagonal),
+#             with the same constraints as hems_pv_battery.mod.
+# couple = 1: the days in K are consecutive and the battery SOC carries over from
+#             one day to the next, so only the first day starts at eb1 and only the
+#             last day ends at ebN.
+
+# Set and Parameters
+set K ordered; # Days in the batch
+set D ordered; # Half-hourly time steps of each day's horizon
+
+param couple binary default 0;
+
+param c_g{k in K, d in D} >= 0; /* Time of use tariff */
+param c_flat = 0.31317; /* Flat tariff */
+param c_pv{k in K, d in D} >= 0 default 0.05; /* Feed-in-tariff */
+
+param Pd{k in K, d in D} >= 0;  /* Electrical demand in kW */
+param Ppv{k in K, d in D} >= 0;  /* Solar PV output in kW */
+param PgM = 15;  /* Maximum capacity of grid connection in kW */
+
+param ebM >= 0;  # Battery maximum storage limit [kWh]
+param ebm >= 0;  # Battery minimum storage limit [kWh]
+param eb1 >= 0;  # Start-of-day battery state of charge (SOC)
+param ebN = 0.2 * ebM; # End-of-horizon battery state of charge (SOC) - 20% Max SOC
+param PbM >= 0;  # Battery maximum charging rate [kW]
+param Pbm = PbM;  # Battery maximum discharge rate [kW]
+param etaBc >= 0; /* Battery charging efficiency */
+param etaBd = etaBc; /* Battery discharging efficiency */
+param etaI = 1; /* Inverter efficiency */
+param dt = 24/48; /* Half hourly time steps */
+param N = card(D); # Time-slots in each day's horizon
+
+# Variables
+var Pgplus{k in K, d in D} >= 0, <= PgM;
+var Pgminus{k in K, d in D} >= 0, <= PgM;
+var Pbplus{k in K, d in D} >= 0, <= PbM;
+var Pbminus{k in K, d in D} >= 0, <= Pbm;
+var eb{k in K, d in D} >= ebm, <= ebM;
+var dg{k in K, d in D} binary;
+var sb{k in K, d in D} binary;
+
+# Objective Function: Minimize the electricity cost summed over all days
+minimize cost:
+    sum{k in K, d in D} (dt*c_g[k,d]*Pgplus[k,d] - dt*c_pv[k,d]*Pgminus[k,d]);
+
+# Constraints
+
+subject to power_balance {k in K, d in D}:
+    Pgplus[k,d] - Pgminus[k,d] = etaI*(etaBc*Pbplus[k,d] - (1/etaBd)*Pbminus[k,d]) - etaI*Ppv[k,d] + Pd[k,d];
+subject to battery_operation_first {k in K: couple = 0 or k = first(K)}: eb[k,1] = eb1;
+subject to battery_operation_last {k in K: couple = 0 or k = last(K)}: eb[k,N] = ebN;
+subject to battery_operation {k in K, d in 2..N-1}:
+    eb[k,d] = eb[k,d-1] + dt*etaBc*Pbplus[k,d-1] - dt*(1/etaBd)*Pbminus[k,d-1];
+subject to battery_operation_day_end {k in K: couple = 1 and k <> last(K)}:
+    eb[k,N] = eb[k,N-1] + dt*etaBc*Pbplus[k,N-1] - dt*(1/etaBd)*Pbminus[k,N-1];
+subject to battery_carry_over {k in K: couple = 1 and k <> first(K)}:
+    eb[k,1] = eb[prev(k),N] + dt*etaBc*Pbplus[prev(k),N] - dt*(1/etaBd)*Pbminus[prev(k),N];
+
+subject to grid_power_limit {k in K, d in D}:
+    Pgplus[k,d] <= PgM*dg[k,d];
+
+subject to grid_import_export_limit {k in K, d in D}:
+    Pgminus[k,d] <= PgM*(1 - dg[k,d]);  # can't import and export at the same time
+
+subject to battery_charge_limit {k in K, d in D}:
+    Pbplus[k,d] <= PbM*sb[k,d];
+subject to battery_discharge_limit {k in K, d in D}:
+    Pbminus[k,d] <= Pbm*(1 - sb[k,d]); # can't charge and discharge at the same time
@@ -0,0 +1,83 @@
+# Donald Azuatalam (donald.azuatalam@sydney.edu.au)
+# Dr. Gregor Verbic and Dr. Archie Chapman
+
+# A reformulation of hems_pv_battery.mod with the same optimal cost and far less branching:
+#  - N is card(D) rather than a hard-coded 96
+#  - the big-Ms are per-slot bounds on each flow rather than PgM and PbM
+#  - binaries that can only take one value are fixed through their bounds
+#  - sb is continuous: the model only sees the net battery flow etaBc*Pbplus - Pbminus/etaBd, so
+#    any solution can be made complementary without changing its cost (see model.complete_tight)
+#  - dg is continuous where c_g >= c_pv, since importing and exporting at once can then never pay
+# The binary values of a solution are recovered after the solve by model.complete_tight.
+
+# Set and Parameters
+set D; # Set of half-hourly time steps for 2 days
+
+param c_g{d in D} >= 0; /* Time of use tariff */
+param c_pv{d in D} >= 0 default 0.05; /* Feed-in-tariff */
+
+param Pd{d in D} >= 0;  /* Electrical demand (daily load profile) in kW */
+param Ppv{d in D} >= 0;  /* Solar PV output (daily PV output profile) in kW */
+param PgM = 15;  /* Maximum capacity of grid connection in kW */
+
+param ebM >= 0;  # Battery maximum storage limit [kWh]
+param ebm >= 0;  # Battery minimum storage limit [kWh]
+param eb1 >= 0;  # Start-of-day battery state of charge (SOC)
+param ebN = 0.2 * ebM; # End-of-horizon battery state of charge (SOC) - 20% Max SOC
+param PbM >= 0;  # Battery maximum charging rate [kW]
+param Pbm = PbM;  # Battery maximum discharge rate [kW]
+param etaBc > 0; /* Battery charging efficiency */
+param etaBd = etaBc; /* Battery discharging efficiency */
+param etaI = 1; /* Inverter efficiency. This is because the inverter efficiency is already accounted for in the PV data */
+param dt = 24/48; /* Half hourly time steps */
+param N = card(D); # Total number of time-slots in the horizon
+
+# Per-slot bounds on the battery flows from the SOC limits. The recursion only reaches eb[N-1],
+# so the flows of the last two slots keep the plain rate limits, as in hems_pv_battery.mod.
+param Pbplus_max{d in D} = if d > N - 2 then PbM
+    else min(PbM, max(0, (if d = 1 then ebM - eb1 else ebM - ebm)) / (dt*etaBc));
+param Pbminus_max{d in D} = if d > N - 2 then Pbm
+    else min(Pbm, max(0, (if d = 1 then eb1 - ebm else ebM - ebm)) * etaBd / dt);
+# Per-slot bounds on the grid flows from the power balance
+param Pgplus_max{d in D} = min(PgM, max(0, Pd[d] - etaI*Ppv[d] + etaI*etaBc*Pbplus_max[d]));
+param Pgminus_max{d in D} = min(PgM, max(0, etaI*Ppv[d] - Pd[d] + etaI*Pbminus_max[d]/etaBd));
+
+# Slots where importing and exporting at the same time could lower the cost
+set GRID_BINARY = {d in D: c_g[d] < c_pv[d] and Pgplus_max[d] > 0 and Pgminus_max[d] > 0};
+
+# Variables
+var Pgplus{d in D} >= 0, <= Pgplus_max[d];  /* Power flowing from grid to customer in kW */
+var Pgminus{d in D} >= 0, <= Pgminus_max[d];  /* Power flowing from customer to grid in kW */
+var Pbplus{d in D} >= 0, <= Pbplus_max[d];  /* Battery charge power in kW */
+var Pbminus{d in D} >= 0, <= Pbminus_max[d];  /* Battery discharge power in kW */
+var eb{d in D} >= ebm, <= ebM;  # Battery state of charge
+# Direction of grid power flow (0: demand->grid, 1: grid->demand), fixed to 1 where nothing can be exported
+var dg{d in D} >= (if Pgminus_max[d] = 0 then 1 else 0), <= (if Pgplus_max[d] = 0 and Pgminus_max[d] > 0 then 0 else 1);
+var dg_binary{GRID_BINARY} binary;
+# Battery charging status (0: discharge, 1: charge), fixed to 1 where the battery cannot discharge
+var sb{d in D} >= (if Pbminus_max[d] = 0 then 1 else 0), <= (if Pbplus_max[d] = 0 and Pbminus_max[d] > 0 then 0 else 1);
+
+# Objective Function: Minimize daily electricity cost over a 2-day time horizon
+minimize cost:
+    sum{d in D} (dt*c_g[d]*Pgplus[d] - dt*c_pv[d]*Pgminus[d]);  # With Time of Use Tariff
+
+# Constraints
+
+subject to power_balance {d in D}:
+    Pgplus[d] - Pgminus[d] = etaI*(etaBc*Pbplus[d] - (1/etaBd)*Pbminus[d]) - etaI*Ppv[d] + Pd[d];
+subject to battery_operation_first: eb[1] = eb1;
+subject to battery_operation_last: eb[N] = ebN;
+subject to battery_operation {d in 2..N-1}:
+    eb[d] = eb[d-1] + dt*etaBc*Pbplus[d-1] - dt*(1/etaBd)*Pbminus[d-1];
+
+subject to grid_direction {d in GRID_BINARY}:
+    dg[d] = dg_binary[d];
+subject to grid_power_limit {d in D}:
+    Pgplus[d] <= Pgplus_max[d]*dg[d];
+subject to grid_import_export_limit {d in D}:
+    Pgminus[d] <= Pgminus_max[d]*(1 - dg[d]);
+
+subject to battery_charge_limit {d in D}:
+    Pbplus[d] <= Pbplus_max[d]*sb[d];
+subject to battery_discharge_limit {d in D}:
+    Pbminus[d] <= Pbminus_max[d]*(1 - sb[d]);
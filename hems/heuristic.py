@@ -0,0 +1,170 @@
+"""Rule-based battery dispatch for screening many site-days before the MILP.
+
+``rule_based_dispatch`` runs ``hems_pv_battery.mod``'s battery on whole arrays of
+days at once (one row per day): surplus PV charges the battery, cheap slots top it
+up from the grid for the load still to come in slots priced at or above the day's
+median tariff, and the battery covers the load with whatever it holds beyond that
+reserve. Schedules
+respect ``ebM``/``ebm``, ``PbM``/``Pbm`` and the power balance, so they are feasible
+for the model and their cost is an upper bound on the MILP optimum.
+
+``screen`` only sends days whose gap may be large to the full MILP. The gap is
+estimated without a solve per day: ``calibrate_gap`` solves a sample of days once and
+returns a quantile of their gap relative to ``gap_scale``, a cheap measure of what
+the battery can be worth on a day, and a day's estimate is that ratio times its
+scale. This is not a bound: about ``1 - quantile`` of the days may have a larger gap.
+"""
+import numpy as np
+
+from .backends import process_backend
+from .model import get_model
+
+
+def rule_based_dispatch(Pd, Ppv, c_g, params, model='pv_battery'):
+    """Dispatch every row of the ``(days, slots)`` arrays and return the schedules and costs."""
+    params = get_model(model).with_defaults(params)
+    Pd, Ppv = np.atleast_2d(Pd).astype(float), np.atleast_2d(Ppv).astype(float)
+    c_g = np.broadcast_to(np.atleast_2d(c_g), Pd.shape)
+    c_pv = np.broadcast_to(np.asarray(params['c_pv'], dtype=float), Pd.shape)
+    days, slots = Pd.shape
+    dt, etaBc, etaBd = params['dt'], params['etaBc'], params['etaBd']
+    ebM, ebm, PbM = params['ebM'], params['ebm'], params['PbM']
+    Pbm = params.get('Pbm', PbM)
+    discharge_price = np.median(c_g, axis=1)
+
+    net = Pd - params['etaI'] * Ppv
+    expensive = c_g >= discharge_price[:, np.newaxis]
+    # Energy needed at the end of slot t to cover the expensive slots still to come before surplus PV
+    # refills the battery: the largest running sum of (expensive deficit - surplus) over the slots after t
+    balance = np.cumsum(dt * (np.maximum(net, 0) * expensive - np.maximum(-net, 0)), axis=1)
+    peak_ahead = np.maximum.accumulate(balance[:, ::-1], axis=1)[:, ::-1]
+    future_need = np.maximum(np.concatenate([peak_ahead[:, 1:], balance[:, -1:]], axis=1) - balance, 0)
+    # Battery power in the last two slots of the .mod enters no SOC equation (its recursion stops at N-1)
+    unlinked = np.zeros(slots, dtype=bool)
+    if model == 'pv_battery':
+        unlinked[int(params['N']) - 2:int(params['N'])] = True
+
+    schedule = {name: np.zeros((days, slots)) for name in ('Pgplus', 'Pgminus', 'Pbplus', 'Pbminus', 'eb')}
+    eb = np.full(days, float(params['eb1']))
+    for t in range(slots):
+        schedule['eb'][:, t] = eb
+        surplus = np.maximum(-net[:, t], 0)
+        deficit = np.maximum(net[:, t], 0)
+
+        if unlinked[t]:
+            # Discharge (and export) at full rate, the SOC does not pay for it
+            schedule['Pbminus'][:, t] = Pbm
+            grid = net[:, t] - Pbm / etaBd
+            schedule['Pgplus'][:, t] = np.maximum(grid, 0)
+            schedule['Pgminus'][:, t] = np.maximum(-grid, 0)
+            continue
+
+        # Keep enough energy for the expensive slots still to come, topping up from the grid in cheap ones
+        reserve = np.minimum(future_need[:, t], ebM)
+        wanted = np.where(expensive[:, t], surplus, np.maximum(surplus, (reserve - eb) / dt))
+        # Pbplus draws etaBc*Pbplus from the bus and stores dt*etaBc*Pbplus
+        charge = np.minimum.reduce([wanted / etaBc, np.full(days, PbM), (ebM - eb) / (dt * etaBc)])
+        # Pbminus delivers Pbminus/etaBd to the bus and removes dt*Pbminus/etaBd
+        floor = np.where(expensive[:, t], ebm, np.maximum(ebm, reserve))
+        discharge = np.where(
+            charge <= 0,
+            np.minimum.reduce([deficit * etaBd, np.full(days, Pbm), (eb - floor) * etaBd / dt]),
+            0,
+        )
+        charge, discharge = np.maximum(charge, 0), np.maximum(discharge, 0)
+
+        grid = net[:, t] + etaBc * charge - discharge / etaBd
+        schedule['Pbplus'][:, t] = charge
+        schedule['Pbminus'][:, t] = discharge
+        schedule['Pgplus'][:, t] = np.maximum(grid, 0)
+        schedule['Pgminus'][:, t] = np.maximum(-grid, 0)
+        eb = eb + dt * etaBc * charge - dt * discharge / etaBd
+
+    if model == 'pv_battery':
+        schedule['eb'][:, int(params['N']) - 1] = params.get('ebN', 0.2 * ebM)  # battery_operation_last
+    schedule['sb'] = (schedule['Pbplus'] > 0).astype(float)
+    schedule['dg'] = (schedule['Pgminus'] == 0).astype(float)
+    cost = np.sum(dt * (c_g * schedule['Pgplus'] - c_pv * schedule['Pgminus']), axis=1)
+    return schedule, cost
+
+
+def gap_scale(Pd, Ppv, c_g, params, model='pv_battery'):
+    """What the battery can be worth on each row: the tariff spread times the energy it can shift."""
+    params = get_model(model).with_defaults(params)
+    Pd, Ppv = np.atleast_2d(Pd), np.atleast_2d(Ppv)
+    c_g = np.broadcast_to(np.atleast_2d(c_g), Pd.shape)
+    dt = params['dt']
+    deficit = dt * np.maximum(Pd - params['etaI'] * Ppv, 0).sum(axis=1)
+    capacity = Pd.shape[1] * dt / 24 * (params['ebM'] - params['ebm'])  # One cycle a day
+    spread = c_g.max(axis=1) - np.minimum(c_g.min(axis=1), np.min(params['c_pv']))
+    return spread * np.minimum(deficit, capacity)
+
+
+def milp_costs(Pd, Ppv, c_g, params, model='pv_battery', backend=None):
+    backend = backend or process_backend()
+    return np.array([
+        backend.solve(model, dict(params, Pd=d, Ppv=p, c_g=c)).objective
+        for d, p, c in zip(np.atleast_2d(Pd), np.atleast_2d(Ppv), np.broadcast_to(np.atleast_2d(c_g), np.shape(np.atleast_2d(Pd))))
+    ])
+
+
+def sample_gap(Pd, Ppv, c_g, params, sample_size=50, seed=None, model='pv_battery', backend=None):
+    """Heuristic versus MILP cost on a random sample of rows, one row of the result per sampled day."""
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    Pd, Ppv = np.atleast_2d(Pd), np.atleast_2d(Ppv)
+    c_g = np.broadcast_to(np.atleast_2d(c_g), Pd.shape)
+    rows = np.sort(rng.choice(len(Pd), size=min(sample_size, len(Pd)), replace=False))
+    _, heuristic = rule_based_dispatch(Pd[rows], Ppv[rows], c_g[rows], params, model)
+    optimal = milp_costs(Pd[rows], Ppv[rows], c_g[rows], params, model, backend)
+    return pd.DataFrame({'row': rows, 'heuristic': heuristic, 'milp': optimal, 'gap': heuristic - optimal})
+
+
+def calibrate_gap(Pd, Ppv, c_g, params, sample_size=50, quantile=0.95, seed=None, model='pv_battery',
+                  backend=None):
+    """Offline calibration for ``screen``: the ``quantile`` of the sampled gaps over their ``gap_scale``.
+
+    Returns the ratio and the ``sample_gap`` frame it came from.
+    """
+    sample = sample_gap(Pd, Ppv, c_g, params, sample_size, seed, model, backend)
+    scale = gap_scale(np.atleast_2d(Pd)[sample['row']], np.atleast_2d(Ppv)[sample['row']],
+                      np.broadcast_to(np.atleast_2d(c_g), np.shape(np.atleast_2d(Pd)))[sample['row']], params, model)
+    ratio = np.divide(sample['gap'].clip(lower=0), scale, out=np.zeros(len(scale)), where=scale > 0)
+    return float(np.quantile(ratio, quantile)), sample
+
+
+def screen(Pd, Ppv, c_g, params, tolerance=0.05, gap_ratio=None, model='pv_battery', backend=None,
+           sample_size=50, quantile=0.95, seed=None):
+    """Heuristic costs for every row, with rows whose gap may exceed ``tolerance`` ($) re-solved exactly.
+
+    The gap of each row is estimated as ``gap_ratio`` times its ``gap_scale``; without
+    a ``gap_ratio`` one is calibrated at ``quantile`` on ``sample_size`` rows, whose
+    MILP costs are kept. About ``1 - quantile`` of the rows may have a larger gap than
+    their estimate, so some rows above ``tolerance`` keep their heuristic cost.
+    Returns a DataFrame with the heuristic cost, the gap estimate, whether the row was
+    escalated and the final cost (the MILP optimum for escalated and sampled rows).
+    Its ``attrs`` hold the ``gap_ratio`` and the ``quantile`` it was calibrated at
+    (None for a ``gap_ratio`` passed in).
+    """
+    import pandas as pd
+
+    Pd, Ppv = np.atleast_2d(Pd), np.atleast_2d(Ppv)
+    c_g = np.broadcast_to(np.atleast_2d(c_g), Pd.shape)
+    _, heuristic = rule_based_dispatch(Pd, Ppv, c_g, params, model)
+    final = heuristic.copy()
+    solved = np.zeros(len(Pd), dtype=bool)
+    calibrated_at = None
+    if gap_ratio is None:
+        calibrated_at = quantile
+        gap_ratio, sample = calibrate_gap(Pd, Ppv, c_g, params, sample_size, quantile, seed, model, backend)
+        final[sample['row']], solved[sample['row']] = sample['milp'], True
+    estimate = gap_ratio * gap_scale(Pd, Ppv, c_g, params, model)
+    escalate = (estimate > tolerance) | solved
+
+    rows = np.flatnonzero(escalate & ~solved)
+    if len(rows):
+        final[rows] = milp_costs(Pd[rows], Ppv[rows], c_g[rows], params, model, backend)
+    result = pd.DataFrame({'heuristic': heuristic, 'gap_estimate': estimate, 'escalated': escalate, 'cost': final})
+    result.attrs.update(gap_ratio=gap_ratio, quantile=calibrated_at)
+    return result
@@ -0,0 +1,142 @@
+"""Per-phase timing of the daily simulation loop.
+
+A ``Tracer`` records, for every day, the wall time of each phase (data loading,
+setting data, model build, solve, extraction, collecting results...). It also
+records the solve status, the solver's own statistics and the process memory. A
+backend reports its phases once it is given a tracer with ``backend.instrument``.
+The overhead is two ``perf_counter`` calls per phase, so tracing can stay on.
+``profile_day`` runs one chosen day under cProfile.
+
+    tracer = Tracer.from_env()  # HEMS_TRACE=trace.json, HEMS_PROFILE_DAY=3
+    backend.instrument(tracer)
+    for day in days:
+        with tracer.day(day):
+            with tracer.phase('load'):
+                ...
+    print(tracer.summary())
+    tracer.write_trace()
+"""
+import contextlib
+import cProfile
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def memory_mb():
+    """Resident set size of this process in MB (peak RSS where the current one is not available)."""
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except (OSError, ValueError, AttributeError):
+        pass
+    if resource is not None:
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss / 1024 ** 2 if sys.platform == 'darwin' else maxrss / 1024  # Bytes on macOS, kB on Linux
+    return None
+
+
+class NullTracer:
+    """Records nothing; the default for backends and loops that are not traced."""
+
+    enabled = False
+
+    def phase(self, name):
+        return contextlib.nullcontext()
+
+    def day(self, day):
+        return contextlib.nullcontext()
+
+    def solved(self, solution):
+        pass
+
+
+NULL_TRACER = NullTracer()
+
+
+class Tracer(NullTracer):
+    enabled = True
+
+    def __init__(self, path=None, profile_day=None, profile_path=None):
+        self.path = path
+        self.profile_day = profile_day
+        self.profile_path = profile_path or f'profile_day_{profile_day}.prof'
+        self.records = []
+        self.setup = {}  # Phases outside any day, e.g. loading the site data
+        self._current = None
+
+    @classmethod
+    def from_env(cls):
+        """Trace file from ``HEMS_TRACE`` and the profiled day from ``HEMS_PROFILE_DAY``."""
+        profile_day = os.environ.get('HEMS_PROFILE_DAY')
+        return cls(os.environ.get('HEMS_TRACE'), int(profile_day) if profile_day else None)
+
+    @contextlib.contextmanager
+    def day(self, day):
+        self._current = record = {'day': int(day), 'phases': {}, 'status': None, 'stats': {}}
+        profiler = cProfile.Profile() if day == self.profile_day else None
+        started = time.perf_counter()
+        if profiler:
+            profiler.enable()
+        try:
+            yield record
+        finally:
+            if profiler:
+                profiler.disable()
+                profiler.dump_stats(self.profile_path)
+            record['wall_s'] = time.perf_counter() - started
+            record['memory_mb'] = memory_mb()
+            self.records.append(record)
+            self._current = None
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            phases = self._current['phases'] if self._current is not None else self.setup
+            phases[name] = phases.get(name, 0.0) + time.perf_counter() - started
+
+    def solved(self, solution):
+        """Keep the status and solver statistics of the current day's solve."""
+        if self._current is not None:
+            self._current['status'] = solution.status
+            self._current['stats'].update({key: value for key, value in solution.stats.items() if value is not None})
+
+    def summary(self):
+        """One row per phase (and the whole day): days, total, mean and 95th percentile seconds, share of wall time."""
+        import pandas as pd
+
+        if not self.records:
+            return pd.DataFrame(columns=['phase', 'days', 'total_s', 'mean_s', 'p95_s', 'share'])
+        phases = pd.DataFrame([record['phases'] for record in self.records]).fillna(0.0)
+        phases['other'] = np.maximum([record['wall_s'] for record in self.records] - phases.sum(axis=1), 0)
+        phases['day'] = [record['wall_s'] for record in self.records]
+        wall = phases['day'].sum()
+        return pd.DataFrame({
+            'phase': phases.columns,
+            'days': len(phases),
+            'total_s': phases.sum().values,
+            'mean_s': phases.mean().values,
+            'p95_s': phases.quantile(0.95).values,
+            'share': phases.sum().values / wall if wall else np.nan,
+        })
+
+    def write_trace(self, path=None):
+        """Write every day's record and the summary as JSON to ``path`` (or the tracer's path)."""
+        path = path or self.path
+        if path is None:
+            return None
+        with open(path, 'w') as file:
+            json.dump({'setup': self.setup, 'days': self.records, 'summary': self.summary().to_dict('records')},
+                      file, indent=1, default=float)
+        return path
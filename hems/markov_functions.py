@@ -1,48 +1,79 @@
 import numpy as np
 
-def generate_markov_chain(min_soc, cd_rate, morning_prob, midday_prob, afternoon_prob, night_prob):
-    initial_state = 0
-    availability = 48
-    markov_availability = np.zeros(availability)
-    markov_availability[:2] = initial_state
+SLOTS = 48
+# Period of the day used for each slot's transition: 0 night, 1 morning, 2 midday, 3 afternoon
+PERIOD_OF_SLOT = np.zeros(SLOTS, dtype=np.intp)
+PERIOD_OF_SLOT[11:22] = 1  # 11 <= i <= 21
+PERIOD_OF_SLOT[22:30] = 2  # 21 < i <= 29
+PERIOD_OF_SLOT[30:40] = 3  # 29 < i <= 39
 
-    min_charge = np.ones(availability)
+# State 0: EV at home, state 1: EV away
+WEEKDAY_PROBS = {
+    'morning_prob': np.array([[0.1, 0.9], [0.1, 0.95]]),
+    'midday_prob': np.array([[0.6, 0.4], [0.3, 0.7]]),
+    'afternoon_prob': np.array([[0.8, 0.2], [0.8, 0.2]]),
+    'night_prob': np.array([[0.98, 0.02], [0.8, 0.2]]),
+}
+WEEKEND_PROBS = {
+    'morning_prob': np.array([[0.7, 0.3], [0.1, 0.9]]),
+    'midday_prob': np.array([[0.4, 0.6], [0.3, 0.7]]),
+    'afternoon_prob': np.array([[0.8, 0.2], [0.8, 0.2]]),
+    'night_prob': np.array([[0.98, 0.02], [0.8, 0.2]]),
+}
 
-    for i in range(2, availability):
-        current_state = int(markov_availability[i-1])
-        trans_prob = night_prob[current_state, :]  # Default to night time
 
-        if 11 <= i <= 21:
-            trans_prob = morning_prob[current_state, :]
-        elif 21 < i <= 29:
-            trans_prob = midday_prob[current_state, :]
-        elif 29 < i <= 39:
-            trans_prob = afternoon_prob[current_state, :]
+def cumulative_transitions(morning_prob, midday_prob, afternoon_prob, night_prob):
+    """Row-normalised cumulative transition matrices stacked by period, shape (4, states, states)."""
+    stacked = np.stack([night_prob, morning_prob, midday_prob, afternoon_prob]).astype(float)
+    stacked /= stacked.sum(axis=2, keepdims=True)  # e.g. the weekday morning row [0.1, 0.95]
+    return np.cumsum(stacked, axis=2)
 
-        next_state = np.random.choice([0, 1], p=trans_prob)
-        markov_availability[i] = next_state
 
-    markov_availability[markov_availability == 1] = 0
-    markov_availability *= cd_rate
+def generate_markov_chains(size, min_soc, cd_rate, morning_prob, midday_prob, afternoon_prob, night_prob, rng=None):
+    """Generate ``size`` independent days of EV availability and minimum charge at once.
 
-    first_leave = np.argmax(markov_availability == 0)
-    if first_leave > 0:
-        min_charge[first_leave-2:first_leave] = min_soc
+    Returns two ``(size, 48)`` arrays: the charge rate available in each slot
+    (``cd_rate`` at home, 0 away) and the minimum state of charge, which is
+    ``min_soc`` in the two slots before the first departure and while away.
+    """
+    rng = rng if isinstance(rng, np.random.Generator) else np.random.default_rng(rng)
+    cumulative = cumulative_transitions(morning_prob, midday_prob, afternoon_prob, night_prob)
 
-    return markov_availability, min_charge
+    states = np.zeros((size, SLOTS), dtype=np.intp)  # The first two slots stay in the initial state 0
+    draws = rng.random((size, SLOTS))
+    for i in range(2, SLOTS):
+        thresholds = cumulative[PERIOD_OF_SLOT[i], states[:, i-1], :-1]
+        states[:, i] = (draws[:, i, np.newaxis] >= thresholds).sum(axis=1)
 
-def markov_weekday(min_soc, cd_rate):
-    morning_prob = np.array([[0.1, 0.9], [0.1, 0.95]])
-    midday_prob = np.array([[0.6, 0.4], [0.3, 0.7]])
-    afternoon_prob = np.array([[0.8, 0.2], [0.8, 0.2]])
-    night_prob = np.array([[0.98, 0.02], [0.8, 0.2]])
+    away = states == 1
+    availability = np.where(away, 0.0, cd_rate)
 
-    return generate_markov_chain(min_soc, cd_rate, morning_prob, midday_prob, afternoon_prob, night_prob)
+    min_charge = np.ones((size, SLOTS))
+    min_charge[away] = min_soc
+    first_leave = np.argmax(away, axis=1)
+    leaves = away.any(axis=1)
+    for offset in (1, 2):
+        rows = np.flatnonzero(leaves & (first_leave >= offset))
+        min_charge[rows, first_leave[rows] - offset] = min_soc
 
-def markov_weekend(min_soc, cd_rate):
-    morning_prob = np.array([[0.7, 0.3], [0.1, 0.9]])
-    midday_prob = np.array([[0.4, 0.6], [0.3, 0.7]])
-    afternoon_prob = np.array([[0.8, 0.2], [0.8, 0.2]])
-    night_prob = np.array([[0.98, 0.02], [0.8, 0.2]])
+    return availability, min_charge
 
-    return generate_markov_chain(min_soc, cd_rate, morning_prob, midday_prob, afternoon_prob, night_prob)
+
+def generate_markov_chain(min_soc, cd_rate, morning_prob, midday_prob, afternoon_prob, night_prob, rng=None):
+    availability, min_charge = generate_markov_chains(
+        1, min_soc, cd_rate, morning_prob, midday_prob, afternoon_prob, night_prob, rng)
+    return availability[0], min_charge[0]
+
+
+def markov_weekday(min_soc, cd_rate, size=None, rng=None):
+    """One weekday profile, or ``size`` of them as ``(size, 48)`` arrays."""
+    if size is None:
+        return generate_markov_chain(min_soc, cd_rate, rng=rng, **WEEKDAY_PROBS)
+    return generate_markov_chains(size, min_soc, cd_rate, rng=rng, **WEEKDAY_PROBS)
+
+
+def markov_weekend(min_soc, cd_rate, size=None, rng=None):
+    """One weekend profile, or ``size`` of them as ``(size, 48)`` arrays."""
+    if size is None:
+        return generate_markov_chain(min_soc, cd_rate, rng=rng, **WEEKEND_PROBS)
+    return generate_markov_chains(size, min_soc, cd_rate, rng=rng, **WEEKEND_PROBS)
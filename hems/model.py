@@ -0,0 +1,477 @@
+"""Sparse-matrix versions of the HEMS AMPL models.
+
+Each builder mirrors one ``.mod`` file constraint for constraint so that the same
+instance can be solved by AMPL or handed straight to an open-source MILP solver.
+Decision variables are laid out as contiguous blocks, one per variable name, in
+the order given by ``VARIABLES``.
+"""
+import copy
+import pathlib
+
+import numpy as np
+
+HEMS_DIR = pathlib.Path(__file__).parent
+
+VARIABLES = ('Pgplus', 'Pgminus', 'Pbplus', 'Pbminus', 'sb', 'dg', 'eb')
+BINARIES = ('sb', 'dg')
+
+
+class Problem:
+    """A MILP in the form ``min c@x  s.t.  lo <= A@x <= hi,  lb <= x <= ub``."""
+
+    def __init__(self, n_slots, variables=VARIABLES, shape=None):
+        self.n_slots = n_slots
+        self.variables = variables
+        self.shape = shape or (n_slots,)  # Shape of each variable's values, e.g. (days, slots)
+        size = n_slots * len(variables)
+        self.c = np.zeros(size)
+        self.lb = np.zeros(size)
+        self.ub = np.full(size, np.inf)
+        self.integrality = np.zeros(size, dtype=np.uint8)
+        self._rows, self._cols, self._vals = [], [], []
+        self._lo, self._hi = [], []
+        self._A = None  # Assembled on first use, until more constraints are added
+        self.n_constraints = 0
+
+    def index(self, name, slots=None):
+        """Column indices of variable ``name`` at 0-based ``slots`` (all slots by default)."""
+        start = self.variables.index(name) * self.n_slots
+        if slots is None:
+            return np.arange(start, start + self.n_slots)
+        return start + np.asarray(slots)
+
+    def add_constraints(self, terms, lo, hi):
+        """Add one row per slot.
+
+        ``terms`` is a list of ``(name, slots, coefficients)`` where ``slots`` and
+        ``coefficients`` broadcast to the number of rows being added.
+        """
+        lo, hi = np.atleast_1d(lo), np.atleast_1d(hi)
+        count = max(len(lo), len(hi), *(np.size(slots) for _, slots, _ in terms))
+        rows = self.n_constraints + np.arange(count)
+        for name, slots, coefficients in terms:
+            self._rows.append(rows)
+            self._cols.append(np.broadcast_to(self.index(name, slots), count))
+            self._vals.append(np.broadcast_to(np.asarray(coefficients, dtype=float), count))
+        self._lo.append(np.broadcast_to(lo.astype(float), count))
+        self._hi.append(np.broadcast_to(hi.astype(float), count))
+        self.n_constraints += count
+        self._A = None
+
+    def copy(self):
+        """A copy to change independently; the constraint rows and the assembled ``A`` are shared until it adds any."""
+        problem = copy.copy(self)
+        problem.c, problem.lb, problem.ub = self.c.copy(), self.lb.copy(), self.ub.copy()
+        problem.integrality = self.integrality.copy()
+        problem._rows, problem._cols, problem._vals = list(self._rows), list(self._cols), list(self._vals)
+        problem._lo, problem._hi = list(self._lo), list(self._hi)
+        return problem
+
+    def set_bounds(self, name, lb, ub):
+        idx = self.index(name)
+        self.lb[idx] = lb
+        self.ub[idx] = ub
+
+    def set_binary(self, name):
+        idx = self.index(name)
+        self.lb[idx] = 0
+        self.ub[idx] = 1
+        self.integrality[idx] = 1
+
+    @property
+    def A(self):
+        if self._A is None:
+            from scipy import sparse
+
+            if not self._rows:
+                self._A = sparse.csr_array((0, len(self.c)))
+            else:
+                self._A = sparse.csr_array(
+                    (np.concatenate(self._vals), (np.concatenate(self._rows), np.concatenate(self._cols))),
+                    shape=(self.n_constraints, len(self.c)),
+                )
+        return self._A
+
+    @property
+    def constraint_lo(self):
+        return np.concatenate(self._lo) if self._lo else np.zeros(0)
+
+    @property
+    def constraint_hi(self):
+        return np.concatenate(self._hi) if self._hi else np.zeros(0)
+
+    def split(self, x):
+        """Split a solution vector back into one array per variable."""
+        return {name: x[self.index(name)].reshape(self.shape) for name in self.variables}
+
+
+def _slot_param(params, name, n_slots):
+    values = np.asarray(params[name], dtype=float)
+    return np.broadcast_to(values if values.ndim == 0 else values[:n_slots], n_slots)
+
+
+def _add_balance(problem, params):
+    """Objective and power balance shared by all models."""
+    T = problem.n_slots
+    dt, etaI = params['dt'], params['etaI']
+    etaBc, etaBd = params['etaBc'], params['etaBd']
+    c_g = _slot_param(params, 'c_g', T)
+    c_pv = _slot_param(params, 'c_pv', T)
+    Pd = _slot_param(params, 'Pd', T)
+    Ppv = _slot_param(params, 'Ppv', T)
+    slots = np.arange(T)
+
+    problem.c[problem.index('Pgplus')] = dt * c_g
+    problem.c[problem.index('Pgminus')] = -dt * c_pv
+
+    # power_balance
+    net_load = Pd - etaI * Ppv
+    problem.add_constraints([
+        ('Pgplus', slots, 1),
+        ('Pgminus', slots, -1),
+        ('Pbplus', slots, -etaI * etaBc),
+        ('Pbminus', slots, etaI / etaBd),
+    ], net_load, net_load)
+
+
+def _add_limits(problem, Pgplus_max, Pgminus_max, Pbplus_max, Pbminus_max):
+    """Flow bounds and the big-M constraints tying them to ``dg`` and ``sb``."""
+    slots = np.arange(problem.n_slots)
+    problem.set_bounds('Pgplus', 0, Pgplus_max)
+    problem.set_bounds('Pgminus', 0, Pgminus_max)
+    problem.set_bounds('Pbplus', 0, Pbplus_max)
+    problem.set_bounds('Pbminus', 0, Pbminus_max)
+    # grid_power_limit and grid_import_export_limit
+    problem.add_constraints([('Pgplus', slots, 1), ('dg', slots, -Pgplus_max)], -np.inf, 0)
+    problem.add_constraints([('Pgminus', slots, 1), ('dg', slots, Pgminus_max)], -np.inf, Pgminus_max)
+    # battery_charge_limit and battery_discharge_limit
+    problem.add_constraints([('Pbplus', slots, 1), ('sb', slots, -Pbplus_max)], -np.inf, 0)
+    problem.add_constraints([('Pbminus', slots, 1), ('sb', slots, Pbminus_max)], -np.inf, Pbminus_max)
+
+
+def _add_common(problem, params, PbM, Pbm):
+    """Objective, power balance and the big-M constraints shared by the original models."""
+    _add_balance(problem, params)
+    problem.set_binary('dg')
+    problem.set_binary('sb')
+    _add_limits(problem, params['PgM'], params['PgM'], PbM, Pbm)
+
+
+def _add_soc_recursion(problem, params, slots, offset=0.0):
+    """eb[d] = eb[d-1] + dt*etaBc*Pbplus[d-1] - dt/etaBd*Pbminus[d-1] + offset, for 0-based ``slots``."""
+    dt, etaBc, etaBd = params['dt'], params['etaBc'], params['etaBd']
+    slots = np.asarray(slots)
+    offset = np.broadcast_to(offset, len(slots))
+    problem.add_constraints([
+        ('eb', slots, 1),
+        ('eb', slots - 1, -1),
+        ('Pbplus', slots - 1, -dt * etaBc),
+        ('Pbminus', slots - 1, dt / etaBd),
+    ], offset, offset)
+
+
+def _fix(problem, name, slot, value):
+    problem.add_constraints([(name, [slot], 1)], value, value)
+
+
+def build_pv_battery(params):
+    """Build ``hems_pv_battery.mod`` for the slots in ``params['Pd']``."""
+    T = len(params['Pd'])
+    N = int(params['N'])
+    if N > T:
+        raise ValueError(f"N = {N} exceeds the {T} slots in D")
+    problem = Problem(T)
+    ebM = params['ebM']
+    _add_common(problem, params, params['PbM'], params.get('Pbm', params['PbM']))
+    problem.set_bounds('eb', params['ebm'], ebM)
+
+    _fix(problem, 'eb', 0, params['eb1'])  # battery_operation_first
+    _fix(problem, 'eb', N - 1, params.get('ebN', 0.2 * ebM))  # battery_operation_last
+    _add_soc_recursion(problem, params, np.arange(1, N - 1))  # battery_operation {d in 2..N-1}
+    return problem
+
+
+def tight_bounds(params):
+    """Per-slot upper bounds of the four flows in ``hems_pv_battery_tight.mod``.
+
+    Battery flows are limited by how far the SOC can move in one slot (from ``eb1``
+    in the first), grid flows by the power balance at those battery limits. The SOC
+    recursion stops at ``eb[N-1]``, so the last two slots keep the plain rate limits.
+    """
+    T = len(params['Pd'])
+    dt, etaI, PgM = params['dt'], params['etaI'], params['PgM']
+    etaBc, etaBd = params['etaBc'], params['etaBd']
+    PbM = params['PbM']
+    Pbm = params.get('Pbm', PbM)
+    ebM, ebm, eb1 = params['ebM'], params['ebm'], params['eb1']
+    in_recursion = np.arange(T) < T - 2
+    charge_room = np.where(np.arange(T) == 0, ebM - eb1, ebM - ebm).clip(0)
+    discharge_room = np.where(np.arange(T) == 0, eb1 - ebm, ebM - ebm).clip(0)
+    Pbplus_max = np.where(in_recursion, np.minimum(PbM, charge_room / (dt * etaBc)), PbM)
+    Pbminus_max = np.where(in_recursion, np.minimum(Pbm, discharge_room * etaBd / dt), Pbm)
+
+    net_load = _slot_param(params, 'Pd', T) - etaI * _slot_param(params, 'Ppv', T)
+    return {
+        'Pgplus': np.minimum(PgM, (net_load + etaI * etaBc * Pbplus_max).clip(0)),
+        'Pgminus': np.minimum(PgM, (etaI * Pbminus_max / etaBd - net_load).clip(0)),
+        'Pbplus': Pbplus_max,
+        'Pbminus': Pbminus_max,
+    }
+
+
+def build_pv_battery_tight(params, variables=VARIABLES):
+    """Build ``hems_pv_battery_tight.mod``: ``hems_pv_battery.mod`` with N = card(D) and fewer, tighter binaries."""
+    T = len(params['Pd'])
+    problem = Problem(T, variables)
+    bounds = tight_bounds(params)
+    _add_balance(problem, params)
+    _add_limits(problem, bounds['Pgplus'], bounds['Pgminus'], bounds['Pbplus'], bounds['Pbminus'])
+    problem.set_bounds('eb', params['ebm'], params['ebM'])
+
+    # Fix dg and sb where only one value is feasible, relax them everywhere else
+    for name, on, off in (('dg', 'Pgplus', 'Pgminus'), ('sb', 'Pbplus', 'Pbminus')):
+        idx = problem.index(name)
+        problem.lb[idx] = bounds[off] == 0
+        problem.ub[idx] = ~((bounds[on] == 0) & (bounds[off] > 0))
+    grid_binary = ((_slot_param(params, 'c_g', T) < _slot_param(params, 'c_pv', T))
+                   & (bounds['Pgplus'] > 0) & (bounds['Pgminus'] > 0))
+    problem.integrality[problem.index('dg', np.flatnonzero(grid_binary))] = 1
+
+    _fix(problem, 'eb', 0, params['eb1'])  # battery_operation_first
+    _fix(problem, 'eb', T - 1, params.get('ebN', 0.2 * params['ebM']))  # battery_operation_last
+    _add_soc_recursion(problem, params, np.arange(1, T - 1))  # battery_operation {d in 2..N-1}
+    return problem
+
+
+def complete_tight(values, params, tol=1e-9):
+    """Turn a ``pv_battery_tight`` solution into one with complementary flows and binary ``dg`` and ``sb``.
+
+    The battery flows are replaced by the charge or discharge alone that gives the
+    same net flow, and simultaneous import and export is netted off, which can only
+    lower the cost. The result is a feasible solution of ``hems_pv_battery.mod`` with
+    the same cost.
+    """
+    values = dict(values)
+    etaBc, etaBd = params['etaBc'], params.get('etaBd', params['etaBc'])
+    net = etaBc * values['Pbplus'] - values['Pbminus'] / etaBd
+    values['Pbplus'] = net.clip(0) / etaBc
+    values['Pbminus'] = (-net).clip(0) * etaBd
+    values['sb'] = np.where(net > tol, 1.0, np.where(net < -tol, 0.0, np.round(values['sb'])))
+
+    overlap = np.minimum(values['Pgplus'], values['Pgminus'])
+    values['Pgplus'] = values['Pgplus'] - overlap
+    values['Pgminus'] = values['Pgminus'] - overlap
+    values['dg'] = np.where(values['Pgplus'] > tol, 1.0,
+                            np.where(values['Pgminus'] > tol, 0.0, np.round(values['dg'])))
+    return values
+
+
+# Offsets (kW) from the target at which the fleet model's quadratic penalty is linearised
+PROX_TANGENTS = np.concatenate([-0.05 * 2.0 ** np.arange(10)[::-1], [0], 0.05 * 2.0 ** np.arange(10)])
+
+
+def build_pv_battery_fleet(params):
+    """Build ``hems_pv_battery_fleet.mod``: the tight model plus ``rho/2 * (Pgplus - Pgminus - p_target)^2``.
+
+    HiGHS through scipy solves no QPs, so the penalty of each slot is the
+    ``prox`` variable, bounded below by the tangents of the quadratic at
+    ``PROX_TANGENTS`` from the target. The subproblem stays an LP.
+    """
+    T = len(params['Pd'])
+    problem = build_pv_battery_tight(params, VARIABLES + ('prox',))
+    rho = params['rho']
+    problem.c[problem.index('prox')] = 1
+    if rho > 0:
+        target = _slot_param(params, 'p_target', T)
+        slots = np.repeat(np.arange(T), len(PROX_TANGENTS))
+        delta = np.tile(PROX_TANGENTS, T)
+        # prox[d] >= rho*delta*(Pgplus[d] - Pgminus[d] - p_target[d]) - rho/2*delta^2
+        problem.add_constraints([
+            ('prox', slots, 1),
+            ('Pgplus', slots, -rho * delta),
+            ('Pgminus', slots, rho * delta),
+        ], -rho * delta * target[slots] - rho / 2 * delta ** 2, np.inf)
+    return problem
+
+
+def _add_ev_battery(problem, params, ebM, early_commute, late_commute, travel_perc, start=0):
+    """battery_operation_ev for the ``len(ebM)`` slots from flat slot ``start``: the .mod's if/else chain, first match wins."""
+    T = len(ebM)
+    d = np.arange(1, T + 1)
+    first = d == 1
+    commute = ~first & ((d == early_commute) | (d == late_commute))
+    last = ~first & ~commute & (d == int(params['N']))
+    charging = ~(first | commute | last)
+
+    _fix(problem, 'eb', start, params['eb1'])
+    commute_slots = np.flatnonzero(commute)
+    problem.add_constraints([
+        ('eb', start + commute_slots, 1),
+        ('eb', start + commute_slots - 1, -1),
+    ], -travel_perc * ebM[commute_slots], -travel_perc * ebM[commute_slots])
+    last_slots = np.flatnonzero(last)
+    problem.add_constraints([('eb', start + last_slots, 1)], 0.2 * ebM[last_slots], 0.2 * ebM[last_slots])
+    _add_soc_recursion(problem, params, start + np.flatnonzero(charging))
+
+
+def build_pv_battery_ev(params):
+    """Build ``hems_pv_battery_ev.mod`` for the slots in ``params['Pd']``."""
+    T = len(params['Pd'])
+    ebM = _slot_param(params, 'ebM', T)
+    PbM = _slot_param(params, 'PbM', T)
+    problem = Problem(T)
+    _add_common(problem, params, PbM, PbM)
+    problem.set_bounds('eb', _slot_param(params, 'ebm', T), ebM)
+    _add_ev_battery(problem, params, ebM, params['early_commute'], params['late_commute'], params['travel_perc'])
+    return problem
+
+
+def build_pv_battery_ev_stochastic(params):
+    """Build ``hems_pv_battery_ev_stochastic.mod``: one EV day per scenario, ``(scenarios, slots)`` arrays.
+
+    The cost is weighted by ``prob`` and the decisions of the first ``S`` slots are
+    the same in every scenario (non-anticipativity).
+    """
+    K, T = np.shape(params['Pd'])
+    problem = Problem(K * T, shape=(K, T))
+    flat = dict(params, **{name: np.broadcast_to(params[name], (K, T)).ravel()
+                           for name in ('Pd', 'Ppv', 'c_g', 'c_pv', 'ebM', 'ebm', 'PbM')})
+    _add_common(problem, flat, flat['PbM'], flat['PbM'])
+    weights = np.repeat(np.asarray(params['prob'], dtype=float), T)
+    problem.c[problem.index('Pgplus')] *= weights
+    problem.c[problem.index('Pgminus')] *= weights
+    problem.set_bounds('eb', flat['ebm'], flat['ebM'])
+
+    for k in range(K):
+        _add_ev_battery(problem, params, flat['ebM'][k * T:(k + 1) * T], params['early_commute'][k],
+                        params['late_commute'][k], params['travel_perc'][k], start=k * T)
+
+    # nonanticipative: x[k, d] = x[1, d] for d <= S
+    first_stage = np.arange(min(int(params['S']), T))
+    later = (np.arange(1, K)[:, np.newaxis] * T + first_stage).ravel()
+    for name in VARIABLES:
+        if name != 'eb':  # eb over the first stage follows from eb1 and the flows
+            problem.add_constraints([(name, later, 1), (name, np.tile(first_stage, K - 1), -1)], 0, 0)
+    return problem
+
+
+def build_pv_battery_multiday(params):
+    """Build ``hems_pv_battery_multiday.mod``; ``Pd``, ``Ppv`` and ``c_g`` are ``(days, slots)`` arrays."""
+    K, T = np.shape(params['Pd'])
+    problem = Problem(K * T, shape=(K, T))
+    flat = dict(params, **{name: np.broadcast_to(params[name], (K, T)).ravel() for name in ('Pd', 'Ppv', 'c_g', 'c_pv')})
+    ebM, ebN = params['ebM'], params.get('ebN', 0.2 * params['ebM'])
+    couple = bool(params.get('couple', 0))
+    _add_common(problem, flat, params['PbM'], params.get('Pbm', params['PbM']))
+    problem.set_bounds('eb', params['ebm'], ebM)
+
+    starts = np.arange(K) * T
+    first = starts[:1] if couple else starts
+    last = starts[-1:] + T - 1 if couple else starts + T - 1
+    problem.add_constraints([('eb', first, 1)], params['eb1'], params['eb1'])  # battery_operation_first
+    problem.add_constraints([('eb', last, 1)], ebN, ebN)  # battery_operation_last
+    _add_soc_recursion(problem, params, (starts[:, np.newaxis] + np.arange(1, T - 1)).ravel())
+    if couple and K > 1:
+        _add_soc_recursion(problem, params, starts[:-1] + T - 1)  # battery_operation_day_end
+        _add_soc_recursion(problem, params, starts[1:])  # battery_carry_over
+    return problem
+
+
+class ModelSpec:
+    """One AMPL model: its ``.mod`` file, the parameters it reads as data and its fixed defaults."""
+
+    def __init__(self, name, mod_file, data_params, indexed_params, defaults, builder, completion=None,
+                 scenario_params=()):
+        self.name = name
+        self.mod_file = HEMS_DIR / mod_file
+        self.data_params = data_params
+        self.indexed_params = indexed_params
+        self.scenario_params = scenario_params  # Indexed over the scenarios K only
+        self.defaults = defaults
+        self.builder = builder
+        self.completion = completion  # Maps a solver's raw values onto the original model's variables
+
+    def with_defaults(self, params):
+        merged = dict(self.defaults)
+        merged.update(params)
+        merged.setdefault('etaBd', merged['etaBc'])
+        return merged
+
+    def build(self, params):
+        return self.builder(self.with_defaults(params))
+
+    def complete(self, values, params):
+        if self.completion is None:
+            return values
+        return self.completion(values, self.with_defaults(params))
+
+
+_MOD_DEFAULTS = {'c_pv': 0.05, 'PgM': 15, 'etaI': 1, 'dt': 24 / 48}
+
+MODELS = {
+    'pv_battery': ModelSpec(
+        'pv_battery', 'hems_pv_battery.mod',
+        data_params=('Pd', 'Ppv', 'c_g', 'c_pv', 'ebM', 'ebm', 'eb1', 'PbM', 'etaBc'),
+        indexed_params=('Pd', 'Ppv', 'c_g', 'c_pv'),
+        defaults={**_MOD_DEFAULTS, 'N': 96},
+        builder=build_pv_battery,
+    ),
+    'pv_battery_tight': ModelSpec(
+        'pv_battery_tight', 'hems_pv_battery_tight.mod',
+        data_params=('Pd', 'Ppv', 'c_g', 'c_pv', 'ebM', 'ebm', 'eb1', 'PbM', 'etaBc'),
+        indexed_params=('Pd', 'Ppv', 'c_g', 'c_pv'),
+        defaults=dict(_MOD_DEFAULTS),
+        builder=build_pv_battery_tight,
+        completion=complete_tight,
+    ),
+    'pv_battery_fleet': ModelSpec(
+        'pv_battery_fleet', 'hems_pv_battery_fleet.mod',
+        data_params=('Pd', 'Ppv', 'c_g', 'c_pv', 'ebM', 'ebm', 'eb1', 'PbM', 'etaBc', 'p_target', 'rho'),
+        indexed_params=('Pd', 'Ppv', 'c_g', 'c_pv', 'p_target'),
+        defaults={**_MOD_DEFAULTS, 'p_target': 0.0, 'rho': 0.0},
+        builder=build_pv_battery_fleet,
+        completion=complete_tight,
+    ),
+    'pv_battery_ev': ModelSpec(
+        'pv_battery_ev', 'hems_pv_battery_ev.mod',
+        data_params=('Pd', 'Ppv', 'c_g', 'c_pv', 'ebM', 'ebm', 'eb1', 'PbM', 'etaBc', 'N',
+                     'early_commute', 'late_commute', 'travel_perc'),
+        indexed_params=('Pd', 'Ppv', 'c_g', 'c_pv', 'ebM', 'ebm', 'PbM'),
+        defaults=dict(_MOD_DEFAULTS),
+        builder=build_pv_battery_ev,
+    ),
+    'pv_battery_ev_stochastic': ModelSpec(
+        'pv_battery_ev_stochastic', 'hems_pv_battery_ev_stochastic.mod',
+        data_params=('Pd', 'Ppv', 'c_g', 'c_pv', 'ebM', 'ebm', 'eb1', 'PbM', 'etaBc', 'N',
+                     'early_commute', 'late_commute', 'travel_perc', 'prob', 'S'),
+        indexed_params=('Pd', 'Ppv', 'c_g', 'c_pv', 'ebM', 'ebm', 'PbM'),
+        scenario_params=('early_commute', 'late_commute', 'travel_perc', 'prob'),
+        defaults={**_MOD_DEFAULTS, 'S': 1},
+        builder=build_pv_battery_ev_stochastic,
+    ),
+    'pv_battery_multiday': ModelSpec(
+        'pv_battery_multiday', 'hems_pv_battery_multiday.mod',
+        data_params=('Pd', 'Ppv', 'c_g', 'c_pv', 'ebM', 'ebm', 'eb1', 'PbM', 'etaBc', 'couple'),
+        indexed_params=('Pd', 'Ppv', 'c_g', 'c_pv'),
+        defaults={**_MOD_DEFAULTS, 'couple': 0},
+        builder=build_pv_battery_multiday,
+    ),
+}
+
+
+def get_model(model):
+    if isinstance(model, ModelSpec):
+        return model
+    try:
+        return MODELS[model]
+    except KeyError:
+        raise ValueError(f"Unknown model {model!r}, expected one of {sorted(MODELS)}") from None
+
+
+def cost(solution, params, model='pv_battery'):
+    """Electricity cost of a solution under the model's objective."""
+    params = get_model(model).with_defaults(params)
+    T = len(solution['Pgplus'])
+    c_g = _slot_param(params, 'c_g', T)
+    c_pv = _slot_param(params, 'c_pv', T)
+    return float(np.sum(params['dt'] * (c_g * solution['Pgplus'] - c_pv * solution['Pgminus'])))
@@ -1,55 +1,202 @@
+"""Monte Carlo distribution of daily costs for a household EV.
+
+Each scenario picks a site, a week of its data, a weekday and a weekend Markov
+availability profile and a random travel usage, then solves the week with
+``hems_pv_battery_ev.mod``. Scenarios are solved on a process pool and appended
+to a CSV as they finish, while running statistics decide when to stop: the run
+ends once the confidence interval on the mean daily cost is narrower than
+``tolerance`` (in $/day) or after ``max_scenarios``.
+
+    python -m hems.monte_carlo --tolerance 0.02 --out monte_carlo_costs.csv
+"""
+import argparse
+import csv
 import os
-import pandas as pd
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
 import numpy as np
-import matplotlib.pyplot as plt
-
-from markov_functions import markov_weekday, markov_weekend
-from hems import hems_week_ev
-
-# Initialize variables and arrays
-usage_iterations, availability_iterations = 5, 7
-weekdays = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-costs_by_day = {day: np.zeros((usage_iterations, availability_iterations)) for day in weekdays}
-max_charge_level, min_charge_level, charge_rate = 40, 8.16, 6.6
-max_charge_array = np.ones(48) * max_charge_level
-
-data_folder = './data'
-csv_file_list = [file for file in os.listdir(data_folder) if file.endswith('.csv')]
-print(csv_file_list)
-
-# Monte Carlo simulation loop
-for file_idx in range(24):
-    csv_path = os.path.join(data_folder, csv_file_list[file_idx])
-    data_frame = pd.read_csv(csv_path)
-    
-    # Perform checks and read demand, PV data
-    if len(data_frame) != 17521 or data_frame.isnull().values.any():
-        continue
-    
-    demand = data_frame.iloc[:, 2].values  # Assuming 3rd column is demand
-    demand = demand[:17520]  # Remove 1st timestamp of the next year
-    PV = data_frame.iloc[:, 1].values  # Assuming 2nd column is PV generation
-    PV = PV[:17520]  # Remove 1st timestamp of the next year
-    
-    # Convert Wh to kW (data is in 5-minute increments)
-    demand = demand / 1000 * 12
-    PV = PV / 1000 * 12
-
-    for avail_idx in range(availability_iterations):
-        weekday_availability, weekday_min_charge = markov_weekday(min_charge_level, charge_rate)
-        weekend_availability, weekend_min_charge = markov_weekend(min_charge_level, charge_rate)
-
-        for usage_idx in range(usage_iterations):
-            rand_usage = np.random.rand()
-            daily_costs = hems_week_ev(rand_usage, demand, PV, weekday_availability, weekend_availability, max_charge_array, weekday_min_charge, weekend_min_charge)
-            
-            for day_idx, day in enumerate(weekdays):
-                costs_by_day[day][usage_idx, avail_idx] = daily_costs[day_idx]
-
-# Plotting
-fig, axes = plt.subplots(4, 2)
-for idx, ax in enumerate(axes.flatten()[:-1]):
-    ax.hist(costs_by_day[weekdays[idx]].flatten())
-    ax.set_title(weekdays[idx])
-    
-plt.show()
+
+from .backends import process_backend, set_process_backend
+from .data import CACHE_DIR, SITE_DIR, list_sites, load_site_arrays, open_store
+from .ev import MIN_SOC, N, WEEKDAYS, hems_week_ev
+from .markov_functions import markov_weekday, markov_weekend
+
+max_charge_level, min_charge_level, charge_rate = 40, MIN_SOC, 6.6
+FIRST_MONDAY = 6  # 2019-01-07, the data starts on Tuesday 2019-01-01
+COST_BINS = np.arange(-5, 25.25, 0.25)  # $/day, costs outside are counted in the end bins
+
+
+class CostStatistics:
+    """Running mean/variance (Welford) and fixed-bin histograms of daily costs, per weekday."""
+
+    def __init__(self, bins=COST_BINS):
+        self.bins = np.asarray(bins)
+        self.counts = np.zeros((len(WEEKDAYS), len(self.bins) - 1), dtype=np.int64)
+        self.n = np.zeros(len(WEEKDAYS), dtype=np.int64)
+        self.mean = np.zeros(len(WEEKDAYS))
+        self._m2 = np.zeros(len(WEEKDAYS))
+        self.scenarios = 0
+        self.infeasible_days = 0
+        # Statistics of each scenario's mean daily cost, which are independent samples
+        self._scenario_n, self._scenario_mean, self._scenario_m2 = 0, 0.0, 0.0
+
+    def update(self, daily_costs):
+        daily_costs = np.asarray(daily_costs, dtype=float)
+        self.scenarios += 1
+        feasible = ~np.isnan(daily_costs)
+        self.infeasible_days += int((~feasible).sum())
+        for day in np.flatnonzero(feasible):
+            cost = daily_costs[day]
+            self.n[day] += 1
+            delta = cost - self.mean[day]
+            self.mean[day] += delta / self.n[day]
+            self._m2[day] += delta * (cost - self.mean[day])
+            index = np.clip(np.searchsorted(self.bins, cost, side='right') - 1, 0, self.counts.shape[1] - 1)
+            self.counts[day, index] += 1
+
+        if feasible.any():
+            cost = daily_costs[feasible].mean()
+            self._scenario_n += 1
+            delta = cost - self._scenario_mean
+            self._scenario_mean += delta / self._scenario_n
+            self._scenario_m2 += delta * (cost - self._scenario_mean)
+
+    @property
+    def std(self):
+        return np.sqrt(self._m2 / np.maximum(self.n - 1, 1))
+
+    @property
+    def mean_daily_cost(self):
+        return self._scenario_mean
+
+    def ci_halfwidth(self, z=1.96):
+        """Half-width of the confidence interval on the mean daily cost."""
+        if self._scenario_n < 2:
+            return np.inf
+        return z * np.sqrt(self._scenario_m2 / (self._scenario_n - 1) / self._scenario_n)
+
+    def summary(self):
+        return {
+            'scenarios': self.scenarios,
+            'infeasible_days': self.infeasible_days,
+            'mean_daily_cost': self.mean_daily_cost,
+            'ci_halfwidth': self.ci_halfwidth(),
+            **{f'{day}_mean': self.mean[i] for i, day in enumerate(WEEKDAYS)},
+            **{f'{day}_std': self.std[i] for i, day in enumerate(WEEKDAYS)},
+        }
+
+
+def sample_scenarios(site_ids, count, rng, n_weeks):
+    """Draw ``count`` scenarios: a site, a week, Markov weekday/weekend profiles and a usage."""
+    weekday_availability, weekday_min_charge = markov_weekday(min_charge_level, charge_rate, size=count, rng=rng)
+    weekend_availability, weekend_min_charge = markov_weekend(min_charge_level, charge_rate, size=count, rng=rng)
+    sites = rng.choice(site_ids, size=count)
+    weeks = rng.integers(0, n_weeks, size=count)
+    usages = rng.random(count)
+    return [
+        (int(sites[k]), FIRST_MONDAY + 7 * int(weeks[k]), float(usages[k]),
+         weekday_availability[k], weekend_availability[k], weekday_min_charge[k], weekend_min_charge[k])
+        for k in range(count)
+    ]
+
+
+def solve_scenarios(scenarios, cache_dir=CACHE_DIR):
+    """Solve a chunk of scenarios in a worker; returns one row of daily costs per scenario."""
+    max_charge_array = np.ones(N) * max_charge_level
+    rows = []
+    for site_id, start_day, usage, weekday_av, weekend_av, weekday_mc, weekend_mc in scenarios:
+        site = load_site_arrays(site_id, cache_dir)
+        week = slice(start_day * N, (start_day + 7) * N)
+        costs = hems_week_ev(usage, site['load_kw'][week], site['pv_kw'][week], weekday_av, weekend_av,
+                             max_charge_array, weekday_mc, weekend_mc, site['tariff'][week],
+                             backend=process_backend(), feed_in=site['feed_in'][week])
+        rows.append((site_id, start_day, usage, costs))
+    return rows
+
+
+def run_monte_carlo(sites=None, tolerance=0.02, z=1.96, min_scenarios=50, max_scenarios=5000,
+                    scenarios_per_task=4, workers=None, out='monte_carlo_costs.csv', seed=None,
+                    backend='auto'):
+    """Run scenarios until the mean daily cost is known to within ``tolerance`` $/day.
+
+    Every finished scenario is appended to ``out`` straight away; only the running
+    statistics are kept in memory and returned.
+    """
+    store = open_store(CACHE_DIR, SITE_DIR)
+    site_ids = list(sites) if sites is not None else list_sites(SITE_DIR)
+    # Drop sites with gaps, as the old loop skipped incomplete files
+    site_ids = [site_id for site_id in site_ids
+                if not np.isnan(store.site(site_id)['load_kw']).any() and not np.isnan(store.site(site_id)['pv_kw']).any()]
+    n_weeks = (min(len(store.site(site_id)['load_kw']) for site_id in site_ids) // N - FIRST_MONDAY) // 7
+
+    rng = np.random.default_rng(seed)
+    stats = CostStatistics()
+    workers = workers or os.cpu_count() or 1
+    submitted = 0
+
+    with open(out, 'w', newline='') as file, \
+            ProcessPoolExecutor(max_workers=workers, initializer=set_process_backend, initargs=(backend,)) as pool:
+        writer = csv.writer(file)
+        writer.writerow(['scenario', 'site_id', 'week_start_day', 'usage', *WEEKDAYS])
+
+        def submit():
+            nonlocal submitted
+            count = min(scenarios_per_task, max_scenarios - submitted)
+            submitted += count
+            return pool.submit(solve_scenarios, sample_scenarios(site_ids, count, rng, n_weeks))
+
+        running = {submit() for _ in range(2 * workers) if submitted < max_scenarios}
+        while running:
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                for site_id, start_day, usage, costs in future.result():
+                    writer.writerow([stats.scenarios, site_id, start_day, usage, *costs])
+                    stats.update(costs)
+            file.flush()
+
+            converged = stats.scenarios >= min_scenarios and stats.ci_halfwidth(z) < tolerance
+            if converged:
+                for future in running:
+                    future.cancel()
+                break
+            while len(running) < 2 * workers and submitted < max_scenarios:
+                running.add(submit())
+
+    return stats
+
+
+def plot_histograms(stats):
+    import matplotlib.pyplot as plt
+
+    fig, axes = plt.subplots(4, 2)
+    for idx, ax in enumerate(axes.flatten()[:-1]):
+        ax.stairs(stats.counts[idx], stats.bins, fill=True)
+        ax.set_title(WEEKDAYS[idx])
+    axes.flatten()[-1].axis('off')
+    plt.show()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sites', nargs='*', type=int)
+    parser.add_argument('--tolerance', type=float, default=0.02, help="CI half-width on the mean daily cost, $/day")
+    parser.add_argument('--min-scenarios', type=int, default=50)
+    parser.add_argument('--max-scenarios', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--backend', default='auto', choices=('auto', 'ampl', 'highs'))
+    parser.add_argument('--out', default='monte_carlo_costs.csv')
+    parser.add_argument('--no-plot', action='store_true')
+    args = parser.parse_args(argv)
+
+    stats = run_monte_carlo(args.sites or None, args.tolerance, min_scenarios=args.min_scenarios,
+                            max_scenarios=args.max_scenarios, workers=args.workers, out=args.out,
+                            seed=args.seed, backend=args.backend)
+    for key, value in stats.summary().items():
+        print(f"{key}: {value}")
+    if not args.no_plot:
+        plot_histograms(stats)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+"""Model predictive control: re-plan every half-hour as the load and PV forecasts change.
+
+Each step solves a two-day window starting at the current slot, with the measured
+SOC as ``eb1``, and executes only the battery flows of the first slot. Slots already
+executed leave the window and act on the next plan through the SOC. The model stays
+loaded between steps, but as the window moves by a slot every step nearly all of its
+per-slot data is new and is sent again. The previous plan, advanced by one slot, is
+the MIP start.
+
+Every step has a latency ``budget``. The solver's time limit is ``solver_share`` of
+it, which leaves the rest for building the model and reading the plan back. A step
+that overruns the budget, or whose solve fails, executes the next slot of the last
+feasible plan instead. ``replay`` runs the controller over the bundled half-hourly
+data, after one untimed solve that pays for starting the solver. It forecasts each
+window from the data known at that point and reports every step's latency.
+
+    python -m hems.mpc --site 152786204 --days 7 --budget 0.2
+"""
+import argparse
+import time
+
+import numpy as np
+
+from .backends import get_backend
+from .data import CACHE_DIR, load_site_arrays
+from .rolling_horizon import HORIZON, N, START_VARS
+from .runner import DEFAULT_PARAMS
+from .tariff import site_prices
+
+MPC_MODEL = 'pv_battery_tight'  # An LP with the bundled tariff, about 10 ms a step on HiGHS
+EXECUTED = ('Pgplus', 'Pgminus', 'Pbplus', 'Pbminus', 'eb')
+SOLVER_SHARE = 0.5  # Of the budget; building the model and extracting the plan take the rest
+
+
+def window(values, t, horizon=HORIZON, n=N):
+    """Slots ``t`` to ``t + horizon``, repeating the last day past the end of the data."""
+    slots = t + np.arange(horizon)
+    past = slots >= len(values)
+    slots[past] -= n * ((slots[past] - len(values)) // n + 1)
+    return np.asarray(values)[slots]
+
+
+def advance(values):
+    """A plan from its second slot on, with the last slot repeated to keep its length."""
+    values = np.asarray(values)
+    return np.concatenate([values[1:], values[-1:]])
+
+
+def forecast(actual, t, horizon=HORIZON, n=N, decay=0.8):
+    """Forecast slots ``t`` to ``t + horizon`` of ``actual`` from the slots before ``t`` only.
+
+    Each slot is forecast by the latest measured slot at the same time of day
+    (persistence). The error that forecast made in slot ``t - 1`` is added to the slot
+    ``k`` steps ahead with weight ``decay**(k + 1)``, so the next few slots follow
+    what is happening now. This needs a day of history.
+    """
+    if t < n:
+        raise ValueError(f"forecasting slot {t} needs {n} slots of history")
+    actual = np.asarray(actual)
+    k = np.arange(horizon)
+    persistence = actual[t + k - n * (k // n + 1)]
+    error = actual[t - 1] - actual[t - 1 - n] if t > n else 0.0
+    return np.clip(persistence + error * decay ** (k + 1), 0, None)
+
+
+class ModelPredictiveController:
+    """Plans a ``horizon``-slot window every slot and executes its first slot, within a latency budget."""
+
+    def __init__(self, backend, params=None, model=MPC_MODEL, horizon=HORIZON, budget=0.2, warm_start=True,
+                 solver_share=SOLVER_SHARE, clock=time.perf_counter):
+        self.backend = backend
+        self.params = dict(params or DEFAULT_PARAMS)
+        self.model = model
+        self.horizon = horizon
+        self.budget = budget
+        self.warm_start = warm_start
+        self.clock = clock  # Seconds, for the step latencies
+        self._plan = None  # The last feasible plan, advanced to start at the next step
+        if budget is not None:
+            backend.set_time_limit(budget * solver_share)
+
+    def warm_up(self, eb, demand, pv, tariff, feed_in):
+        """Solve a window once, untimed and discarded, so the first step does not pay for starting the solver."""
+        self.backend.solve(self.model, dict(self.params, eb1=eb, Pd=demand, Ppv=pv, c_g=tariff, c_pv=feed_in))
+
+    def step(self, eb, demand, pv, tariff, feed_in):
+        """Plan the window from the current slot with SOC ``eb``; returns the plan's first slot and a record.
+
+        ``demand`` and ``pv`` are forecasts and ``tariff``/``feed_in`` the prices of
+        the ``horizon`` slots from now. The record holds the step's latency, the
+        solve status and whether the last plan was used instead.
+        """
+        params = dict(self.params, eb1=eb, Pd=demand, Ppv=pv, c_g=tariff, c_pv=feed_in)
+        start = None
+        if self.warm_start and self._plan is not None:
+            start = {name: self._plan[name] for name in START_VARS}
+
+        started = self.clock()
+        solution = self.backend.solve(self.model, params, start=start)
+        latency = self.clock() - started
+
+        # A solve stopped by the time limit still leaves a usable plan if it found a feasible one
+        usable = solution.status in ('solved', 'limit') and all(np.isfinite(v).all() for v in solution.values.values())
+        fallback = not usable or (self.budget is not None and latency > self.budget)
+        if fallback:
+            plan = self._plan if self._plan is not None else self.idle_plan(eb)
+        else:
+            plan = solution.values
+        self._plan = {name: advance(values) for name, values in plan.items()}
+        record = {'latency': latency, 'status': solution.status, 'fallback': fallback}
+        return {name: float(values[0]) for name, values in plan.items()}, record
+
+    def idle_plan(self, eb):
+        """Leave the battery alone: the plan when no feasible one exists yet."""
+        plan = {name: np.zeros(self.horizon) for name in ('Pgplus', 'Pgminus', 'Pbplus', 'Pbminus', 'sb', 'dg')}
+        plan['eb'] = np.full(self.horizon, float(eb))
+        return plan
+
+    def reset(self):
+        self._plan = None
+
+
+def execute(eb, setpoint, demand, pv, tariff, feed_in, params=None):
+    """Run the planned battery flows for one slot against the actual load and PV.
+
+    The battery follows the setpoint as far as its SOC limits allow, and the grid
+    covers whatever the forecasts got wrong. Returns the executed flows, the SOC the
+    slot ends at and the slot's cost in $.
+    """
+    params = dict(params or DEFAULT_PARAMS)
+    dt, etaBc, etaI = params.get('dt', 24 / N), params['etaBc'], params.get('etaI', 1)
+    etaBd = params.get('etaBd', etaBc)
+    Pbplus = min(setpoint['Pbplus'], max(params['ebM'] - eb, 0) / (dt * etaBc))
+    Pbminus = min(setpoint['Pbminus'], max(eb - params['ebm'], 0) * etaBd / dt)
+    net = demand - etaI * pv + etaI * (etaBc * Pbplus - Pbminus / etaBd)
+    Pgplus, Pgminus = max(net, 0.0), max(-net, 0.0)
+    flows = {'Pgplus': Pgplus, 'Pgminus': Pgminus, 'Pbplus': Pbplus, 'Pbminus': Pbminus, 'eb': eb}
+    eb_next = eb + dt * etaBc * Pbplus - dt * Pbminus / etaBd
+    return flows, eb_next, dt * (tariff * Pgplus - feed_in * Pgminus)
+
+
+class Replay:
+    """What the controller did in every slot of a replay, as ``(slots,)`` arrays."""
+
+    def __init__(self, start, executed, cost, latency, fallback, status):
+        self.start = start  # First slot replayed
+        self.executed = executed  # Pgplus, Pgminus, Pbplus, Pbminus and the SOC at the start of the slot
+        self.cost = cost  # $ per slot
+        self.latency = latency  # Seconds per step
+        self.fallback = fallback
+        self.status = status
+
+    def summary(self, budget=None):
+        latency = self.latency
+        return {
+            'steps': len(latency),
+            'cost': float(self.cost.sum()),
+            'latency_p50_ms': 1e3 * float(np.percentile(latency, 50)),
+            'latency_p95_ms': 1e3 * float(np.percentile(latency, 95)),
+            'latency_max_ms': 1e3 * float(latency.max()),
+            'over_budget': int((latency > budget).sum()) if budget is not None else None,
+            'fallbacks': int(self.fallback.sum()),
+        }
+
+
+def replay(site_id, days=7, start_day=1, params=None, backend=None, model=MPC_MODEL, budget=0.2, horizon=HORIZON,
+           decay=0.8, warm_start=True, cache_dir=CACHE_DIR, tariff=None, clock=time.perf_counter):
+    """Control ``site_id`` slot by slot for ``days`` days from ``start_day``, with forecasts from past data only.
+
+    ``start_day`` must be at least 1 so that the forecasts have a day of history.
+    """
+    site = load_site_arrays(site_id, cache_dir)
+    load, pv = site['load_kw'], site['pv_kw']
+    c_g, c_pv = site_prices(site, tariff)
+    params = dict(params or DEFAULT_PARAMS)
+    controller = ModelPredictiveController(backend or get_backend(), params, model, horizon, budget, warm_start,
+                                           clock=clock)
+
+    first, steps = start_day * N, days * N
+    if first + steps > len(load):
+        raise ValueError(f"site {site_id} has {len(load) // N} days, cannot replay to day {start_day + days}")
+    executed = {name: np.empty(steps) for name in EXECUTED}
+    cost, latency = np.empty(steps), np.empty(steps)
+    fallback, status = np.empty(steps, dtype=bool), np.empty(steps, dtype=object)
+    eb = float(params['eb1'])
+    controller.warm_up(eb, forecast(load, first, horizon, decay=decay), forecast(pv, first, horizon, decay=decay),
+                       window(c_g, first, horizon), window(c_pv, first, horizon))
+    for i, t in enumerate(range(first, first + steps)):
+        setpoint, record = controller.step(eb, forecast(load, t, horizon, decay=decay),
+                                           forecast(pv, t, horizon, decay=decay),
+                                           window(c_g, t, horizon), window(c_pv, t, horizon))
+        flows, eb, cost[i] = execute(eb, setpoint, load[t], pv[t], c_g[t], c_pv[t], params)
+        for name in EXECUTED:
+            executed[name][i] = flows[name]
+        latency[i], fallback[i], status[i] = record['latency'], record['fallback'], record['status']
+    return Replay(first, executed, cost, latency, fallback, status)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--site', type=int, default=152786204)
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--start-day', type=int, default=1)
+    parser.add_argument('--model', default=MPC_MODEL)
+    parser.add_argument('--budget', type=float, default=0.2, help="seconds per step")
+    parser.add_argument('--backend', default='auto', choices=('auto', 'ampl', 'highs'))
+    parser.add_argument('--no-warm-start', action='store_true')
+    args = parser.parse_args(argv)
+
+    with get_backend(args.backend) as backend:
+        result = replay(args.site, args.days, args.start_day, backend=backend, model=args.model, budget=args.budget,
+                        warm_start=not args.no_warm_start)
+    for key, value in result.summary(args.budget).items():
+        print(f"{key:15} {value:.6g}" if isinstance(value, float) else f"{key:15} {value}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""Streaming year-long simulation with bounded memory and checkpoint/resume.
+
+Days are read lazily from the memory-mapped site cache and solved one at a time
+on a rolling horizon. The SOC each day ends at is the next day's ``eb1``. Results
+are appended to ``<out_dir>/site_<site_id>.csv`` every ``chunk_days`` days. After
+each append, ``site_<site_id>.checkpoint.json`` records the next day to solve, the
+SOC to start it at and the size of the CSV. An interrupted run started again
+with the same arguments truncates any rows written after the last checkpoint and
+carries on from there. Memory holds one horizon of inputs and one chunk of
+results per worker, however long the run or however many sites.
+
+    python -m hems.pipeline --days 365 --workers 8 --out results
+"""
+import argparse
+import json
+import os
+import pathlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .backends import process_backend, set_process_backend
+from .data import CACHE_DIR, load_site_arrays, open_store
+from .results import ResultCollector
+from .rolling_horizon import HORIZON, N, RollingHorizon
+from .runner import DEFAULT_PARAMS, horizon_window, resolve_sites, site_directories
+from .tariff import site_prices
+
+
+def iter_days(site_id, days, n=N, horizon=HORIZON, cache_dir=CACHE_DIR, tariff=None):
+    """Yield ``(day, demand, pv, tariff, feed_in)`` horizon windows of one site, one day at a time."""
+    site = load_site_arrays(site_id, cache_dir)
+    series = (site['load_kw'], site['pv_kw'], *site_prices(site, tariff))
+    for day in days:
+        yield (day, *(horizon_window(values, day, n, horizon) for values in series))
+
+
+def checkpoint_path(out_dir, site_id):
+    return pathlib.Path(out_dir) / f'site_{site_id}.checkpoint.json'
+
+
+def read_checkpoint(out_dir, site_id):
+    path = checkpoint_path(out_dir, site_id)
+    if not path.exists():
+        return None
+    return json.loads(path.read_text())
+
+
+def write_checkpoint(out_dir, site_id, state):
+    # Write and rename so a crash never leaves half a checkpoint
+    path = checkpoint_path(out_dir, site_id)
+    tmp = path.with_suffix('.tmp')
+    tmp.write_text(json.dumps(state))
+    os.replace(tmp, path)
+
+
+def simulate_site(site_id, days=365, out_dir='results', params=None, chunk_days=30, backend=None,
+                  cache_dir=CACHE_DIR, tariff=None, model='pv_battery'):
+    """Solve days ``0 .. days-1`` of one site, resuming from its checkpoint if there is one.
+
+    Returns the path of the site's CSV.
+    """
+    backend = backend or process_backend()
+    out_dir = pathlib.Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    path = out_dir / f'site_{site_id}.csv'
+    state = read_checkpoint(out_dir, site_id)
+    if state is not None and state['days'] != days:
+        raise ValueError(f"checkpoint of site {site_id} is for {state['days']} days, not {days}")
+    if state is None or not path.exists():
+        state = {'days': days, 'next_day': 0, 'eb1': (params or DEFAULT_PARAMS)['eb1'], 'bytes': 0, 'done': False}
+    if state['done']:
+        return path
+    if path.exists():
+        with open(path, 'r+b') as file:
+            file.truncate(state['bytes'])  # Drop rows written after the last checkpoint
+
+    rolling_horizon = RollingHorizon(backend, dict(params or DEFAULT_PARAMS, eb1=state['eb1']), model=model,
+                                     carry_soc=True)
+
+    def checkpoint(collector):
+        state.update(next_day=len(collector), eb1=rolling_horizon.eb1, bytes=path.stat().st_size,
+                     done=len(collector) == days)
+        write_checkpoint(out_dir, site_id, state)
+
+    results = ResultCollector(days, N, path, chunk_days=chunk_days, written=state['next_day'], on_flush=checkpoint)
+    for day, *inputs in iter_days(site_id, range(state['next_day'], days), cache_dir=cache_dir, tariff=tariff):
+        results.add(day, rolling_horizon.solve_day(*inputs))
+    results.write()
+    return path
+
+
+def run_stream(sites=None, days=365, out_dir='results', workers=None, params=None, chunk_days=30,
+               backend='auto', tariff=None, model='pv_battery', verbose=False):
+    """Stream ``days`` days of every site on a pool of ``workers`` processes, one site per task.
+
+    ``verbose`` prints each site as it finishes.
+    """
+    site_ids = resolve_sites(sites)
+    directory, cache_dir = site_directories(sites)
+    open_store(cache_dir, directory)  # Build the .npy cache once here rather than racing in every worker
+    workers = workers or os.cpu_count() or 1
+
+    written = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=set_process_backend, initargs=(backend,)) as pool:
+        futures = [pool.submit(simulate_site, site_id, days, out_dir, params, chunk_days, cache_dir=cache_dir,
+                               tariff=tariff, model=model)
+                   for site_id in site_ids]
+        for future in as_completed(futures):
+            written.append(future.result())
+            if verbose:
+                print(f"{written[-1].name} done ({len(written)}/{len(site_ids)})")
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sites', nargs='*', type=int)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--workers', type=int, default=None, help="defaults to the number of CPU cores")
+    parser.add_argument('--chunk-days', type=int, default=30, help="days per CSV append and checkpoint")
+    parser.add_argument('--backend', default='auto', choices=('auto', 'ampl', 'highs'))
+    parser.add_argument('--model', default='pv_battery', choices=('pv_battery', 'pv_battery_tight'),
+                        help="pv_battery_tight gives the same costs with far less branching")
+    parser.add_argument('--out', default='results')
+    args = parser.parse_args(argv)
+    run_stream(args.sites or None, args.days, args.out, args.workers, chunk_days=args.chunk_days,
+               backend=args.backend, model=args.model, verbose=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,279 @@
+"""Collect solved days into preallocated arrays instead of growing a DataFrame."""
+import pathlib
+
+import numpy as np
+
+from .model import VARIABLES
+
+BINARIES = ('sb', 'dg')
+# float32 keeps about 7 significant digits, far below the solver tolerances; binaries are 0/1
+COMPACT_DTYPES = {name: np.int8 if name in BINARIES else np.float32 for name in VARIABLES}
+MISSING = -1  # Integer-stored binaries of a failed solve, whose values are NaN
+
+
+def solved(rows):
+    """Which ``(days, n)`` rows hold a solved day: failed days are NaN, or ``MISSING`` when stored as integers."""
+    rows = np.asarray(rows)
+    failed = rows == MISSING if np.issubdtype(rows.dtype, np.integer) else np.isnan(rows)
+    return ~failed.any(axis=-1)
+
+
+def by_slot(rows, how='mean'):
+    """Aggregate ``(days, n)`` rows per time slot with ``np.<how>`` ('mean', 'min', 'max', 'sum', 'std', ...).
+
+    Days whose solve failed are left out.
+    """
+    rows = np.asarray(rows)
+    rows = rows[solved(rows)]
+    if not len(rows):
+        return np.full(rows.shape[-1], np.nan)
+    return getattr(np, how)(rows.astype(np.float64), axis=0)
+
+
+def pyarrow_parquet():
+    """``(pyarrow, pyarrow.parquet)``, which writing ``.parquet`` needs; install with ``poetry install -E parquet``."""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as error:
+        raise ImportError("writing .parquet results needs pyarrow: poetry install -E parquet "
+                          "(or pip install pyarrow), or use a .csv path") from error
+    return pyarrow, pyarrow.parquet
+
+
+def stored(values, dtype):
+    """``values`` as they are stored in a ``dtype`` array: binaries are rounded to 0/1 for integer storage.
+
+    NaN, from a failed solve, becomes ``MISSING`` in integer storage.
+    """
+    if not np.issubdtype(dtype, np.integer):
+        return values
+    values = np.asarray(values, dtype=np.float64)
+    return np.where(np.isnan(values), MISSING, np.rint(values))
+
+
+class ResultCollector:
+    """Fills one ``(days, n)`` array per decision variable as days are solved.
+
+    Everything is written to ``path`` at the end with ``write``, or, with
+    ``chunk_days``, streamed out every ``chunk_days`` days so only one chunk is
+    held in memory. The output is ``ampl_results.csv``'s layout (Day, TimeSlot and
+    one column per variable), as CSV or, for a ``.parquet`` path, Parquet.
+
+    ``written`` days already in a CSV ``path`` are kept and appended to, for
+    resuming an interrupted run, and ``on_flush(collector)`` is called after every
+    chunk reaches the disk.
+
+    Values are float64 unless ``dtypes`` maps variables to others, e.g.
+    ``COMPACT_DTYPES`` (float32 powers and SOC, int8 binaries, ``MISSING`` on
+    days whose solve failed).
+    """
+
+    def __init__(self, days, n=48, path=None, chunk_days=None, variables=VARIABLES, written=0, on_flush=None,
+                 dtypes=None):
+        self.days = days
+        self.n = n
+        self.variables = tuple(variables)
+        self.path = pathlib.Path(path) if path is not None else None
+        self.streaming = chunk_days is not None
+        capacity = min(chunk_days, days) if self.streaming else days
+        self._days = np.empty(capacity, dtype=np.int64)
+        self._values = {name: np.empty((capacity, n), dtype=(dtypes or {}).get(name, np.float64))
+                        for name in self.variables}
+        self._count = 0  # Rows filled in the current chunk
+        self._flushed = 0  # Rows of the current chunk already written; a collector that is not streaming keeps them
+        self._written = written  # Rows already written to ``path``
+        self.on_flush = on_flush
+        self._parquet = None
+
+    def __len__(self):
+        return self._written + self._count - self._flushed
+
+    def add(self, day, solution):
+        """Store the first ``n`` slots of every variable of one day's solution."""
+        self.extend([day], {name: np.asarray(solution[name])[np.newaxis, :self.n] for name in self.variables})
+
+    def extend(self, days, values):
+        """Store several days at once, ``values`` holding one ``(len(days), >= n)`` array per variable."""
+        days = np.asarray(days)
+        if len(self) + len(days) > self.days:
+            raise IndexError(f"ResultCollector is full ({self.days} days)")
+        done = 0
+        while done < len(days):
+            if self._count == len(self._days):
+                self.flush()
+            rows = min(len(days) - done, len(self._days) - self._count)
+            target = slice(self._count, self._count + rows)
+            self._days[target] = days[done:done + rows]
+            for name in self.variables:
+                self._values[name][target] = stored(np.asarray(values[name])[done:done + rows, :self.n],
+                                                    self._values[name].dtype)
+            self._count += rows
+            done += rows
+        if self.streaming and self._count == len(self._days):
+            self.flush()
+
+    def arrays(self):
+        """The ``(days, n)`` arrays of the rows in memory: all of them, or the current chunk when streaming."""
+        return {name: values[:self._count] for name, values in self._values.items()}
+
+    def by_slot(self, name, how='mean'):
+        """``name`` aggregated per time slot over the rows in memory, as ``(n,)`` float64."""
+        return by_slot(self._values[name][:self._count], how)
+
+    def to_frame(self, start=0):
+        """The rows in memory from ``start`` on, in the ``ampl_results.csv`` layout."""
+        import pandas as pd
+
+        rows = slice(start, self._count)
+        return pd.DataFrame({
+            'Day': np.repeat(self._days[rows], self.n),
+            'TimeSlot': np.tile(np.arange(1, self.n + 1), self._count - start),
+            **{name: values[rows].ravel() for name, values in self._values.items()},
+        })
+
+    def flush(self):
+        """Append the rows not yet written to ``path``; when streaming, start a new chunk."""
+        if self.path is None:
+            raise ValueError("ResultCollector has no output path")
+        if self._count == self._flushed:
+            return
+        frame = self.to_frame(self._flushed)
+        if self.path.suffix == '.parquet':
+            pa, pq = pyarrow_parquet()
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self._parquet is None:
+                self._parquet = pq.ParquetWriter(self.path, table.schema)
+            self._parquet.write_table(table)
+        else:
+            frame.to_csv(self.path, mode='a' if self._written else 'w', header=not self._written, index=False)
+        self._written += self._count - self._flushed
+        if self.streaming:
+            self._count = 0
+        self._flushed = self._count
+        if self.on_flush is not None:
+            self.on_flush(self)
+
+    def write(self):
+        """Write out whatever has not been written yet and close the file."""
+        self.flush()
+        if self._parquet is not None:
+            self._parquet.close()
+            self._parquet = None
+        return self.path
+
+
+class ResultStore:
+    """Solved days of many sites and scenarios, one preallocated ``(sites, scenarios, days, n)`` array per variable.
+
+    A value's site, scenario, day and slot are its position, so no Day or TimeSlot
+    columns are stored. With the default ``COMPACT_DTYPES`` a slot takes 22 bytes
+    instead of the 72 of a float64 ``ampl_results.csv`` row. ``filled`` marks the
+    days stored so far, and only those enter ``by_slot`` and ``save``; days whose
+    solve failed are kept, as NaN and ``MISSING``, but left out of ``by_slot``.
+    """
+
+    def __init__(self, site_ids, days, n=48, scenarios=1, variables=VARIABLES, dtypes=COMPACT_DTYPES):
+        self.site_ids = np.asarray(site_ids, dtype=np.int64)
+        self.days = days
+        self.n = n
+        self.scenarios = scenarios
+        self.variables = tuple(variables)
+        self._index = {int(site_id): i for i, site_id in enumerate(self.site_ids)}
+        shape = (len(self.site_ids), scenarios, days, n)
+        # np.zeros leaves untouched pages unallocated, so a sparse store costs only what is filled
+        self.values = {name: np.zeros(shape, dtype=dtypes.get(name, np.float64)) for name in self.variables}
+        self.filled = np.zeros(shape[:3], dtype=bool)
+
+    @property
+    def nbytes(self):
+        return sum(values.nbytes for values in self.values.values()) + self.filled.nbytes
+
+    def add(self, site_id, day, solution, scenario=0):
+        """Store the first ``n`` slots of every variable of one day's solution."""
+        self.extend(site_id, [day], {name: np.asarray(solution[name])[np.newaxis] for name in self.variables}, scenario)
+
+    def extend(self, site_id, days, values, scenario=0):
+        """Store several days of one site, ``values`` holding one ``(len(days), >= n)`` array per variable.
+
+        This is what ``runner.solve_days`` returns.
+        """
+        site, days = self._index[int(site_id)], np.asarray(days)
+        for name in self.variables:
+            target = self.values[name][site, scenario]
+            target[days] = stored(np.asarray(values[name])[:, :self.n], target.dtype)
+        self.filled[site, scenario, days] = True
+
+    def rows(self, name, site_id=None, scenario=None):
+        """The filled ``(days, n)`` rows of ``name``, of one site and/or scenario or of all of them."""
+        sites = slice(None) if site_id is None else self._index[int(site_id)]
+        scenarios = slice(None) if scenario is None else scenario
+        return self.values[name][sites, scenarios][self.filled[sites, scenarios]]
+
+    def by_slot(self, name, how='mean', site_id=None, scenario=None):
+        """``name`` aggregated per time slot over the filled days, as ``(n,)`` float64."""
+        return by_slot(self.rows(name, site_id, scenario), how)
+
+    def to_frame(self, site_id, scenario=0):
+        """One site and scenario in the ``ampl_results.csv`` layout."""
+        import pandas as pd
+
+        site = self._index[int(site_id)]
+        days = np.flatnonzero(self.filled[site, scenario])
+        return pd.DataFrame({
+            'Day': np.repeat(days, self.n),
+            'TimeSlot': np.tile(np.arange(1, self.n + 1), len(days)),
+            **{name: values[site, scenario, days].ravel() for name, values in self.values.items()},
+        })
+
+    def save(self, path):
+        """Spill the store to ``.npz`` (binaries bit-packed) or to ``.parquet``, one row group per site."""
+        path = pathlib.Path(path)
+        if path.suffix == '.parquet':
+            self._save_parquet(path)
+            return path
+        arrays = {}
+        failed = np.zeros_like(self.filled)  # Bit-packing cannot keep MISSING
+        for name, values in self.values.items():
+            if name in BINARIES:
+                failed |= (values == MISSING).any(axis=-1)
+                values = np.packbits(values == 1, axis=-1)
+            arrays[name] = values
+        np.savez(path, site_ids=self.site_ids, filled=self.filled, failed=failed, n=self.n, **arrays)
+        return path
+
+    def _save_parquet(self, path):
+        pa, pq = pyarrow_parquet()
+        writer = None
+        for site, site_id in enumerate(self.site_ids):
+            scenario, day = np.nonzero(self.filled[site])
+            table = pa.table({
+                'site_id': np.full(len(day) * self.n, site_id),
+                'scenario': np.repeat(scenario, self.n).astype(np.int16),
+                'Day': np.repeat(day, self.n).astype(np.int32),
+                'TimeSlot': np.tile(np.arange(1, self.n + 1, dtype=np.int8), len(day)),
+                **{name: values[site, scenario, day].ravel() for name, values in self.values.items()},
+            })
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+        if writer is not None:
+            writer.close()
+
+    @classmethod
+    def load(cls, path):
+        """Read a store written by ``save`` to ``.npz``."""
+        with np.load(path) as data:
+            filled, n = data['filled'], int(data['n'])
+            variables = [name for name in VARIABLES if name in data]
+            store = cls(data['site_ids'], filled.shape[2], n, filled.shape[1], variables,
+                        {name: np.int8 if name in BINARIES else data[name].dtype for name in variables})
+            for name in variables:
+                values = data[name]
+                if name in BINARIES:
+                    values = np.unpackbits(values, axis=-1, count=n).view(np.int8)
+                    if 'failed' in data:
+                        values[data['failed']] = MISSING
+                store.values[name][...] = values
+            store.filled[...] = filled
+        return store
@@ -0,0 +1,74 @@
+import numpy as np
+
+N = 48  # Number of time slots in a day (half-hourly intervals)
+HORIZON = 2 * N  # Two-day rolling horizon, only the first day is kept
+
+START_VARS = ('sb', 'dg', 'eb')  # Passed to the solver as the MIP start
+
+
+def shift_schedule(values, n=N):
+    """Shift a horizon-long schedule forward by one day.
+
+    The second day of yesterday's plan becomes the first day of today's start,
+    and is repeated for the new second day since nothing better is known yet.
+    """
+    tail = values[n:]
+    return np.concatenate([tail, tail])[:len(values)]
+
+
+class RollingHorizon:
+    """Re-solve the same ``hems_pv_battery.mod`` instance day by day.
+
+    The backend keeps the model loaded (for AMPL the set ``D`` is assigned once),
+    so each day only updates ``Pd``, ``Ppv`` and ``c_g``. The previous solution,
+    shifted by one day, is passed to the solver as a MIP start. With ``carry_soc``
+    the SOC the kept day ends at becomes the next day's ``eb1``; otherwise every day
+    starts at ``params['eb1']``.
+    """
+
+    def __init__(self, backend, params, model='pv_battery', n=N, horizon=HORIZON, warm_start=True,
+                 carry_soc=False):
+        self.backend = backend
+        self.params = dict(params)
+        self.model = model
+        self.n = n
+        self.horizon = horizon
+        self.warm_start = warm_start
+        self.carry_soc = carry_soc
+        self._initial_eb1 = self.params['eb1']
+        self._previous = None
+
+    def solve_day(self, demand, pv, tariff, feed_in=None):
+        """Solve one horizon and return the first ``n`` slots of every decision variable.
+
+        ``feed_in`` is the per-slot export price; without it ``params['c_pv']`` (or
+        the model's default) applies.
+        """
+        inputs = (('Pd', demand), ('Ppv', pv), ('c_g', tariff)) + ((('c_pv', feed_in),) if feed_in is not None else ())
+        for name, values in inputs:
+            if len(values) != self.horizon:
+                raise ValueError(f"{name} has {len(values)} values, expected {self.horizon}")
+        params = dict(self.params, **dict(inputs))
+
+        start = None
+        if self.warm_start and self._previous is not None:
+            start = {name: shift_schedule(self._previous[name], self.n) for name in START_VARS}
+
+        solution = self.backend.solve(self.model, params, start=start)
+        self._previous = solution.values
+        if self.carry_soc:
+            if not solution.ok:
+                raise RuntimeError(f"{self.model} solve failed ({solution.status}), no SOC to carry to the next day")
+            # eb at slot n+1 of the horizon is the SOC the next day starts with
+            self.params['eb1'] = float(solution['eb'][self.n])
+        return solution.head(self.n)
+
+    @property
+    def eb1(self):
+        """Start-of-day SOC of the next day to be solved."""
+        return self.params['eb1']
+
+    def reset(self, eb1=None):
+        """Forget the previous schedule and SOC, e.g. when switching to another site."""
+        self._previous = None
+        self.params['eb1'] = self._initial_eb1 if eb1 is None else eb1
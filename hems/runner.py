@@ -0,0 +1,180 @@
+"""Run the PV-battery HEMS over many sites and days on a process pool.
+
+Each site's year is split into chunks of consecutive days. Chunks are solved by
+worker processes that each own one solver backend, and a site's results are
+written to ``<out_dir>/site_<site_id>.csv`` as soon as all of its chunks are done.
+
+    python -m hems.runner --days 365 --workers 8 --out results
+"""
+import argparse
+import os
+import pathlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from .backends import process_backend, set_process_backend
+from .data import CACHE_DIR, SITE_DIR, list_sites, load_site_arrays, open_store
+from .results import ResultCollector
+from .rolling_horizon import HORIZON, N, RollingHorizon
+from .tariff import site_prices
+
+DEFAULT_PARAMS = {
+    'etaBc': np.sqrt(0.84),  # Battery charge and discharge efficiency
+    'ebM': 10,  # Max battery storage in kWh
+    'ebm': 0,  # Min battery storage in kWh
+    'PbM': 5,  # Max battery charge/discharge rate in kW
+    'eb1': 0,  # Start-of-day battery state of charge (SOC)
+}
+
+
+def horizon_window(values, day, n=N, horizon=HORIZON):
+    """Slots ``day*n`` to ``day*n + horizon``, padded by repeating the last day at the end of the data."""
+    window = values[day * n:day * n + horizon]
+    if len(window) < horizon:
+        window = np.concatenate([window, np.resize(window[-n:], horizon - len(window))])
+    return window
+
+
+def horizon_inputs(site_id, day, cache_dir=CACHE_DIR, tariff=None):
+    """``Pd``, ``Ppv``, ``c_g`` and ``c_pv`` of one site's two-day horizon starting on ``day``."""
+    site = load_site_arrays(site_id, cache_dir)
+    series = (site['load_kw'], site['pv_kw'], *site_prices(site, tariff))
+    return {name: horizon_window(values, day) for name, values in zip(('Pd', 'Ppv', 'c_g', 'c_pv'), series)}
+
+
+def solve_day(site_id, day, params=None, model='pv_battery', backend=None, cache_dir=CACHE_DIR, tariff=None):
+    """Solve the two-day horizon of one site starting on ``day``; returns the full-horizon ``Solution``."""
+    backend = backend or process_backend()
+    return backend.solve(model, dict(params or DEFAULT_PARAMS, **horizon_inputs(site_id, day, cache_dir, tariff)))
+
+
+def solve_days(site_id, days, params=None, backend=None, cache_dir=CACHE_DIR, tariff=None):
+    """Solve consecutive ``days`` of one site; returns the days and their per-variable ``(days, N)`` arrays.
+
+    ``tariff`` is a ``tariff.Tariff``, the bundled time-of-use tariff by default.
+    """
+    backend = backend or process_backend()
+    site = load_site_arrays(site_id, cache_dir)
+    series = [site['load_kw'], site['pv_kw'], *site_prices(site, tariff)]
+    rolling_horizon = RollingHorizon(backend, params or DEFAULT_PARAMS)
+
+    results = ResultCollector(len(days), N)
+    for day in days:
+        results.add(day, rolling_horizon.solve_day(*(horizon_window(values, day) for values in series)))
+    return days, results.arrays()
+
+
+def solve_days_batched(site_id, days, params=None, backend=None, couple=False, cache_dir=CACHE_DIR, tariff=None):
+    """Solve all ``days`` of one site in a single ``hems_pv_battery_multiday.mod`` solve.
+
+    Without ``couple`` each day keeps its own two-day horizon and the model is
+    block-diagonal, giving the same optimum as solving the days one by one. With
+    ``couple`` the days must be consecutive: each is a single day and the battery
+    SOC carries over between them.
+    """
+    backend = backend or process_backend()
+    site = load_site_arrays(site_id, cache_dir)
+    c_g, c_pv = site_prices(site, tariff)
+    series = {'Pd': site['load_kw'], 'Ppv': site['pv_kw'], 'c_g': c_g, 'c_pv': c_pv}
+    days = np.asarray(days)
+    if couple:
+        if np.any(np.diff(days) != 1):
+            raise ValueError("coupled days must be consecutive")
+        windows = {name: values[days[0] * N:(days[-1] + 1) * N].reshape(len(days), N)
+                   for name, values in series.items()}
+    else:
+        windows = {name: np.stack([horizon_window(values, day) for day in days]) for name, values in series.items()}
+
+    model_params = dict(params or DEFAULT_PARAMS, couple=int(couple), **windows)
+    solution = backend.solve('pv_battery_multiday', model_params)
+    return days, solution.head(N)
+
+
+def resolve_sites(sites=None):
+    """Accept a list of site IDs, a directory of ``halfhourly_*.csv`` files, or ``None`` for the bundled data."""
+    if sites is None:
+        return list_sites(SITE_DIR)
+    if isinstance(sites, (str, os.PathLike)):
+        return list_sites(sites)
+    return [int(site_id) for site_id in sites]
+
+
+def site_directories(sites=None):
+    """The data directory and ``.npy`` cache directory of ``sites``, as accepted by ``resolve_sites``."""
+    if isinstance(sites, (str, os.PathLike)) and pathlib.Path(sites).resolve() != SITE_DIR.resolve():
+        return pathlib.Path(sites), pathlib.Path(sites) / 'cache'
+    return SITE_DIR, CACHE_DIR
+
+
+MODES = ('daily', 'batched', 'coupled')
+
+
+def run_sites(sites=None, days=365, out_dir='results', workers=None, params=None,
+              backend='auto', days_per_task=30, mode='daily', tariff=None, verbose=False):
+    """Solve ``days`` days for every site on a pool of ``workers`` processes.
+
+    ``mode`` is 'daily' (one rolling-horizon solve per day), 'batched' (each chunk
+    of days in one block-diagonal solve) or 'coupled' (each chunk as one horizon with
+    the SOC carried between days). ``workers`` defaults to the number of CPU cores.
+    Returns the paths of the per-site CSV files, in the order the sites finished;
+    ``verbose`` prints each site as it finishes.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode {mode!r}, expected one of {MODES}")
+    site_ids = resolve_sites(sites)
+    directory, cache_dir = site_directories(sites)
+    open_store(cache_dir, directory)  # Build the .npy cache once here rather than racing in every worker
+    out_dir = pathlib.Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+
+    chunks = [np.arange(start, min(start + days_per_task, days)) for start in range(0, days, days_per_task)]
+    pending = {site_id: [] for site_id in site_ids}
+    written = []
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=set_process_backend, initargs=(backend,)) as pool:
+        if mode == 'daily':
+            futures = {
+                pool.submit(solve_days, site_id, chunk, params, cache_dir=cache_dir, tariff=tariff): site_id
+                for site_id in site_ids for chunk in chunks
+            }
+        else:
+            futures = {
+                pool.submit(solve_days_batched, site_id, chunk, params, couple=mode == 'coupled',
+                            cache_dir=cache_dir, tariff=tariff): site_id
+                for site_id in site_ids for chunk in chunks
+            }
+        for future in as_completed(futures):
+            site_id = futures[future]
+            pending[site_id].append(future.result())
+            if len(pending[site_id]) == len(chunks):
+                results = ResultCollector(days, N, out_dir / f'site_{site_id}.csv')
+                for chunk_days, values in sorted(pending.pop(site_id), key=lambda chunk: chunk[0][0]):
+                    results.extend(chunk_days, values)
+                written.append(results.write())
+                if verbose:
+                    print(f"site {site_id} done ({len(written)}/{len(site_ids)})")
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sites', nargs='*', help="site IDs or a directory of halfhourly_*.csv files")
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--workers', type=int, default=None, help="defaults to the number of CPU cores")
+    parser.add_argument('--days-per-task', type=int, default=30)
+    parser.add_argument('--backend', default='auto', choices=('auto', 'ampl', 'highs'))
+    parser.add_argument('--mode', default='daily', choices=MODES)
+    parser.add_argument('--out', default='results')
+    args = parser.parse_args(argv)
+
+    sites = args.sites
+    if sites and len(sites) == 1 and os.path.isdir(sites[0]):
+        sites = sites[0]
+    run_sites(sites or None, args.days, args.out, args.workers, backend=args.backend,
+              days_per_task=args.days_per_task, mode=args.mode, verbose=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""Content-addressed on-disk cache of solved models.
+
+A solve is identified by the model (name and ``.mod`` file contents), the backend
+and every parameter, with arrays quantised to ``quantum`` so that inputs differing
+only by floating point noise share an entry. Each entry is one ``.npz`` holding the
+decision variables, the objective and the solve status. Reading an entry refreshes
+its modification time, and once the cache grows past ``max_bytes`` the least
+recently used entries are deleted.
+"""
+import hashlib
+import os
+import pathlib
+import tempfile
+
+import numpy as np
+
+from .backends import Backend, Solution
+from .data import CACHE_DIR
+from .model import get_model
+
+SOLVE_CACHE_DIR = CACHE_DIR / 'solves'
+CACHE_VERSION = 1  # Bump when a builder changes in a way that changes solutions
+CACHED_STATUSES = ('solved', 'infeasible')  # Time or node limits are not reproducible
+
+
+class SolveCache:
+    def __init__(self, directory=SOLVE_CACHE_DIR, max_bytes=2 * 1024 ** 3, quantum=1e-6):
+        self.directory = pathlib.Path(directory)
+        self.max_bytes = max_bytes
+        self.quantum = quantum
+        self.hits = self.misses = 0
+        self._mod_hashes = {}
+        self._size = None  # Bytes on disk, counted on the first store
+
+    def key(self, spec, params, backend_name):
+        """Hex digest identifying one solve of ``spec`` with ``params``."""
+        digest = hashlib.sha256()
+        digest.update(f'{CACHE_VERSION}:{backend_name}:{spec.name}:'.encode())
+        digest.update(self._mod_hash(spec))
+        for name in sorted(params):
+            values = np.asarray(params[name], dtype=float)
+            digest.update(f'{name}{values.shape}'.encode())
+            digest.update(np.round(values / self.quantum).astype(np.int64).tobytes())
+        return digest.hexdigest()
+
+    def _mod_hash(self, spec):
+        if spec.mod_file not in self._mod_hashes:
+            self._mod_hashes[spec.mod_file] = hashlib.sha256(spec.mod_file.read_bytes()).digest()
+        return self._mod_hashes[spec.mod_file]
+
+    def _path(self, key):
+        return self.directory / key[:2] / f'{key}.npz'
+
+    def get(self, key):
+        """The cached ``Solution`` for ``key``, or ``None``."""
+        path = self._path(key)
+        try:
+            with np.load(path) as entry:
+                values = {name[4:]: entry[name] for name in entry.files if name.startswith('var_')}
+                solution = Solution(values, float(entry['objective']), str(entry['status']),
+                                    {'solve_time': float(entry['solve_time']), 'cached': True})
+        except (FileNotFoundError, OSError, ValueError, KeyError):
+            self.misses += 1
+            return None
+        os.utime(path)  # Mark as recently used
+        self.hits += 1
+        return solution
+
+    def put(self, key, solution):
+        if solution.status not in CACHED_STATUSES:
+            return
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file and rename, so parallel workers never read half an entry
+        with tempfile.NamedTemporaryFile(dir=path.parent, suffix='.tmp', delete=False) as file:
+            np.savez(file, objective=solution.objective, status=solution.status,
+                     solve_time=solution.stats.get('solve_time', np.nan),
+                     **{f'var_{name}': values for name, values in solution.values.items()})
+        os.replace(file.name, path)
+
+        if self._size is None:
+            self._size = self.size()
+        else:
+            self._size += path.stat().st_size
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def entries(self):
+        return list(self.directory.glob('*/*.npz'))
+
+    def size(self):
+        return sum(path.stat().st_size for path in self.entries())
+
+    def evict(self, max_bytes=None):
+        """Delete least recently used entries until the cache fits in ``max_bytes``."""
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = []
+        for path in self.entries():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:  # Evicted by another process
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+        self._size = total
+
+    def clear(self):
+        self.evict(0)
+
+
+class CachedBackend(Backend):
+    """Wraps a backend so that solves already in ``cache`` are read from disk instead."""
+
+    def __init__(self, backend, cache=None):
+        self.backend = backend
+        self.cache = cache if cache is not None else SolveCache()
+        self.name = backend.name
+
+    def solve(self, model, params, start=None):
+        spec = get_model(model)
+        with self.tracer.phase('cache_lookup'):
+            key = self.cache.key(spec, spec.with_defaults(params), self.backend.name)
+            solution = self.cache.get(key)
+        if solution is not None:
+            self.tracer.solved(solution)
+            return solution
+        solution = self.backend.solve(model, params, start=start)
+        with self.tracer.phase('cache_store'):
+            self.cache.put(key, solution)
+        return solution
+
+    def instrument(self, tracer):
+        self.backend.instrument(tracer)
+        return super().instrument(tracer)
+
+    def set_time_limit(self, seconds):
+        self.backend.set_time_limit(seconds)
+
+    def __getattr__(self, name):
+        # solve_problem and friends go straight to the wrapped backend
+        return getattr(self.backend, name)
+
+    def close(self):
+        self.backend.close()
@@ -0,0 +1,224 @@
+"""Two-stage stochastic EV scheduling over Markov availability scenarios.
+
+A day's EV behaviour is uncertain: when it leaves, when it comes back and how much
+it drives. Rather than solving ``hems_pv_battery_ev.mod`` once per sampled day, as
+``monte_carlo`` does, this module:
+ - samples many days from ``markov_weekday``/``markov_weekend``
+ - drops the infeasible ones with a solve-free SOC check
+ - clusters the rest with k-means into a few representative scenarios
+ - solves ``hems_pv_battery_ev_stochastic.mod`` once for all of them
+
+The decisions of the first ``here_and_now`` slots are shared by every scenario and
+are the ones to act on. The rest of the day is a recourse plan per scenario.
+
+    python -m hems.stochastic_ev --site 289382707 --day 7 --scenarios 500 --clusters 10
+"""
+import argparse
+
+import numpy as np
+
+from .backends import HighsBackend, process_backend
+from .data import load_site_arrays
+from .ev import N, ev_day_params
+from .markov_functions import markov_weekday, markov_weekend
+from .model import VARIABLES, get_model
+from .monte_carlo import FIRST_MONDAY, charge_rate, max_charge_level, min_charge_level
+
+SCENARIO_FIELDS = ('early_commute', 'late_commute', 'travel_perc')
+
+
+class Scenarios:
+    """EV days as ``(count, 48)`` availability and minimum charge arrays, travel usages and probabilities."""
+
+    def __init__(self, availability, min_charge, usage, prob=None):
+        self.availability = np.asarray(availability, dtype=float)
+        self.min_charge = np.asarray(min_charge, dtype=float)
+        self.usage = np.asarray(usage, dtype=float)
+        self.prob = np.full(len(self.usage), 1 / len(self.usage)) if prob is None else np.asarray(prob, dtype=float)
+
+    def __len__(self):
+        return len(self.usage)
+
+    def subset(self, index, prob=None):
+        """The scenarios at ``index``, with ``prob`` or their own probabilities renormalised."""
+        prob = self.prob[index] if prob is None else prob
+        return Scenarios(self.availability[index], self.min_charge[index], self.usage[index], prob / np.sum(prob))
+
+    def day_params(self, k, max_charge=None):
+        """``hems_pv_battery_ev.mod`` parameters of scenario ``k`` alone."""
+        max_charge = np.full(N, float(max_charge_level)) if max_charge is None else max_charge
+        return ev_day_params(self.availability[k], self.min_charge[k], max_charge, self.usage[k])
+
+
+def sample_scenarios(count, weekend=False, rng=None):
+    """Draw ``count`` equally likely EV days: Markov availability and a uniform travel usage."""
+    rng = rng if isinstance(rng, np.random.Generator) else np.random.default_rng(rng)
+    markov = markov_weekend if weekend else markov_weekday
+    availability, min_charge = markov(min_charge_level, charge_rate, size=count, rng=rng)
+    return Scenarios(availability, min_charge, rng.random(count))
+
+
+def feasible(scenarios, inputs, max_charge=None):
+    """Which scenarios have a feasible EV day, from the highest SOC each slot can reach; no solves needed.
+
+    Charging as fast as the EV's availability and the grid connection allow maximises
+    the SOC everywhere, so a scenario is feasible exactly when that trajectory stays
+    above the minimum charge.
+    """
+    params = [scenarios.day_params(k, max_charge) for k in range(len(scenarios))]
+    spec = get_model('pv_battery_ev')
+    defaults = spec.with_defaults(dict(params[0], **inputs))
+    dt, etaBc, etaI, PgM = defaults['dt'], defaults['etaBc'], defaults['etaI'], defaults['PgM']
+    ebM = np.stack([p['ebM'] for p in params])
+    ebm = np.stack([p['ebm'] for p in params])
+    early, late, travel = (np.array([p[name] for p in params]) for name in SCENARIO_FIELDS)
+    headroom = (PgM + etaI * np.asarray(inputs['Ppv']) - np.asarray(inputs['Pd'])) / (etaI * etaBc)
+    charge = np.clip(np.minimum(scenarios.availability, headroom), 0, None)
+
+    eb = np.full(len(scenarios), float(params[0]['eb1']))
+    ok = (eb >= ebm[:, 0]) & (eb <= ebM[:, 0])
+    for d in range(2, N + 1):  # The if/else chain of battery_operation_ev
+        commute = (d == early) | (d == late)
+        eb = np.where(commute, eb - travel * ebM[:, d - 1],
+                      np.minimum(ebM[:, d - 1], eb + dt * etaBc * charge[:, d - 2]))
+        if d == defaults['N']:
+            eb = np.where(commute, eb, 0.2 * ebM[:, d - 1])
+        ok &= eb >= ebm[:, d - 1] - 1e-9
+    return ok
+
+
+def reduce_scenarios(scenarios, clusters, rng=None, iterations=100):
+    """Cluster ``scenarios`` with k-means and keep the member nearest each centre, weighted by its cluster.
+
+    Availability and minimum charge are scaled to [0, 1] per slot; the travel usage
+    counts as much as a whole profile since it moves the SOC just as much.
+    """
+    if len(scenarios) <= clusters:
+        return scenarios
+    rng = rng if isinstance(rng, np.random.Generator) else np.random.default_rng(rng)
+    features = np.hstack([scenarios.availability / charge_rate,
+                          (scenarios.min_charge - 1) / (min_charge_level - 1),
+                          np.sqrt(N) * scenarios.usage[:, np.newaxis]])
+
+    # k-means++ seeding, then Lloyd iterations weighted by probability
+    centres = features[[rng.choice(len(features), p=scenarios.prob)]]
+    while len(centres) < clusters:
+        distance = ((features[:, np.newaxis] - centres) ** 2).sum(axis=2).min(axis=1) * scenarios.prob
+        if not distance.sum():
+            break  # Fewer distinct scenarios than clusters
+        centres = np.vstack([centres, features[rng.choice(len(features), p=distance / distance.sum())]])
+    for _ in range(iterations):
+        labels = ((features[:, np.newaxis] - centres) ** 2).sum(axis=2).argmin(axis=1)
+        used = np.unique(labels)
+        updated = np.stack([np.average(features[labels == c], axis=0, weights=scenarios.prob[labels == c])
+                            for c in used])
+        if len(used) == len(centres) and np.allclose(updated, centres):
+            break
+        centres = updated
+
+    labels = ((features[:, np.newaxis] - centres) ** 2).sum(axis=2).argmin(axis=1)
+    members = [np.flatnonzero(labels == c) for c in np.unique(labels)]
+    keep = [cluster[((features[cluster] - centres[c]) ** 2).sum(axis=1).argmin()] for c, cluster in
+            zip(np.unique(labels), members)]
+    return scenarios.subset(np.array(keep), np.array([scenarios.prob[cluster].sum() for cluster in members]))
+
+
+def stochastic_params(scenarios, inputs, here_and_now=1, max_charge=None):
+    """``hems_pv_battery_ev_stochastic.mod`` parameters: the day's ``inputs`` shared, the EV per scenario."""
+    params = [scenarios.day_params(k, max_charge) for k in range(len(scenarios))]
+    return {
+        **params[0],
+        **{name: np.stack([p[name] for p in params]) for name in ('ebM', 'ebm', 'PbM')},
+        **{name: np.array([p[name] for p in params]) for name in SCENARIO_FIELDS},
+        **{name: np.broadcast_to(np.asarray(values, dtype=float), (len(scenarios), N)) for name, values in inputs.items()},
+        'prob': scenarios.prob,
+        'S': here_and_now,
+    }
+
+
+def solve_stochastic_day(inputs, scenarios, here_and_now=1, backend=None, max_charge=None):
+    """One solve over all ``scenarios``; returns the solution, ``(scenarios, slots)`` arrays per variable.
+
+    ``inputs`` holds the day's ``Pd``, ``Ppv``, ``c_g`` and ``c_pv``. The solution's
+    objective is the expected cost; ``here_and_now_decisions`` extracts what to do now.
+    """
+    backend = backend or process_backend()
+    return backend.solve('pv_battery_ev_stochastic', stochastic_params(scenarios, inputs, here_and_now, max_charge))
+
+
+def here_and_now_decisions(solution, here_and_now=1):
+    """The first ``here_and_now`` slots of every variable, which are the same in every scenario."""
+    return {name: values[0, :here_and_now] for name, values in solution.values.items()}
+
+
+def schedule_day(inputs, weekend=False, count=500, clusters=10, here_and_now=1, rng=None, backend=None):
+    """Sample, screen and reduce scenarios, then solve them at once; returns ``(solution, scenarios)``."""
+    sampled = sample_scenarios(count, weekend, rng)
+    ok = feasible(sampled, inputs)
+    if not ok.any():
+        raise ValueError("none of the sampled EV days is feasible")
+    scenarios = reduce_scenarios(sampled.subset(np.flatnonzero(ok)), clusters, rng)
+    return solve_stochastic_day(inputs, scenarios, here_and_now, backend), scenarios
+
+
+def evaluate(decisions, inputs, scenarios, max_charge=None):
+    """Cost of acting on ``decisions`` (fixed first slots) and of perfect foresight, in each of ``scenarios``.
+
+    Returns two arrays, NaN where infeasible. Fixing variables needs the sparse
+    model, so this runs on HiGHS whatever the configured backend.
+    """
+    backend, spec = HighsBackend(), get_model('pv_battery_ev')
+    committed, foresight = np.full(len(scenarios), np.nan), np.full(len(scenarios), np.nan)
+    for k in range(len(scenarios)):
+        params = dict(scenarios.day_params(k, max_charge), **inputs)
+        problem = spec.build(params)
+        solution = backend.solve_problem(problem)
+        if solution.ok:
+            foresight[k] = solution.objective
+        problem = problem.copy()
+        for name in VARIABLES:
+            if name != 'eb':
+                idx = problem.index(name, np.arange(len(decisions[name])))
+                problem.lb[idx] = problem.ub[idx] = decisions[name]
+        solution = backend.solve_problem(problem)
+        if solution.ok:
+            committed[k] = solution.objective
+    return committed, foresight
+
+
+def day_inputs(site_id, day):
+    site = load_site_arrays(site_id)
+    slots = slice(day * N, (day + 1) * N)
+    return {'Pd': site['load_kw'][slots], 'Ppv': site['pv_kw'][slots], 'c_g': site['tariff'][slots],
+            'c_pv': site['feed_in'][slots]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--site', type=int, default=289382707)
+    parser.add_argument('--day', type=int, default=FIRST_MONDAY)
+    parser.add_argument('--scenarios', type=int, default=500, help="Markov days sampled")
+    parser.add_argument('--clusters', type=int, default=10, help="scenarios kept in the model")
+    parser.add_argument('--here-and-now', type=int, default=1, help="first-stage slots")
+    parser.add_argument('--evaluate', type=int, default=100, help="fresh scenarios to test the decision on")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    inputs = day_inputs(args.site, args.day)
+    weekend = (args.day - FIRST_MONDAY) % 7 >= 5
+    solution, scenarios = schedule_day(inputs, weekend, args.scenarios, args.clusters, args.here_and_now, rng)
+    print(f"{len(scenarios)} scenarios in one solve: {solution.status}, expected cost {solution.objective:.4f} $")
+    decisions = here_and_now_decisions(solution, args.here_and_now)
+    for name in ('Pgplus', 'Pgminus', 'Pbplus', 'Pbminus'):
+        print(f"  {name:8} {np.round(decisions[name], 3)}")
+    if args.evaluate:
+        fresh = sample_scenarios(args.evaluate, weekend, rng)
+        fresh = fresh.subset(np.flatnonzero(feasible(fresh, inputs)))
+        committed, foresight = evaluate(decisions, inputs, fresh)
+        print(f"on {len(fresh)} fresh scenarios: {np.nanmean(committed):.4f} $ acting now, "
+              f"{np.nanmean(foresight):.4f} $ with perfect foresight, {np.isnan(committed).sum()} infeasible")
+
+
+if __name__ == '__main__':
+    main()
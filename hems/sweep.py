@@ -0,0 +1,187 @@
+"""Battery sizing sweeps: the daily cost of every (ebM, PbM, etaBc) grid point at every site.
+
+Grid points are visited in snake order, so consecutive points differ in one
+parameter by one step. Each worker takes one site and a run of consecutive points
+and keeps its backend (for AMPL the loaded ``.mod``) across all of them. Each day's
+schedule for the previous point is the MIP start for the same day at the next one.
+
+Every point is first solved on a sample of screening days. A point whose
+screening-day cost, including the battery's capital cost, is more than
+``prune_margin`` $/day above the best point of its site is dropped. Only the
+remaining points are solved on the other days.
+
+    python -m hems.sweep --ebM 5 10 13.5 --PbM 2.5 5 --etaBc 0.9 0.95 --days 365 --out sweep.csv
+"""
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .backends import process_backend, set_process_backend
+from .data import CACHE_DIR, load_site_arrays, open_store
+from .model import cost
+from .rolling_horizon import N, START_VARS
+from .runner import DEFAULT_PARAMS, horizon_window, resolve_sites, site_directories
+from .tariff import site_prices
+
+GRID_PARAMS = ('ebM', 'PbM', 'etaBc')
+
+
+def grid_points(grid):
+    """The Cartesian product of ``grid`` ({name: values}) in snake order, the last name varying fastest."""
+    points = [{}]
+    for name, values in grid.items():
+        values = list(values)
+        points = [dict(point, **{name: value})
+                  for i, point in enumerate(points) for value in (values if i % 2 == 0 else values[::-1])]
+    return points
+
+
+def capital_cost(point, kwh_price=0.0, kw_price=0.0, lifetime_years=10):
+    """Battery purchase cost spread over its lifetime, in $/day."""
+    return (point['ebM'] * kwh_price + point['PbM'] * kw_price) / (lifetime_years * 365)
+
+
+def solve_points(site_id, points, days, params=None, backend=None, cache_dir=CACHE_DIR):
+    """Total cost of ``days`` of one site at each grid point, warm-starting each point from the one before.
+
+    Returns the summed cost of the kept day of each horizon and the number of
+    infeasible days, one value per point.
+    """
+    backend = backend or process_backend()
+    site = load_site_arrays(site_id, cache_dir)
+    c_g, c_pv = site_prices(site)
+    series = {'Pd': site['load_kw'], 'Ppv': site['pv_kw'], 'c_g': c_g, 'c_pv': c_pv}
+    windows = [{name: horizon_window(values, day) for name, values in series.items()} for day in days]
+
+    totals = np.zeros(len(points))
+    infeasible = np.zeros(len(points), dtype=np.int64)
+    previous = [None] * len(days)
+    for i, point in enumerate(points):
+        point_params = dict(params or DEFAULT_PARAMS, **point)
+        for j, window in enumerate(windows):
+            day_params = dict(point_params, **window)
+            start = None
+            if previous[j] is not None:
+                start = {name: previous[j][name] for name in START_VARS}
+                start['eb'] = np.clip(start['eb'], point_params['ebm'], point_params['ebM'])
+            solution = backend.solve('pv_battery', day_params, start=start)
+            if not solution.ok:
+                infeasible[i] += 1
+                previous[j] = None
+                continue
+            totals[i] += cost(solution.head(N), day_params)
+            previous[j] = solution.values
+    return totals, infeasible
+
+
+def _chunks(points, size):
+    return [points[start:start + size] for start in range(0, len(points), size)]
+
+
+def _solve_all(pool, site_ids, points, days, params, points_per_task, cache_dir):
+    """Solve ``points[site_id]`` on ``days`` for every site; returns {site_id: (totals, infeasible)}."""
+    futures = {
+        site_id: [pool.submit(solve_points, site_id, chunk, days, params, cache_dir=cache_dir)
+                  for chunk in _chunks(points[site_id], points_per_task)]
+        for site_id in site_ids if len(days) and points[site_id]
+    }
+    results = {}
+    for site_id in site_ids:
+        done = [future.result() for future in futures.get(site_id, [])]
+        results[site_id] = (
+            np.concatenate([totals for totals, _ in done]) if done else np.zeros(len(points[site_id])),
+            np.concatenate([infeasible for _, infeasible in done]) if done else np.zeros(len(points[site_id]), int),
+        )
+    return results
+
+
+def sweep(grid, sites=None, days=365, params=None, screen_every=7, prune_margin=0.1,
+          kwh_price=0.0, kw_price=0.0, lifetime_years=10, workers=None, backend='auto', points_per_task=8):
+    """Cost surface of the battery ``grid`` ({'ebM': [...], 'PbM': [...], 'etaBc': [...]}) over ``sites``.
+
+    ``days`` is a number of days from the start of the data or a list of day
+    indices. Every ``screen_every``-th day is a screening day. ``prune_margin=None``
+    solves every point on every day. Returns one row per site and grid point, with
+    costs in $/day: ``screen_cost`` over the screening days and ``energy_cost`` over
+    all days (NaN when pruned), ``capital_cost``, ``total_cost`` and ``pruned``.
+    """
+    import pandas as pd
+
+    unknown = set(grid) - set(GRID_PARAMS)
+    if unknown:
+        raise ValueError(f"Unknown grid parameters {sorted(unknown)}, expected some of {GRID_PARAMS}")
+    site_ids = resolve_sites(sites)
+    directory, cache_dir = site_directories(sites)
+    open_store(cache_dir, directory)  # Build the .npy cache once here rather than racing in every worker
+    days = np.arange(days) if np.ndim(days) == 0 else np.asarray(days)
+    screening = days[::screen_every] if prune_margin is not None else days
+    rest = np.setdiff1d(days, screening)
+    base = params or DEFAULT_PARAMS
+    points = [dict({name: base[name] for name in GRID_PARAMS}, **point) for point in grid_points(grid)]
+    capital = np.array([capital_cost(point, kwh_price, kw_price, lifetime_years) for point in points])
+    workers = workers or os.cpu_count() or 1
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=set_process_backend, initargs=(backend,)) as pool:
+        screened = _solve_all(pool, site_ids, {site_id: points for site_id in site_ids},
+                              screening, params, points_per_task, cache_dir)
+        keep = {}
+        for site_id, (totals, infeasible) in screened.items():
+            screen_cost = np.where(infeasible > 0, np.inf, totals / len(screening)) + capital
+            keep[site_id] = np.ones(len(points), dtype=bool)
+            if prune_margin is not None and np.isfinite(screen_cost).any():
+                keep[site_id] = screen_cost <= screen_cost.min() + prune_margin
+        remaining = _solve_all(pool, site_ids, {site_id: [p for p, k in zip(points, keep[site_id]) if k]
+                                                for site_id in site_ids},
+                               rest, params, points_per_task, cache_dir)
+
+    rows = []
+    for site_id in site_ids:
+        totals, infeasible = screened[site_id]
+        rest_totals, rest_infeasible = np.full(len(points), np.nan), np.zeros(len(points), dtype=np.int64)
+        rest_totals[keep[site_id]], rest_infeasible[keep[site_id]] = remaining[site_id]
+        for i, point in enumerate(points):
+            energy = (totals[i] + rest_totals[i]) / len(days) if keep[site_id][i] else np.nan
+            if infeasible[i] or rest_infeasible[i]:
+                energy = np.nan
+            rows.append({
+                'site_id': site_id,
+                **point,
+                'screen_cost': totals[i] / len(screening) if not infeasible[i] else np.nan,
+                'energy_cost': energy,
+                'capital_cost': capital[i],
+                'total_cost': energy + capital[i],
+                'infeasible_days': int(infeasible[i] + rest_infeasible[i]),
+                'pruned': not keep[site_id][i],
+            })
+    return pd.DataFrame(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sites', nargs='*', type=int)
+    for name in GRID_PARAMS:
+        parser.add_argument(f'--{name}', nargs='+', type=float, default=[DEFAULT_PARAMS[name]])
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--screen-every', type=int, default=7)
+    parser.add_argument('--prune-margin', type=float, default=0.1, help="$/day, negative to disable pruning")
+    parser.add_argument('--kwh-price', type=float, default=0.0, help="battery price per kWh of storage")
+    parser.add_argument('--kw-price', type=float, default=0.0, help="battery price per kW of power")
+    parser.add_argument('--lifetime-years', type=float, default=10)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--backend', default='auto', choices=('auto', 'ampl', 'highs'))
+    parser.add_argument('--out', default='sweep.csv')
+    args = parser.parse_args(argv)
+
+    grid = {name: getattr(args, name) for name in GRID_PARAMS}
+    surface = sweep(grid, args.sites or None, args.days, screen_every=args.screen_every,
+                    prune_margin=args.prune_margin if args.prune_margin >= 0 else None,
+                    kwh_price=args.kwh_price, kw_price=args.kw_price, lifetime_years=args.lifetime_years,
+                    workers=args.workers, backend=args.backend)
+    surface.to_csv(args.out, index=False)
+    print(surface.sort_values('total_cost').groupby('site_id').head(1).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""Electricity tariffs compiled to per-slot import and export price arrays.
+
+A ``Tariff`` holds price tables of shape ``(seasons, 2, 48)``. Each table gives one
+day of half-hourly prices per season, for weekdays (row 0) and weekends (row 1):
+one table for imports (the models' ``c_g``) and one for feed-in (``c_pv``).
+``season_of_month`` maps each calendar month to a season. ``compile`` prices every
+slot of a site's local wall-clock times with one fancy-indexing lookup.
+``compile_many`` does the same for a list of tariffs at once.
+
+Demand charges ($/kW of each month's peak import inside ``demand_window``) are
+billed after the solve with ``demand_charge``, because the daily models cannot
+see a monthly peak.
+"""
+import functools
+import pathlib
+
+import numpy as np
+
+DATA_DIR = pathlib.Path(__file__).parent / 'data'
+TOU_FILE = DATA_DIR / 'tou_data.csv'
+N = 48  # Time slots in a day (half-hourly)
+SLOT_MINUTES = 24 * 60 // N
+
+
+def _price_table(prices):
+    """Broadcast a scalar, a ``(48,)`` day, a ``(2, 48)`` weekday/weekend pair or a full table to ``(seasons, 2, 48)``."""
+    prices = np.asarray(prices, dtype=float)
+    if prices.ndim == 1:
+        prices = prices[np.newaxis]
+    if prices.ndim < 3:
+        prices = prices[np.newaxis]
+    return np.broadcast_to(prices, (prices.shape[0], 2, N))
+
+
+class Tariff:
+    def __init__(self, import_prices, export_prices=0.05, season_of_month=None, demand_rate=0.0,
+                 demand_window=None, name=None):
+        import_prices, export_prices = _price_table(import_prices), _price_table(export_prices)
+        seasons = max(len(import_prices), len(export_prices))
+        self.import_prices = np.broadcast_to(import_prices, (seasons, 2, N))
+        self.export_prices = np.broadcast_to(export_prices, (seasons, 2, N))
+        self.season_of_month = np.zeros(12, dtype=np.intp) if season_of_month is None else \
+            np.asarray(season_of_month, dtype=np.intp)
+        if self.season_of_month.shape != (12,) or self.season_of_month.max() >= seasons:
+            raise ValueError(f"season_of_month must map 12 months onto the {seasons} seasons of the price tables")
+        self.demand_rate = demand_rate
+        window = np.ones(N, dtype=bool) if demand_window is None else np.asarray(demand_window, dtype=bool)
+        self.demand_window = np.broadcast_to(window, (2, N))
+        self.name = name
+
+    def __repr__(self):
+        return f"Tariff({self.name or 'unnamed'}, seasons={len(self.import_prices)})"
+
+    @classmethod
+    def from_csv(cls, path=TOU_FILE, name=None):
+        """The 48-slot ``Cost(k) $/kWh`` and ``FiTs(k) $/kWh`` columns of ``tou_data.csv``, every day of the year."""
+        import pandas as pd
+
+        df = pd.read_csv(path, encoding='utf-8-sig')
+        return cls(df['Cost(k) $/kWh'].values, df['FiTs(k) $/kWh'].values, name=name or pathlib.Path(path).stem)
+
+    @classmethod
+    def flat(cls, price, feed_in=0.05, name=None, **kwargs):
+        return cls(price, feed_in, name=name or f'flat {price}', **kwargs)
+
+    @classmethod
+    def seasonal(cls, seasons, name=None):
+        """Combine ``[(months, tariff), ...]`` (months numbered 1-12) into one tariff; every month needs a season.
+
+        A ``Tariff`` has one demand charge for the whole year, so the seasons' demand
+        rates and windows must agree.
+        """
+        season_of_month = np.full(12, -1, dtype=np.intp)
+        for season, (months, _) in enumerate(seasons):
+            season_of_month[np.asarray(months) - 1] = season
+        if (season_of_month < 0).any():
+            raise ValueError(f"months {list(np.flatnonzero(season_of_month < 0) + 1)} have no season")
+        first = seasons[0][1]
+        for _, tariff in seasons[1:]:
+            if tariff.demand_rate != first.demand_rate or not np.array_equal(tariff.demand_window, first.demand_window):
+                raise ValueError(f"{tariff} has a different demand charge from {first}, "
+                                 f"seasons must share one demand_rate and demand_window")
+        return cls(
+            np.concatenate([tariff.import_prices[:1] for _, tariff in seasons]),
+            np.concatenate([tariff.export_prices[:1] for _, tariff in seasons]),
+            season_of_month, first.demand_rate, first.demand_window, name,
+        )
+
+    def compile(self, localtime):
+        """``c_g``, ``c_pv`` and the demand-charge window for every slot of ``localtime``."""
+        prices = compile_many([self], localtime)
+        return {name: values[0] for name, values in prices.items()}
+
+
+def slot_calendar(localtime):
+    """Month (0-11), weekend flag and slot of day of each local wall-clock time; NaT gives ``valid`` False."""
+    localtime = np.asarray(localtime, dtype='datetime64[m]')
+    valid = ~np.isnat(localtime)
+    localtime = np.where(valid, localtime, np.datetime64(0, 'm'))
+    days = localtime.astype('datetime64[D]')
+    slot = (localtime - days).astype(np.int64) // SLOT_MINUTES
+    weekend = ((days.astype(np.int64) + 3) % 7 >= 5).astype(np.intp)  # 1970-01-01 was a Thursday
+    month = localtime.astype('datetime64[M]').astype(np.int64) % 12
+    return month, weekend, slot, valid
+
+
+def compile_many(tariffs, localtime):
+    """Per-slot prices of each tariff: ``(len(tariffs), len(localtime))`` arrays, NaN where ``localtime`` is NaT."""
+    month, weekend, slot, valid = slot_calendar(localtime)
+    seasons = max(len(tariff.import_prices) for tariff in tariffs)
+
+    def stack(attribute):
+        return np.stack([np.pad(getattr(tariff, attribute), ((0, seasons - len(tariff.import_prices)), (0, 0), (0, 0)),
+                                mode='edge') for tariff in tariffs])
+
+    season = np.stack([tariff.season_of_month for tariff in tariffs])[:, month]
+    rows = np.arange(len(tariffs))[:, np.newaxis]
+    compiled = {
+        'c_g': stack('import_prices')[rows, season, weekend, slot],
+        'c_pv': stack('export_prices')[rows, season, weekend, slot],
+    }
+    for values in compiled.values():
+        values[:, ~valid] = np.nan
+    compiled['demand_window'] = np.stack([tariff.demand_window for tariff in tariffs])[rows, weekend, slot] & valid
+    return compiled
+
+
+def demand_charge(tariff, localtime, Pgplus):
+    """Demand charge in $: ``demand_rate`` times each month's peak import (kW) inside the window, summed."""
+    if not tariff.demand_rate:
+        return 0.0
+    window = tariff.compile(localtime)['demand_window']
+    months, month_index = np.unique(np.asarray(localtime, dtype='datetime64[M]')[window], return_inverse=True)
+    peaks = np.zeros(len(months))
+    np.maximum.at(peaks, month_index, np.asarray(Pgplus, dtype=float)[window])
+    return float(tariff.demand_rate * peaks.sum())
+
+
+def local_times(start, days, timezone):
+    """Local wall-clock times of ``days * 48`` half-hourly slots from local midnight of ``start``.
+
+    Slots are evenly spaced in UTC, as in the site data, so a daylight saving change
+    shifts the wall-clock times rather than adding or dropping slots.
+    """
+    import pandas as pd
+
+    first = pd.Timestamp(start).normalize().tz_localize(timezone).tz_convert('UTC')
+    slots = pd.date_range(first, periods=days * N, freq=f'{SLOT_MINUTES}min')
+    return slots.tz_convert(timezone).tz_localize(None).values.astype('datetime64[m]')
+
+
+@functools.lru_cache(maxsize=None)
+def default_tariff():
+    """The bundled ``tou_data.csv`` tariff."""
+    return Tariff.from_csv()
+
+
+def site_prices(site, tariff=None):
+    """``(c_g, c_pv)`` arrays of a site from ``data.load_site_arrays``; without ``tariff`` the cached default ones."""
+    if tariff is None:
+        return site['tariff'], site['feed_in']
+    prices = tariff.compile(site['localtime'])
+    return prices['c_g'], prices['c_pv']
@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 import sys
 import os
+import pathlib
 import pandas as pd  # for pandas.DataFrame objects (https://pandas.pydata.org/)
 import numpy as np  # for numpy.matrix objects (https://numpy.org/)
 
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pytest
+from ..backends import HighsBackend
+from ..data import load_site
+from ..model import HEMS_DIR, VARIABLES, get_model
+
+N = 48
+
+
+@pytest.fixture(scope='module')
+def day_params():
+    df = load_site(152786204)
+    return {
+        'Pd': df['total_load_kWh'].values[:2*N],
+        'Ppv': df['pv_generation_kWh'].values[:2*N],
+        'c_g': df['time_of_use_tariff'].values[:2*N],
+        'ebM': 10, 'ebm': 0, 'PbM': 5, 'eb1': 0, 'etaBc': np.sqrt(0.84),
+    }
+
+
+def test_highs_matches_ampl_results(day_params):
+    backend = HighsBackend()
+    solution = backend.solve('pv_battery', day_params)
+    assert solution.ok
+
+    # The AMPL/CPLEX day in ampl_results.csv must be part of an optimal solution of the same model
+    reference = pd.read_csv(HEMS_DIR / 'ampl_results.csv')
+    problem = get_model('pv_battery').build(day_params)
+    for name in VARIABLES:
+        idx = problem.index(name, np.arange(N))
+        problem.lb[idx] = problem.ub[idx] = reference[name].values
+    fixed = backend.solve_problem(problem)
+
+    assert fixed.ok
+    assert fixed.objective == pytest.approx(solution.objective, abs=1e-6)
+
+
+def test_highs_solution_is_feasible(day_params):
+    solution = HighsBackend().solve('pv_battery', day_params)
+    etaBc = day_params['etaBc']
+
+    balance = (solution['Pgplus'] - solution['Pgminus'] - etaBc*solution['Pbplus']
+               + solution['Pbminus']/etaBc + day_params['Ppv'] - day_params['Pd'])
+    assert np.abs(balance).max() < 1e-6
+    assert np.all(solution['Pbplus'] * solution['Pbminus'] < 1e-9), "charging and discharging at the same time"
+    assert solution['eb'][0] == pytest.approx(0)
+    assert solution['eb'][-1] == pytest.approx(0.2 * day_params['ebM'])
+
+
+def test_constraint_matrix_is_assembled_once(day_params):
+    problem = get_model('pv_battery').build(day_params)
+    A = problem.A
+    assert problem.A is A
+
+    problem.add_constraints([('eb', 10, 1)], 0, 5)
+    assert problem.A is not A and problem.A.shape == (A.shape[0] + 1, A.shape[1])
+
+
+def test_problem_copies_change_independently(day_params):
+    problem = get_model('pv_battery').build(day_params)
+    copied = problem.copy()
+    copied.ub[problem.index('Pbplus')] = 0
+    copied.add_constraints([('eb', 10, 1)], 0, 5)
+
+    assert np.all(problem.ub[problem.index('Pbplus')] == 5)
+    assert problem.A.shape[0] == copied.A.shape[0] - 1
+    assert copied.copy().A is copied.A
+
+
+def test_ev_model_builds_commute_drops():
+    params = {
+        'Pd': np.full(N, 0.5), 'Ppv': np.zeros(N), 'c_g': np.full(N, 0.4),
+        'ebM': np.full(N, 40), 'ebm': np.zeros(N), 'PbM': np.full(N, 6.6),
+        'eb1': 20, 'etaBc': np.sqrt(0.84), 'N': N,
+        'early_commute': 8, 'late_commute': 32, 'travel_perc': 0.2,
+    }
+    solution = HighsBackend().solve('pv_battery_ev', params)
+
+    assert solution.ok
+    eb = solution['eb']
+    assert eb[7] == pytest.approx(eb[6] - 8)
+    assert eb[31] == pytest.approx(eb[30] - 8)
+    assert eb[-1] == pytest.approx(8)
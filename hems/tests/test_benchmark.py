@@ -0,0 +1,25 @@
+import json
+
+from ..benchmark import compare, main, run
+
+
+def test_run_writes_comparable_json(tmp_path):
+    out = tmp_path / 'bench.json'
+    assert main(['run', 'markov', 'build_vs_solve', '--quick', '--out', str(out)]) == 0
+
+    report = json.loads(out.read_text())
+    assert set(report['results']) == {'markov', 'build_vs_solve'}
+    assert report['results']['markov']['markov_profiles_per_s'] > 0
+    assert main(['compare', str(out), str(out)]) == 0
+
+
+def test_compare_flags_regressions_in_both_directions():
+    baseline = {'results': {'day_solve': {'day_solve_median_s': 1.0, 'days': 10}, 'markov': {'markov_profiles_per_s': 100}}}
+    current = {'results': {'day_solve': {'day_solve_median_s': 1.5, 'days': 10}, 'markov': {'markov_profiles_per_s': 120}}}
+
+    rows = {metric: (change, regressed) for _, metric, _, _, change, regressed in compare(baseline, current)}
+
+    assert set(rows) == {'day_solve_median_s', 'markov_profiles_per_s'}  # Counts are not compared
+    assert rows['day_solve_median_s'] == (-0.5, True)
+    assert rows['markov_profiles_per_s'][1] is False
+    assert run(['markov'], quick=True)['quick']
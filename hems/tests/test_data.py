@@ -0,0 +1,36 @@
+import shutil
+
+import numpy as np
+from ..data import CACHE_VERSION, SiteStore, ingest, load_site, open_store, site_path, stale_cache
+
+
+def test_cached_site_matches_csv_preprocessing(tmp_path):
+    ingest(cache_dir=tmp_path)
+    site = SiteStore(tmp_path).site(152786204)
+    df = load_site(152786204)
+
+    assert isinstance(site['load_kw'], np.memmap)
+    assert np.array_equal(site['load_kw'], df['total_load_kWh'].values)
+    assert np.array_equal(site['pv_kw'], df['pv_generation_kWh'].values)
+    assert np.array_equal(site['tariff'], df['time_of_use_tariff'].values)
+    assert str(site['localtime'][0]) == '2019-01-01T00:00'
+    assert (site['pv_kw'] >= 0).all()
+
+
+def test_cache_is_rebuilt_when_its_sources_change(tmp_path):
+    sites, cache = tmp_path / 'sites', tmp_path / 'cache'
+    sites.mkdir()
+    shutil.copy(site_path(152786204), sites)
+    ingest(sites, cache)
+    assert stale_cache(cache) is None
+
+    csv = sites / 'halfhourly_152786204.csv'
+    lines = csv.read_text().splitlines(keepends=True)
+    csv.write_text(''.join(lines[:1 + 4 * 48]))  # Edited down to four days
+    assert stale_cache(cache) is not None
+    assert len(open_store(cache, sites).site(152786204)['load_kw']) == 4 * 48
+    assert stale_cache(cache) is None
+
+    manifest = cache / 'sources.json'
+    manifest.write_text(manifest.read_text().replace(f'"version": {CACHE_VERSION}', '"version": 0'))
+    assert 'version' in stale_cache(cache)
@@ -0,0 +1,65 @@
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+from ..backends import HighsBackend, set_process_backend
+from ..data import SITE_DIR, list_sites, site_path
+from ..fleet import dispatch_horizon, run_fleet
+from ..runner import DEFAULT_PARAMS, horizon_inputs
+
+SITES = np.array(list_sites(SITE_DIR)[:4])
+
+
+@pytest.fixture(scope='module')
+def pool():
+    with ProcessPoolExecutor(max_workers=2, initializer=set_process_backend, initargs=('highs',)) as pool:
+        yield pool
+
+
+def test_unconstrained_fleet_is_every_home_alone(pool):
+    solution = dispatch_horizon(pool, SITES, 0, 0.0, np.inf, np.inf, homes_per_task=2)
+
+    assert solution.iterations == 0 and solution.converged
+    alone = HighsBackend().solve('pv_battery_tight', dict(DEFAULT_PARAMS, **horizon_inputs(SITES[1], 0)))
+    assert solution.energy_cost[1] == pytest.approx(alone.objective, abs=1e-6)
+    assert np.all(solution.congestion_price == 0)
+
+
+def test_feeder_limit_is_respected(pool):
+    free = dispatch_horizon(pool, SITES, 0, 0.0, np.inf, np.inf)
+    limit = 0.7 * free.aggregate.max()
+
+    solution = dispatch_horizon(pool, SITES, 0, 0.0, limit, np.inf, tol=0.02)
+
+    assert solution.converged and solution.iterations > 0
+    assert solution.aggregate.max() <= limit + 0.02
+    assert solution.energy_cost.sum() >= free.energy_cost.sum() - 1e-6
+    assert np.all(solution.congestion_price >= -1e-9)  # Only the import limit can bind
+    assert np.all(solution.values['Pbplus'] * solution.values['Pbminus'] < 1e-9)
+
+
+def test_run_fleet_writes_sites_and_summary(tmp_path, capsys):
+    # The two homes draw up to 0.58 kW on day 0 on their own
+    summary = run_fleet(SITES[:2], days=2, feeder_import=0.4, out_dir=tmp_path, workers=1, backend='highs')
+
+    assert len(summary) == 2 * 48 and summary['converged'].all()
+    assert capsys.readouterr().out == ''
+    assert summary['iterations'].max() > 0
+    assert summary['aggregate_kw'].max() <= 0.4 + 0.05
+    assert pd.read_csv(tmp_path / 'fleet.csv').shape == summary.shape
+    site = pd.read_csv(tmp_path / f'site_{SITES[0]}.csv')
+    assert list(site['Day'].unique()) == [0, 1]
+
+
+def test_run_fleet_reads_a_site_directory(tmp_path):
+    sites = tmp_path / 'sites'
+    sites.mkdir()
+    for site_id in SITES[:2]:
+        shutil.copy(site_path(site_id), sites)
+    summary = run_fleet(sites, days=1, feeder_import=np.inf, feeder_export=np.inf, out_dir=tmp_path / 'out',
+                        workers=1, backend='highs')
+
+    assert (sites / 'cache').is_dir()
+    assert len(summary) == 48 and (tmp_path / 'out' / f'site_{SITES[1]}.csv').exists()
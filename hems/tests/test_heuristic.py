@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+from ..backends import HighsBackend
+from ..data import load_site_arrays
+from ..heuristic import calibrate_gap, gap_scale, rule_based_dispatch, screen
+from ..model import get_model
+from ..runner import DEFAULT_PARAMS, horizon_window
+
+DAYS = [0, 120, 200]
+
+
+@pytest.fixture(scope='module')
+def windows():
+    site = load_site_arrays(152786204)
+    return [np.stack([horizon_window(site[name], day) for day in DAYS]) for name in ('load_kw', 'pv_kw', 'tariff')]
+
+
+def test_heuristic_schedules_are_feasible(windows):
+    Pd, Ppv, c_g = windows
+    schedule, cost = rule_based_dispatch(Pd, Ppv, c_g, DEFAULT_PARAMS)
+
+    for row in range(len(DAYS)):
+        problem = get_model('pv_battery').build(dict(DEFAULT_PARAMS, Pd=Pd[row], Ppv=Ppv[row], c_g=c_g[row]))
+        x = np.concatenate([schedule[name][row] for name in problem.variables])
+        activity = problem.A @ x
+        assert np.all(activity >= problem.constraint_lo - 1e-9)
+        assert np.all(activity <= problem.constraint_hi + 1e-9)
+        assert np.all((x >= problem.lb - 1e-9) & (x <= problem.ub + 1e-9))
+        assert problem.c @ x == pytest.approx(cost[row])
+
+
+def test_screen_escalates_to_milp(windows):
+    Pd, Ppv, c_g = windows
+    result = screen(Pd, Ppv, c_g, DEFAULT_PARAMS, tolerance=0, backend=HighsBackend(), sample_size=2, seed=0)
+
+    assert np.all(result['cost'] <= result['heuristic'] + 1e-6)
+    assert np.all(result['gap_estimate'] >= 0)
+    assert result['escalated'].sum() >= 2
+    assert result.attrs['quantile'] == 0.95 and result.attrs['gap_ratio'] >= 0
+
+
+def test_a_calibrated_screen_escalates_exactly_the_rows_above_the_tolerance(windows):
+    Pd, Ppv, c_g = windows
+    ratio, sample = calibrate_gap(Pd, Ppv, c_g, DEFAULT_PARAMS, sample_size=3, backend=HighsBackend())
+    assert ratio > 0 and np.all(sample['gap'] >= -1e-6)
+    estimate = ratio * gap_scale(Pd, Ppv, c_g, DEFAULT_PARAMS)
+    tolerance = np.median(estimate)  # Between the rows' estimates, so some rows escalate and some do not
+
+    result = screen(Pd, Ppv, c_g, DEFAULT_PARAMS, tolerance=tolerance, gap_ratio=ratio, backend=HighsBackend())
+    escalated = result['escalated'].to_numpy()
+    assert np.array_equal(escalated, estimate > tolerance) and 0 < escalated.sum() < len(DAYS)
+    assert result['cost'][escalated].to_numpy() == pytest.approx(sample['milp'][escalated].to_numpy())
+    assert np.array_equal(result['cost'][~escalated], result['heuristic'][~escalated])
+    assert result.attrs['quantile'] is None
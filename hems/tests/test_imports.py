@@ -0,0 +1,47 @@
+import json
+import subprocess
+import sys
+
+import pytest
+from .. import backends
+from ..backends import AmplBackend
+
+HEAVY = ('pandas', 'matplotlib', 'amplpy', 'scipy')
+
+
+def imported_after(statement):
+    code = f"import json, sys; {statement}; print(json.dumps(sorted(m for m in {HEAVY!r} if m in sys.modules)))"
+    return json.loads(subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, text=True).stdout)
+
+
+@pytest.mark.parametrize('statement', [
+    'import hems',
+    'import thesis_code',
+    'import hems.runner, hems.pipeline, hems.fleet, hems.sweep, hems.monte_carlo',
+    'import hems.hems_pv_battery, hems.hems_pv_battery_ev',
+    'import hems.__main__',
+])
+def test_imports_load_no_heavy_dependencies(statement):
+    assert imported_after(statement) == []
+
+
+def test_lazy_exports_resolve():
+    import hems
+    import thesis_code
+    from ..runner import solve_day
+
+    assert hems.solve_day is solve_day and thesis_code.solve_day is solve_day
+    assert set(hems.__all__) <= set(dir(hems))
+    with pytest.raises(AttributeError):
+        hems.not_an_export
+
+
+def test_ampl_and_worker_backends_start_on_first_use(monkeypatch):
+    AmplBackend(ampl_path='/nonexistent')  # Nothing starts, so nothing fails
+    monkeypatch.setattr(backends, '_process_backend', None)
+    monkeypatch.setattr(backends, '_process_backend_name', None)
+
+    backends.set_process_backend('highs')
+
+    assert backends._process_backend is None
+    assert backends.process_backend().name == 'highs'
@@ -0,0 +1,77 @@
+import json
+import os
+import pstats
+import sys
+import types
+
+import numpy as np
+import pytest
+from ..backends import HighsBackend
+from .. import instrument
+from ..instrument import Tracer, memory_mb
+from ..runner import DEFAULT_PARAMS
+from ..solve_cache import CachedBackend, SolveCache
+
+N = 96
+PARAMS = dict(DEFAULT_PARAMS, Pd=np.ones(N), Ppv=np.zeros(N), c_g=np.full(N, 0.2))
+
+
+def test_backend_phases_status_and_summary(tmp_path):
+    tracer = Tracer(tmp_path / 'trace.json')
+    backend = HighsBackend().instrument(tracer)
+    with tracer.phase('load_data'):
+        pass
+    for day in range(3):
+        with tracer.day(day):
+            backend.solve('pv_battery', PARAMS)
+
+    assert set(tracer.setup) == {'load_data'}
+    record = tracer.records[0]
+    assert set(record['phases']) == {'build', 'solve'}
+    assert record['status'] == 'solved' and record['stats']['solve_time'] > 0
+    assert record['wall_s'] >= sum(record['phases'].values())
+
+    summary = tracer.summary().set_index('phase')
+    assert list(summary.index) == ['build', 'solve', 'other', 'day']
+    assert (summary['days'] == 3).all()
+    assert np.isclose(summary.loc[['build', 'solve', 'other'], 'share'].sum(), 1)
+
+    trace = json.loads(open(tracer.write_trace()).read())
+    assert [day['day'] for day in trace['days']] == [0, 1, 2]
+    assert [row['phase'] for row in trace['summary']] == list(summary.index)
+
+
+def test_cache_hits_are_traced(tmp_path):
+    tracer = Tracer()
+    backend = CachedBackend(HighsBackend(), SolveCache(tmp_path)).instrument(tracer)
+    for day in range(2):
+        with tracer.day(day):
+            backend.solve('pv_battery', PARAMS)
+
+    miss, hit = tracer.records
+    assert {'cache_lookup', 'build', 'solve', 'cache_store'} <= set(miss['phases'])
+    assert set(hit['phases']) == {'cache_lookup'} and hit['status'] == 'solved'
+
+
+def test_profile_day_dumps_cprofile_stats(tmp_path):
+    tracer = Tracer(profile_day=1, profile_path=tmp_path / 'day1.prof')
+    backend = HighsBackend().instrument(tracer)
+    for day in range(2):
+        with tracer.day(day):
+            backend.solve('pv_battery', PARAMS)
+
+    stats = pstats.Stats(str(tmp_path / 'day1.prof'))
+    assert any(function == 'milp' for _, _, function in stats.stats)
+
+
+@pytest.mark.parametrize('platform, maxrss', [('linux', 200 * 1024), ('darwin', 200 * 1024 ** 2)])
+def test_memory_mb_falls_back_to_peak_rss_in_the_platforms_unit(monkeypatch, platform, maxrss):
+    if instrument.resource is None:
+        pytest.skip("no resource module")
+    def no_statm(name):
+        raise ValueError(name)
+    monkeypatch.setattr(os, 'sysconf', no_statm)
+    monkeypatch.setattr(sys, 'platform', platform)
+    monkeypatch.setattr(instrument.resource, 'getrusage', lambda who: types.SimpleNamespace(ru_maxrss=maxrss))
+
+    assert memory_mb() == pytest.approx(200)
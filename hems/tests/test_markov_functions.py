@@ -1,3 +1,4 @@
+import numpy as np
 import pytest
 from ..markov_functions import markov_weekday, markov_weekend
 
@@ -9,3 +10,27 @@ def test_markov_functions(func):
     assert len(availability) == 48, f"{func.__name__} availability length should be 48"
     assert all(min_charge <= max_soc), f"Min charge in {func.__name__} should not exceed max_soc"
     assert all((availability == 0) <= (min_charge >= min_soc)), f"Min charge in {func.__name__} should not go below min_soc when the car is used"
+
+
+@pytest.mark.parametrize("func", [markov_weekday, markov_weekend])
+def test_batched_markov_functions(func):
+    min_soc, cd_rate = 8.16, 6.6
+    availability, min_charge = func(min_soc, cd_rate, size=1000, rng=0)
+
+    assert availability.shape == min_charge.shape == (1000, 48)
+    assert set(np.unique(availability)) <= {0, cd_rate}
+    assert np.all(availability[:, :2] == cd_rate), "every day starts at home"
+    assert np.all(min_charge[availability == 0] >= min_soc)
+
+    again, _ = func(min_soc, cd_rate, size=1000, rng=0)
+    assert np.array_equal(availability, again), "seeded generators should be reproducible"
+
+
+def test_batched_transitions_follow_matrices():
+    # Night slots 40..47: an EV at home leaves with probability 0.02, an EV away returns with 0.8
+    availability, _ = markov_weekday(8.16, 6.6, size=20000, rng=1)
+    away = availability == 0
+    before, after = away[:, 40:47], away[:, 41:48]
+
+    assert np.mean(after[~before]) == pytest.approx(0.02, abs=0.005)
+    assert np.mean(~after[before]) == pytest.approx(0.8, abs=0.02)
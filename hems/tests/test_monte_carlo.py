@@ -0,0 +1,60 @@
+import csv
+
+import numpy as np
+import pytest
+from ..backends import HighsBackend
+from ..ev import MIN_SOC, commute_slots, ev_day_params
+from ..monte_carlo import CostStatistics, run_monte_carlo
+
+
+def test_cost_statistics_match_numpy():
+    rng = np.random.default_rng(0)
+    costs = rng.normal(3, 1, size=(200, 7))
+    costs[5, 2] = np.nan
+    stats = CostStatistics()
+    for row in costs:
+        stats.update(row)
+
+    assert stats.infeasible_days == 1
+    assert stats.mean == pytest.approx(np.nanmean(costs, axis=0))
+    assert stats.std == pytest.approx(np.nanstd(costs, axis=0, ddof=1))
+    assert stats.counts.sum() == 200 * 7 - 1
+    scenario_means = np.nanmean(costs, axis=1)
+    assert stats.mean_daily_cost == pytest.approx(scenario_means.mean())
+    assert stats.ci_halfwidth() == pytest.approx(1.96 * scenario_means.std(ddof=1) / np.sqrt(200))
+
+
+def test_commute_slots():
+    availability = np.full(48, 6.6)
+    assert commute_slots(availability) == (0, 0)
+    availability[16:34] = 0
+    assert commute_slots(availability) == (17, 35)
+    availability[34:] = 0
+    assert commute_slots(availability) == (17, 0)
+
+
+def test_a_day_leaving_in_its_first_slots_solves():
+    # Away from slot 2, with the minimum charge the Markov profiles set for the two slots before
+    availability, min_charge = np.full(48, 6.6), np.ones(48)
+    availability[2:18] = 0
+    min_charge[:18] = MIN_SOC
+    params = ev_day_params(availability, min_charge, np.full(48, 40.0), rand_usage=0.2)
+    solution = HighsBackend().solve('pv_battery_ev', dict(params, Pd=np.full(48, 0.5), Ppv=np.zeros(48),
+                                                          c_g=np.full(48, 0.3), c_pv=np.full(48, 0.05)))
+
+    assert params['eb1'] >= MIN_SOC and solution.ok
+    assert solution['eb'][0] == pytest.approx(params['eb1'])
+
+
+@pytest.mark.parametrize('tolerance, expected', [(np.inf, 4), (0.0, 8)])
+def test_run_monte_carlo_stops_and_writes_every_scenario(tmp_path, tolerance, expected):
+    # Converged once min_scenarios are in when any interval will do, otherwise capped at max_scenarios
+    out = tmp_path / 'costs.csv'
+    stats = run_monte_carlo(tolerance=tolerance, min_scenarios=4, max_scenarios=8, scenarios_per_task=2,
+                            workers=1, out=out, seed=0, backend='highs')
+
+    with open(out, newline='') as file:
+        rows = list(csv.reader(file))
+    assert stats.scenarios == expected and len(rows) == expected + 1
+    assert [int(row[0]) for row in rows[1:]] == list(range(expected))
+    assert np.isfinite(stats.ci_halfwidth())
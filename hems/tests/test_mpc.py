@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+from ..backends import HighsBackend
+from ..mpc import ModelPredictiveController, advance, forecast, replay, window
+from ..runner import DEFAULT_PARAMS, horizon_inputs
+
+SITE = 152786204
+
+
+def test_forecast_only_uses_the_past():
+    actual = np.random.default_rng(0).random(5 * 48)
+    changed = actual.copy()
+    changed[100:] += 1
+
+    assert np.array_equal(forecast(actual, 100), forecast(changed, 100))
+    assert forecast(actual, 100, decay=0)[:48] == pytest.approx(actual[52:100])
+    with pytest.raises(ValueError):
+        forecast(actual, 47)
+    assert np.array_equal(window(actual, 5 * 48 - 1, 3), actual[[-1, -48, -47]])
+    assert np.array_equal(advance([1, 2, 3]), [2, 3, 3])
+
+
+def test_replay_balances_energy_and_tracks_the_soc():
+    result = replay(SITE, days=1, backend=HighsBackend(), budget=None)
+    executed, params = result.executed, DEFAULT_PARAMS
+    eta = params['etaBc']
+
+    assert result.summary()['fallbacks'] == 0 and len(result.latency) == 48
+    assert np.all(result.status == 'solved')
+    eb = executed['eb']
+    assert np.all((eb >= params['ebm'] - 1e-9) & (eb <= params['ebM'] + 1e-9))
+    assert eb[1:] == pytest.approx(eb[:-1] + 0.5 * (eta * executed['Pbplus'] - executed['Pbminus'] / eta)[:-1])
+    assert np.all(executed['Pgplus'] * executed['Pgminus'] == 0)
+    assert executed['Pbplus'].max() > 0 and executed['Pbminus'].max() > 0
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TimedBackend(HighsBackend):
+    """HiGHS whose solves take the next of ``durations`` seconds on ``clock``, whatever they really take."""
+
+    def __init__(self, clock, durations):
+        super().__init__()
+        self.clock = clock
+        self.durations = list(durations)
+
+    def set_time_limit(self, seconds):
+        pass
+
+    def solve(self, model, params, start=None):
+        self.clock.now += self.durations.pop(0)
+        return super().solve(model, params, start)
+
+
+def test_only_steps_over_the_budget_fall_back():
+    # A slow cold start goes to the untimed warm-up solve, then step 10 overruns
+    clock = Clock()
+    durations = [0.5] + [0.01] * 10 + [0.3] + [0.01] * 37
+    result = replay(SITE, days=1, backend=TimedBackend(clock, durations), budget=0.2, clock=clock)
+
+    assert result.latency[0] == pytest.approx(0.01) and result.latency[10] == pytest.approx(0.3)
+    assert np.flatnonzero(result.fallback).tolist() == [10]
+    assert result.summary(0.2)['over_budget'] == 1 and result.summary(0.2)['fallbacks'] == 1
+
+
+def test_a_late_step_executes_the_last_plan():
+    inputs = horizon_inputs(SITE, 1)
+    controller = ModelPredictiveController(HighsBackend(), budget=None)
+    plan = HighsBackend().solve('pv_battery_tight', dict(DEFAULT_PARAMS, **inputs))
+    setpoint, record = controller.step(0.0, inputs['Pd'], inputs['Ppv'], inputs['c_g'], inputs['c_pv'])
+    assert not record['fallback'] and setpoint['Pbplus'] == pytest.approx(plan['Pbplus'][0])
+
+    controller.budget = 1e-9
+    shifted = {name: window(values, 1) for name, values in inputs.items()}
+    setpoint, record = controller.step(plan['eb'][1], shifted['Pd'], shifted['Ppv'], shifted['c_g'], shifted['c_pv'])
+
+    assert record['fallback'] and record['status'] == 'solved'
+    assert setpoint['Pbplus'] == pytest.approx(plan['Pbplus'][1])
+    assert setpoint['eb'] == pytest.approx(plan['eb'][1])
+    assert controller._plan['eb'][-2:] == pytest.approx([plan['eb'][-1]] * 2)
+
+
+def test_without_any_plan_in_time_the_battery_idles():
+    result = replay(SITE, days=1, backend=HighsBackend(), budget=1e-9)
+
+    assert result.fallback.all()
+    assert np.all(result.executed['Pbplus'] == 0) and np.all(result.executed['Pbminus'] == 0)
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+from ..backends import HighsBackend
+from ..data import load_site_arrays
+from ..runner import DEFAULT_PARAMS, N, horizon_window, solve_days_batched
+
+DAYS = [10, 11]
+
+
+@pytest.fixture(scope='module')
+def windows():
+    site = load_site_arrays(152786204)
+    return {name: np.stack([horizon_window(site[column], day) for day in DAYS])
+            for name, column in (('Pd', 'load_kw'), ('Ppv', 'pv_kw'), ('c_g', 'tariff'))}
+
+
+def test_block_diagonal_matches_daily_solves(windows):
+    backend = HighsBackend()
+    batched = backend.solve('pv_battery_multiday', dict(DEFAULT_PARAMS, **windows))
+    daily = [backend.solve('pv_battery', dict(DEFAULT_PARAMS, **{name: values[i] for name, values in windows.items()}))
+             for i in range(len(DAYS))]
+
+    assert batched.ok
+    assert batched['eb'].shape == (len(DAYS), 2 * N)
+    assert batched.objective == pytest.approx(sum(solution.objective for solution in daily), abs=1e-6)
+
+
+def test_coupled_days_carry_soc():
+    days, results = solve_days_batched(152786204, DAYS, backend=HighsBackend(), couple=True)
+
+    assert list(days) == DAYS
+    eb = results['eb']
+    assert eb.shape == (len(DAYS), N)
+    assert eb[0, 0] == pytest.approx(DEFAULT_PARAMS['eb1'])
+    Pbplus, Pbminus = results['Pbplus'][0, -1], results['Pbminus'][0, -1]
+    carried = eb[0, -1] + 0.5 * np.sqrt(0.84) * Pbplus - 0.5 / np.sqrt(0.84) * Pbminus
+    assert eb[1, 0] == pytest.approx(carried)
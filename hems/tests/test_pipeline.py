@@ -0,0 +1,65 @@
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+from ..backends import HighsBackend
+from ..data import site_path
+from ..pipeline import read_checkpoint, run_stream, simulate_site
+
+SITE = 152786204
+
+
+class FailingBackend(HighsBackend):
+    """Raises on the ``fail_at``-th solve, like a run killed part way through."""
+
+    def __init__(self, fail_at):
+        super().__init__()
+        self.fail_at = fail_at
+        self.solves = 0
+
+    def solve(self, model, params, start=None):
+        self.solves += 1
+        if self.solves == self.fail_at:
+            raise KeyboardInterrupt
+        return super().solve(model, params, start)
+
+
+def test_soc_carries_over_between_days(tmp_path):
+    path = simulate_site(SITE, days=3, out_dir=tmp_path, chunk_days=2, backend=HighsBackend())
+
+    results = pd.read_csv(path)
+    assert list(results['Day'].unique()) == [0, 1, 2]
+    eb, Pbplus, Pbminus = (results[name].values.reshape(3, 48) for name in ('eb', 'Pbplus', 'Pbminus'))
+    eta = np.sqrt(0.84)
+    carried = eb[:-1, -1] + 0.5 * eta * Pbplus[:-1, -1] - 0.5 / eta * Pbminus[:-1, -1]
+    assert eb[1:, 0] == pytest.approx(carried, abs=1e-6)
+    assert read_checkpoint(tmp_path, SITE)['done']
+
+
+def test_resume_after_interruption(tmp_path):
+    expected = pd.read_csv(simulate_site(SITE, days=4, out_dir=tmp_path / 'full', chunk_days=2,
+                                         backend=HighsBackend()))
+
+    with pytest.raises(KeyboardInterrupt):
+        simulate_site(SITE, days=4, out_dir=tmp_path, chunk_days=2, backend=FailingBackend(fail_at=4))
+    assert read_checkpoint(tmp_path, SITE)['next_day'] == 2
+    with open(tmp_path / f'site_{SITE}.csv', 'a') as file:
+        file.write('2,1,0,0,0,0,0,0,0\n')  # A row written after the checkpoint
+
+    backend = FailingBackend(fail_at=0)
+    resumed = pd.read_csv(simulate_site(SITE, days=4, out_dir=tmp_path, chunk_days=2, backend=backend))
+
+    assert backend.solves == 2
+    pd.testing.assert_frame_equal(resumed, expected, atol=1e-6)
+
+
+def test_run_stream_reads_a_site_directory(tmp_path, capsys):
+    sites = tmp_path / 'sites'
+    sites.mkdir()
+    shutil.copy(site_path(SITE), sites)
+    [path] = run_stream(sites, days=2, out_dir=tmp_path / 'out', workers=1, backend='highs')
+
+    assert (sites / 'cache').is_dir()
+    assert list(pd.read_csv(path)['Day'].unique()) == [0, 1]
+    assert capsys.readouterr().out == ''
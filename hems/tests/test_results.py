@@ -0,0 +1,142 @@
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+from ..model import VARIABLES
+from ..results import BINARIES, COMPACT_DTYPES, MISSING, ResultCollector, ResultStore
+
+
+def day_solution(day, slots=96):
+    return {name: np.full(slots, day + i / 10) for i, name in enumerate(VARIABLES)}
+
+
+def test_collector_writes_in_ampl_results_layout(tmp_path):
+    results = ResultCollector(3, n=48, path=tmp_path / 'results.csv')
+    for day in range(3):
+        results.add(day, day_solution(day))
+    frame = results.to_frame()
+    results.write()
+
+    written = pd.read_csv(tmp_path / 'results.csv')
+    assert list(written.columns) == ['Day', 'TimeSlot', *VARIABLES]
+    assert len(written) == 3 * 48
+    pd.testing.assert_frame_equal(written, frame, check_dtype=False)
+    assert written['eb'].iloc[-1] == pytest.approx(2.6)
+
+    with pytest.raises(IndexError):
+        results.add(3, day_solution(3))
+
+
+def test_collector_streams_chunks(tmp_path):
+    results = ResultCollector(5, n=48, path=tmp_path / 'results.csv', chunk_days=2)
+    results.extend([0, 1, 2], {name: np.vstack([day_solution(day)[name] for day in range(3)]) for name in VARIABLES})
+    assert len(results.arrays()['eb']) == 1  # Days 0 and 1 are already on disk
+    results.add(3, day_solution(3))
+    results.add(4, day_solution(4))
+    results.write()
+
+    written = pd.read_csv(tmp_path / 'results.csv')
+    assert len(results) == 5
+    assert list(written['Day'].unique()) == [0, 1, 2, 3, 4]
+    assert len(written) == 5 * 48
+
+
+def test_compact_collector_aggregates_by_slot_after_writing(tmp_path):
+    results = ResultCollector(3, n=48, path=tmp_path / 'results.csv', dtypes=COMPACT_DTYPES)
+    for day in range(3):
+        results.add(day, dict(day_solution(day), sb=np.full(96, 0.9999999)))
+    results.write()
+
+    assert results.arrays()['eb'].dtype == np.float32 and results.arrays()['sb'].dtype == np.int8
+    assert np.all(results.arrays()['sb'] == 1)
+    assert results.by_slot('eb') == pytest.approx(np.full(48, 1.6))
+    assert results.by_slot('Pgplus', 'max') == pytest.approx(np.full(48, 2))
+    assert len(pd.read_csv(tmp_path / 'results.csv')) == 3 * 48
+    results.write()  # Nothing new to write
+    assert len(pd.read_csv(tmp_path / 'results.csv')) == 3 * 48
+
+
+def test_collector_writes_parquet(tmp_path):
+    pytest.importorskip('pyarrow')
+    results = ResultCollector(3, n=48, path=tmp_path / 'results.parquet', chunk_days=2, dtypes=COMPACT_DTYPES)
+    for day in range(3):
+        results.add(day, day_solution(day))
+    results.write()
+
+    written = pd.read_parquet(tmp_path / 'results.parquet')
+    assert list(written.columns) == ['Day', 'TimeSlot', *VARIABLES]
+    assert list(written['Day'].unique()) == [0, 1, 2] and len(written) == 3 * 48
+
+
+def test_parquet_without_pyarrow_says_how_to_install_it(tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, 'pyarrow', None)
+    results = ResultCollector(1, n=48, path=tmp_path / 'results.parquet')
+    results.add(0, day_solution(0))
+    with pytest.raises(ImportError, match='-E parquet'):
+        results.write()
+
+
+def binary_day_solution(day):
+    return dict(day_solution(day), sb=np.arange(96) % 2, dg=np.full(96, day % 2))
+
+
+def test_store_indexes_sites_and_scenarios_and_round_trips(tmp_path):
+    store = ResultStore([11, 22], days=4, scenarios=2)
+    store.add(22, 3, binary_day_solution(3), scenario=1)
+    store.extend(11, [0, 1], {name: np.vstack([binary_day_solution(0)[name], binary_day_solution(1)[name]])
+                              for name in VARIABLES})
+
+    assert store.rows('eb').shape == (3, 48)
+    assert store.by_slot('eb', site_id=11) == pytest.approx(np.full(48, 1.1))
+    assert store.by_slot('eb', scenario=1) == pytest.approx(np.full(48, 3.6))
+    assert list(store.to_frame(22, scenario=1)['Day'].unique()) == [3]
+    # 22 bytes a slot against 72 for a float64 frame with Day and TimeSlot columns
+    assert store.nbytes < 2 * 2 * 4 * 48 * 23
+
+    loaded = ResultStore.load(store.save(tmp_path / 'store.npz'))
+    assert store.by_slot('sb')[:4] == pytest.approx([0, 1, 0, 1])
+    assert np.array_equal(loaded.filled, store.filled)
+    for name in VARIABLES:
+        assert loaded.values[name].dtype == store.values[name].dtype
+        assert np.array_equal(loaded.values[name], store.values[name])
+
+
+def test_store_saves_parquet(tmp_path):
+    pytest.importorskip('pyarrow')
+    store = ResultStore([11, 22], days=4, scenarios=2)
+    store.add(22, 3, binary_day_solution(3), scenario=1)
+    store.add(11, 0, binary_day_solution(0))
+
+    written = pd.read_parquet(store.save(tmp_path / 'store.parquet'))
+    assert len(written) == 2 * 48
+    assert list(written.groupby('site_id')['Day'].first()) == [0, 3]
+    assert written['sb'].tolist()[:4] == [0, 1, 0, 1]
+
+
+def test_store_parquet_without_pyarrow_says_how_to_install_it(tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, 'pyarrow', None)
+    with pytest.raises(ImportError, match='-E parquet'):
+        ResultStore([11], days=1).save(tmp_path / 'store.parquet')
+
+
+def failed_day_solution(slots=96):
+    return {name: np.full(slots, np.nan) for name in VARIABLES}
+
+
+def test_failed_days_are_marked_and_left_out_of_by_slot(tmp_path):
+    results = ResultCollector(3, n=48, dtypes=COMPACT_DTYPES)
+    results.add(0, binary_day_solution(0))
+    results.add(1, failed_day_solution())
+    results.add(2, binary_day_solution(1))
+    assert np.all(results.arrays()['sb'][1] == MISSING)
+    assert results.by_slot('dg') == pytest.approx(np.full(48, 0.5))
+    assert results.by_slot('eb') == pytest.approx(np.full(48, 1.1))
+
+    store = ResultStore([11], days=3)
+    store.extend(11, [0, 1], {name: np.vstack([binary_day_solution(1)[name], failed_day_solution()[name]])
+                              for name in VARIABLES})
+    assert store.by_slot('sb')[:2] == pytest.approx([0, 1]) and store.by_slot('dg') == pytest.approx(np.ones(48))
+    loaded = ResultStore.load(store.save(tmp_path / 'store.npz'))
+    for name in VARIABLES:
+        assert np.array_equal(loaded.values[name], store.values[name], equal_nan=name not in BINARIES)
@@ -0,0 +1,21 @@
+import numpy as np
+import pandas as pd
+from ..runner import horizon_window, run_sites
+
+
+def test_horizon_window_pads_last_day():
+    values = np.arange(3 * 48)
+    assert np.array_equal(horizon_window(values, 0), values[:96])
+    last = horizon_window(values, 2)
+    assert len(last) == 96
+    assert np.array_equal(last[48:], values[96:])
+
+
+def test_run_sites_writes_one_file_per_site(tmp_path):
+    paths = run_sites([152786204, 289382707], days=2, out_dir=tmp_path, workers=2,
+                      backend='highs', days_per_task=1)
+
+    assert sorted(path.name for path in paths) == ['site_152786204.csv', 'site_289382707.csv']
+    results = pd.read_csv(tmp_path / 'site_152786204.csv')
+    assert len(results) == 2 * 48
+    assert list(results['Day'].unique()) == [0, 1]
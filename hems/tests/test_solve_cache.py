@@ -0,0 +1,61 @@
+import os
+
+import numpy as np
+import pytest
+from ..backends import HighsBackend
+from ..model import get_model
+from ..runner import DEFAULT_PARAMS
+from ..solve_cache import CachedBackend, SolveCache
+
+
+def day_params(seed=0):
+    rng = np.random.default_rng(seed)
+    return dict(DEFAULT_PARAMS, Pd=rng.uniform(0, 2, 96), Ppv=rng.uniform(0, 3, 96), c_g=rng.uniform(0.1, 0.5, 96))
+
+
+def test_cached_solve_matches_and_skips_solver(tmp_path):
+    cache = SolveCache(tmp_path)
+    backend = CachedBackend(HighsBackend(), cache)
+    params = day_params()
+
+    first = backend.solve('pv_battery', params)
+    # Noise below the quantum hits the same entry
+    params['Pd'] = params['Pd'] + 1e-9
+    second = backend.solve('pv_battery', params)
+
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert second.stats['cached']
+    assert second.objective == pytest.approx(first.objective)
+    for name, values in first.values.items():
+        assert np.array_equal(second[name], values)
+
+    backend.solve('pv_battery', dict(params, ebM=12))
+    assert cache.misses == 2
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = SolveCache(tmp_path)
+    backend = CachedBackend(HighsBackend(), cache)
+    spec = get_model('pv_battery')
+    keys = [cache.key(spec, spec.with_defaults(day_params(seed)), 'highs') for seed in range(3)]
+    for seed in range(3):
+        backend.solve('pv_battery', day_params(seed))
+    # Entry 1 is the least recently used
+    os.utime(cache._path(keys[0]), (0, 2))
+    os.utime(cache._path(keys[1]), (0, 1))
+    os.utime(cache._path(keys[2]), (0, 3))
+
+    cache.evict(cache.size() - 1)
+
+    assert not cache._path(keys[1]).exists()
+    assert cache._path(keys[0]).exists() and cache._path(keys[2]).exists()
+
+
+def test_baseline_scripts_cache_only_where_hems_solve_cache_says(tmp_path, monkeypatch):
+    from ..hems_pv_battery import run_year
+
+    monkeypatch.setenv('HEMS_BACKEND', 'highs')
+    monkeypatch.setenv('HEMS_SOLVE_CACHE', str(tmp_path))
+    run_year(days=2, out=None)
+
+    assert list(tmp_path.rglob('*.npz'))
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from ..backends import HighsBackend
+from ..stochastic_ev import (
+    Scenarios, day_inputs, evaluate, feasible, here_and_now_decisions, reduce_scenarios, sample_scenarios,
+    schedule_day, solve_stochastic_day,
+)
+
+INPUTS = day_inputs(289382707, 7)
+
+
+def test_one_scenario_is_the_deterministic_model():
+    scenarios = sample_scenarios(20, rng=0)
+    k = int(np.flatnonzero(feasible(scenarios, INPUTS))[0])
+    backend = HighsBackend()
+
+    deterministic = backend.solve('pv_battery_ev', dict(scenarios.day_params(k), **INPUTS))
+    twice = solve_stochastic_day(INPUTS, scenarios.subset([k, k]), backend=backend)
+
+    assert twice.ok
+    assert twice.objective == pytest.approx(deterministic.objective, abs=1e-6)
+
+
+def test_first_slots_are_shared_and_cost_bounds_hold():
+    solution, scenarios = schedule_day(INPUTS, count=200, clusters=5, here_and_now=3, rng=1, backend=HighsBackend())
+
+    assert solution.ok and len(scenarios) == 5
+    for values in solution.values.values():
+        assert np.allclose(values[:, :3], values[:1, :3])
+    committed, foresight = evaluate(here_and_now_decisions(solution, 3), INPUTS, scenarios)
+    # Perfect foresight is a lower bound; acting on the shared slots and re-planning reaches the expected cost
+    assert scenarios.prob @ foresight <= solution.objective + 1e-6
+    assert scenarios.prob @ committed == pytest.approx(solution.objective, abs=1e-6)
+
+
+def test_feasibility_screen_agrees_with_the_solver():
+    scenarios = sample_scenarios(30, weekend=True, rng=2)
+    backend = HighsBackend()
+
+    solved = [backend.solve('pv_battery_ev', dict(scenarios.day_params(k), **INPUTS)).ok for k in range(len(scenarios))]
+
+    assert np.array_equal(feasible(scenarios, INPUTS), solved)
+
+
+def test_reduction_keeps_distinct_scenarios_and_their_weight():
+    distinct = sample_scenarios(3, rng=3)
+    repeated = distinct.subset(np.repeat([0, 1, 2], [10, 5, 5]))
+
+    reduced = reduce_scenarios(repeated, 3, rng=0)
+
+    assert len(reduced) == 3 and reduced.prob.sum() == pytest.approx(1)
+    order = np.argsort(reduced.usage)
+    assert np.allclose(reduced.usage[order], np.sort(distinct.usage))
+    assert np.allclose(reduced.prob[order], np.array([0.5, 0.25, 0.25])[np.argsort(distinct.usage)])
+    assert isinstance(reduce_scenarios(distinct, 5), Scenarios)
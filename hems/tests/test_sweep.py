@@ -0,0 +1,56 @@
+import shutil
+
+import numpy as np
+import pytest
+from ..backends import HighsBackend
+from ..model import cost
+from ..rolling_horizon import N
+from ..runner import DEFAULT_PARAMS, horizon_window
+from ..data import load_site_arrays, site_path
+from ..sweep import grid_points, sweep
+
+SITE = 152786204
+
+
+def test_grid_points_snake_order():
+    points = grid_points({'ebM': [5, 10], 'PbM': [2, 5], 'etaBc': [0.9, 0.95]})
+
+    assert len(points) == 8
+    assert len({tuple(point.values()) for point in points}) == 8
+    # Consecutive points differ in exactly one parameter
+    for a, b in zip(points, points[1:]):
+        assert sum(a[name] != b[name] for name in a) == 1
+
+
+def test_sweep_matches_direct_solves():
+    surface = sweep({'ebM': [5, 10]}, sites=[SITE], days=2, prune_margin=None, workers=1, backend='highs')
+
+    site = load_site_arrays(SITE)
+    backend = HighsBackend()
+    for _, row in surface.iterrows():
+        expected = 0
+        for day in range(2):
+            params = dict(DEFAULT_PARAMS, ebM=row['ebM'], **{name: horizon_window(site[key], day) for name, key in
+                                                            (('Pd', 'load_kw'), ('Ppv', 'pv_kw'), ('c_g', 'tariff'))})
+            expected += cost(backend.solve('pv_battery', params).head(N), params)
+        assert row['energy_cost'] == pytest.approx(expected / 2, abs=1e-6)
+    assert not surface['pruned'].any()
+
+
+def test_sweep_prunes_points_worse_on_screening_days():
+    surface = sweep({'ebM': [5, 10, 13.5]}, sites=[SITE], days=4, screen_every=2, prune_margin=0,
+                    kwh_price=300, workers=1, backend='highs')
+
+    best = surface['screen_cost'] + surface['capital_cost']
+    assert list(surface['pruned']) == list(best > best.min())
+    assert surface.loc[surface['pruned'], 'energy_cost'].isna().all()
+    assert np.isfinite(surface.loc[~surface['pruned'], 'total_cost']).all()
+
+
+def test_sweep_reads_a_site_directory(tmp_path):
+    shutil.copy(site_path(SITE), tmp_path)
+    surface = sweep({'ebM': [5]}, sites=tmp_path, days=2, prune_margin=None, workers=1, backend='highs')
+    bundled = sweep({'ebM': [5]}, sites=[SITE], days=2, prune_margin=None, workers=1, backend='highs')
+
+    assert (tmp_path / 'cache').is_dir()
+    assert surface['energy_cost'].tolist() == pytest.approx(bundled['energy_cost'].tolist())
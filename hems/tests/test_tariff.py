@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+from ..data import load_site_arrays
+from ..model import get_model
+from ..tariff import TOU_FILE, Tariff, compile_many, default_tariff, demand_charge, local_times
+
+WEEKDAY = np.linspace(0.1, 0.5, 48)
+WEEKEND = np.full(48, 0.2)
+
+
+def test_default_tariff_matches_tou_csv():
+    site = load_site_arrays(152786204)
+    tou = np.loadtxt(TOU_FILE, delimiter=',', skiprows=1, encoding='utf-8-sig')
+
+    # 2019-01-01 starts at local midnight, so the first day is the CSV column as is
+    assert np.array_equal(site['tariff'][:48], tou[:, 0])
+    assert np.array_equal(site['feed_in'][:48], tou[:, 1])
+
+
+def test_weekends_and_seasons():
+    summer = Tariff(np.stack([WEEKDAY, WEEKEND]), export_prices=0.1)
+    winter = Tariff.flat(0.3, feed_in=0.02)
+    tariff = Tariff.seasonal([((12, 1, 2), summer), (range(3, 12), winter)])
+    # Friday 2019-01-04 to Saturday 2019-01-05, then a Monday in July
+    localtime = np.concatenate([local_times('2019-01-04', 2, 'Australia/Sydney'),
+                                local_times('2019-07-01', 1, 'Australia/Sydney')])
+
+    prices = tariff.compile(localtime)
+
+    assert np.array_equal(prices['c_g'][:48], WEEKDAY)
+    assert np.array_equal(prices['c_g'][48:96], WEEKEND)
+    assert np.all(prices['c_g'][96:] == 0.3)
+    assert np.all(prices['c_pv'][:96] == 0.1) and np.all(prices['c_pv'][96:] == 0.02)
+
+
+def test_seasons_must_share_the_demand_charge():
+    window = np.arange(48) >= 32
+    summer = Tariff.flat(0.3, demand_rate=10, demand_window=window)
+    tariff = Tariff.seasonal([(range(1, 7), summer), (range(7, 13), Tariff.flat(0.2, demand_rate=10,
+                                                                                 demand_window=window))])
+    assert tariff.demand_rate == 10 and np.array_equal(tariff.demand_window[0], window)
+
+    with pytest.raises(ValueError, match='demand'):
+        Tariff.seasonal([(range(1, 7), summer), (range(7, 13), Tariff.flat(0.2))])
+
+
+def test_compile_many_matches_compile():
+    tariffs = [default_tariff(), Tariff.flat(0.4), Tariff(np.stack([WEEKDAY, WEEKEND]))]
+    localtime = local_times('2019-03-30', 14, 'Australia/Brisbane')
+
+    compiled = compile_many(tariffs, localtime)
+
+    assert compiled['c_g'].shape == (3, 14 * 48)
+    for row, tariff in enumerate(tariffs):
+        assert np.array_equal(compiled['c_pv'][row], tariff.compile(localtime)['c_pv'])
+
+
+def test_local_times_follow_daylight_saving():
+    # Daylight saving ends in Sydney at 03:00 on 2019-04-07, so 02:00-02:30 happens twice
+    localtime = local_times('2019-04-07', 1, 'Australia/Sydney')
+
+    assert len(localtime) == 48
+    assert localtime[0] == np.datetime64('2019-04-07T00:00')
+    assert localtime[4] == localtime[6] == np.datetime64('2019-04-07T02:00')
+    assert localtime[-1] == np.datetime64('2019-04-07T22:30')
+
+
+def test_demand_charge_bills_monthly_peaks_in_window():
+    window = np.zeros(48, dtype=bool)
+    window[32:40] = True  # 16:00 to 20:00
+    tariff = Tariff.flat(0.3, demand_rate=10, demand_window=window)
+    localtime = local_times('2019-01-31', 2, 'Australia/Sydney')
+    Pgplus = np.ones(96)
+    Pgplus[35], Pgplus[48 + 36], Pgplus[10] = 4, 3, 9  # Slot 10 is outside the window
+
+    assert demand_charge(tariff, localtime, Pgplus) == pytest.approx(10 * (4 + 3))
+
+
+def test_feed_in_prices_reach_the_objective():
+    c_pv = np.linspace(0, 0.1, 96)
+    params = {'Pd': np.ones(96), 'Ppv': np.ones(96), 'c_g': np.full(96, 0.2), 'c_pv': c_pv,
+              'ebM': 10, 'ebm': 0, 'eb1': 0, 'PbM': 5, 'etaBc': 0.9}
+
+    problem = get_model('pv_battery').build(params)
+
+    assert np.allclose(problem.c[problem.index('Pgminus')], -0.5 * c_pv)
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+from ..backends import HighsBackend
+from ..data import SITE_DIR, list_sites, load_site_arrays
+from ..model import VARIABLES, get_model
+from ..runner import DEFAULT_PARAMS, horizon_window
+
+N = 96
+
+
+def day_params(site_id, day, **overrides):
+    site = load_site_arrays(site_id)
+    windows = {name: horizon_window(site[key], day) for name, key in
+               (('Pd', 'load_kw'), ('Ppv', 'pv_kw'), ('c_g', 'tariff'), ('c_pv', 'feed_in'))}
+    return {**DEFAULT_PARAMS, **windows, **overrides}
+
+
+def assert_feasible_for_original(solution, params, tol=1e-6):
+    """The solution satisfies every constraint, bound and integrality of hems_pv_battery.mod."""
+    problem = get_model('pv_battery').build(params)
+    x = np.concatenate([solution[name] for name in VARIABLES])
+    Ax = problem.A @ x
+    assert np.all(Ax >= problem.constraint_lo - tol) and np.all(Ax <= problem.constraint_hi + tol)
+    assert np.all(x >= problem.lb - tol) and np.all(x <= problem.ub + tol)
+    binaries = x[problem.integrality == 1]
+    assert np.all((binaries == 0) | (binaries == 1))
+
+
+@pytest.mark.parametrize('site_id', list_sites(SITE_DIR))
+def test_same_optimal_cost_on_every_bundled_site(site_id):
+    backend = HighsBackend(mip_rel_gap=1e-9)
+    params = day_params(site_id, day=list_sites(SITE_DIR).index(site_id) * 15)
+
+    original = backend.solve('pv_battery', params)
+    tight = backend.solve('pv_battery_tight', params)
+
+    assert original.ok and tight.ok
+    assert tight.objective == pytest.approx(original.objective, abs=1e-6)
+    assert_feasible_for_original(tight, params)
+
+
+def test_relaxed_where_prices_imply_complementarity():
+    params = day_params(152786204, day=0)
+    c_pv = params['c_pv'].copy()
+    c_pv[40:44] = params['c_g'][40:44] + 0.1  # Exporting pays more than importing costs
+
+    assert get_model('pv_battery_tight').build(params).integrality.sum() == 0
+    problem = get_model('pv_battery_tight').build(dict(params, c_pv=c_pv))
+    assert np.array_equal(np.flatnonzero(problem.integrality), problem.index('dg', np.arange(40, 44)))
+
+
+@pytest.mark.parametrize('overrides', [
+    {'c_pv': np.where(np.arange(N) // 8 == 3, 0.6, 0.05)},  # Slots 24-31 keep their grid binary
+    {'ebM': 2, 'PbM': 5, 'eb1': 1},  # SOC limits well below the rate limits
+    {'eb1': 10},  # Starts full, so the first slot cannot charge
+])
+def test_same_optimal_cost_at_the_edges(overrides):
+    backend = HighsBackend(mip_rel_gap=1e-9)
+    params = day_params(289382707, day=180, **overrides)
+
+    original = backend.solve('pv_battery', params)
+    tight = backend.solve('pv_battery_tight', params)
+
+    assert original.ok and tight.ok
+    assert tight.objective == pytest.approx(original.objective, abs=1e-6)
+    assert_feasible_for_original(tight, params)
+
+
+def test_binaries_fixed_where_only_one_value_is_feasible():
+    # Empty battery and PV below the load in the first slot: no discharge and no export
+    params = day_params(152786204, day=0, eb1=0, Ppv=np.zeros(N), Pd=np.ones(N))
+    problem = get_model('pv_battery_tight').build(params)
+
+    for name in ('sb', 'dg'):
+        first = problem.index(name, 0)
+        assert problem.lb[first] == problem.ub[first] == 1
+    assert problem.ub[problem.index('Pbminus', 0)] == 0
+    assert problem.ub[problem.index('Pgminus', 0)] == 0
@@ -0,0 +1,8 @@
+"""The installable name of the project; everything lives in the ``hems`` package and is re-exported lazily."""
+import hems
+
+__all__ = hems.__all__
+
+
+def __getattr__(name):
+    return getattr(hems, name)